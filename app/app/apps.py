@@ -0,0 +1,11 @@
+from django.apps import AppConfig
+
+
+class MainConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'app'
+
+    def ready(self):
+        # connect the database and permission cache signal handlers and
+        # register the checks
+        from . import backends, checks, db  # noqa: F401
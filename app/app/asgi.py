@@ -9,8 +9,23 @@ https://docs.djangoproject.com/en/3.2/howto/deployment/asgi/
 
 import os
 
+from django.conf import settings
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'app.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# imported once the apps are loaded
+from financial.live import dashboard_events  # noqa: E402
+
+
+async def application(scope, receive, send):
+    """
+    Django, except the Server-Sent Events of the dashboard that are served
+    by a plain ASGI app, an open connection doesn't hold a thread.
+    """
+    if (scope['type'] == 'http'
+            and scope['path'] == settings.SSE_DASHBOARD_PATH):
+        return await dashboard_events(scope, receive, send)
+    return await django_application(scope, receive, send)
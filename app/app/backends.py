@@ -0,0 +1,107 @@
+import uuid
+
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.models import Group, Permission, User
+from django.core.cache import cache
+from django.db.models.signals import (
+    m2m_changed, post_delete, post_init, post_save,
+)
+from django.dispatch import receiver
+
+from financial.utils import _get_version
+
+PERMISSIONS_KEY = "app:permissions:{}:{}:{}"
+USER_VERSION_KEY = "app:permissions_version:{}"
+GLOBAL_VERSION_KEY = "app:permissions_version"
+
+
+def bump_user_permissions(user_id):
+    """Invalidate the cached permissions of a user."""
+    cache.set(USER_VERSION_KEY.format(user_id), uuid.uuid4().hex, timeout=None)
+
+
+def bump_all_permissions():
+    """Invalidate the cached permissions of every user."""
+    cache.set(GLOBAL_VERSION_KEY, uuid.uuid4().hex, timeout=None)
+
+
+class CachedModelBackend(ModelBackend):
+    """
+    ModelBackend that keeps the permissions of each user in the cache between
+    requests, so the permission checks of the views don't query the database.
+    The cache is invalidated when the user, its groups or the permissions of
+    them change (see the signal handlers below), in the other processes only
+    if the cache is shared, else they expire after PERMISSION_CACHE_TIMEOUT.
+    """
+
+    def get_all_permissions(self, user_obj, obj=None):
+        if not user_obj.is_active or user_obj.is_anonymous or obj is not None:
+            return set()
+        if not hasattr(user_obj, '_perm_cache'):
+            key = PERMISSIONS_KEY.format(
+                user_obj.pk,
+                _get_version(GLOBAL_VERSION_KEY),
+                _get_version(USER_VERSION_KEY.format(user_obj.pk)),
+            )
+            permissions = cache.get(key)
+            if permissions is None:
+                permissions = super().get_all_permissions(user_obj)
+                cache.set(key, permissions, settings.PERMISSION_CACHE_TIMEOUT)
+            user_obj._perm_cache = permissions
+        return user_obj._perm_cache
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+@receiver(m2m_changed, sender=User.user_permissions.through)
+def user_relations_changed(sender, instance, action, reverse, pk_set,
+                           **kwargs):
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        bump_user_permissions(instance.pk)
+    elif pk_set is None:
+        # cleared from the group or permission side
+        bump_all_permissions()
+    else:
+        for user_id in pk_set:
+            bump_user_permissions(user_id)
+
+
+@receiver(m2m_changed, sender=Group.permissions.through)
+def group_permissions_changed(sender, action, **kwargs):
+    # it affects every member of the groups
+    if action.startswith('post_'):
+        bump_all_permissions()
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+@receiver(post_save, sender=Permission)
+@receiver(post_delete, sender=Permission)
+def group_or_permission_changed(sender, **kwargs):
+    bump_all_permissions()
+
+
+def _get_permission_flags(user):
+    # read from the instance only, a deferred field isn't loaded
+    return user.__dict__.get('is_active'), user.__dict__.get('is_superuser')
+
+
+@receiver(post_init, sender=User)
+def user_loaded(sender, instance, **kwargs):
+    instance._permission_flags = _get_permission_flags(instance)
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, **kwargs):
+    # only is_active and is_superuser change the permissions, not a login
+    flags = _get_permission_flags(instance)
+    if not created and flags != instance._permission_flags:
+        bump_user_permissions(instance.pk)
+    instance._permission_flags = flags
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    bump_user_permissions(instance.pk)
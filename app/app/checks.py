@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+# backends keeping the entries in the memory of each process
+LOCAL_CACHE_BACKENDS = [
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+]
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    """
+    Warn when the default cache is local to the process, the invalidations
+    made by a worker (versions, permissions) aren't seen by the others.
+    """
+    backend = settings.CACHES.get('default', {}).get('BACKEND')
+    if backend not in LOCAL_CACHE_BACKENDS:
+        return []
+    return [Warning(
+        "The default cache {} is local to each process.".format(backend),
+        hint="With more than one worker set CACHE_BACKEND and "
+             "CACHE_LOCATION to a cache shared by them, otherwise the other "
+             "workers serve stale results until their entries expire.",
+        id='app.W001',
+    )]
@@ -0,0 +1,36 @@
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+
+def get_sqlite_pragmas(profile=None):
+    """
+    Return the pragmas of a SQLite profile defined in settings.SQLITE_PROFILES.
+    If no profile is given the one in settings.SQLITE_PROFILE is used.
+    """
+    if profile is None:
+        profile = getattr(settings, 'SQLITE_PROFILE', None)
+    if not profile:
+        return {}
+    return getattr(settings, 'SQLITE_PROFILES', {}).get(profile, {})
+
+
+def apply_sqlite_pragmas(cursor, pragmas):
+    """
+    Execute each pragma using the given DB-API cursor, it works both with a
+    Django cursor and with a plain sqlite3 cursor.
+    """
+    for name, value in pragmas.items():
+        cursor.execute("PRAGMA {} = {}".format(name, value))
+
+
+@receiver(connection_created)
+def set_sqlite_profile(sender, connection, **kwargs):
+    """Apply the SQLite profile each time a new connection is opened."""
+    if connection.vendor != 'sqlite':
+        return
+    profile = connection.settings_dict.get('SQLITE_PROFILE')
+    pragmas = get_sqlite_pragmas(profile)
+    if pragmas:
+        with connection.cursor() as cursor:
+            apply_sqlite_pragmas(cursor, pragmas)
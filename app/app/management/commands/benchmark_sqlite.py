@@ -0,0 +1,132 @@
+import multiprocessing
+import os
+import sqlite3
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from app.db import apply_sqlite_pragmas, get_sqlite_pragmas
+
+# seconds a connection waits for a lock, the sqlite3 default used by Django;
+# a profile setting busy_timeout overrides it in both the benchmark and the app
+BUSY_TIMEOUT = 5
+
+
+def _worker(path, pragmas, role, seconds, results):
+    """
+    Run reads or writes against the database until the time is over, like a
+    gunicorn worker would do. Put the number of operations and the number of
+    "database is locked" errors in results.
+    """
+    # isolation_level None to manage the transactions by hand, as Django
+    # does in autocommit mode
+    connection = sqlite3.connect(
+        path, timeout=BUSY_TIMEOUT, isolation_level=None
+    )
+    cursor = connection.cursor()
+    apply_sqlite_pragmas(cursor, pragmas)
+    operations = locked = 0
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        try:
+            if role == 'write':
+                cursor.execute("BEGIN IMMEDIATE")
+                cursor.execute(
+                    "INSERT INTO appliance (user_id, asset_id, quantity, "
+                    "unit_price, total) VALUES (?, ?, ?, ?, ?)",
+                    (operations % 10, operations % 50, 1, 10.0, 10.0)
+                )
+                cursor.execute("COMMIT")
+            else:
+                cursor.execute(
+                    "SELECT asset_id, SUM(total) FROM appliance "
+                    "WHERE user_id = ? GROUP BY asset_id",
+                    (operations % 10,)
+                ).fetchall()
+            operations += 1
+        except sqlite3.OperationalError as error:
+            if 'locked' not in str(error) and 'busy' not in str(error):
+                raise
+            if connection.in_transaction:
+                cursor.execute("ROLLBACK")
+            locked += 1
+    connection.close()
+    results.put((role, operations, locked))
+
+
+class Command(BaseCommand):
+    help = "Benchmark concurrent reads and writes with and without a SQLite profile."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=2)
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--seconds', type=float, default=5)
+        parser.add_argument('--rows', type=int, default=10000,
+                            help="Rows inserted before the benchmark starts.")
+        parser.add_argument('--profile', default=settings.SQLITE_PROFILE,
+                            help="Profile compared against the SQLite defaults.")
+
+    def run_profile(self, profile, options):
+        """Run the benchmark in a fresh database file and return the results."""
+        with tempfile.TemporaryDirectory() as directory:
+            return self._run_profile(
+                os.path.join(directory, 'benchmark.sqlite3'), profile, options
+            )
+
+    def _run_profile(self, path, profile, options):
+        pragmas = get_sqlite_pragmas(profile)
+        connection = sqlite3.connect(path)
+        apply_sqlite_pragmas(connection.cursor(), pragmas)
+        connection.execute(
+            "CREATE TABLE appliance (id INTEGER PRIMARY KEY, user_id INTEGER, "
+            "asset_id INTEGER, quantity INTEGER, unit_price REAL, total REAL)"
+        )
+        connection.execute(
+            "CREATE INDEX appliance_user ON appliance (user_id)")
+        connection.executemany(
+            "INSERT INTO appliance (user_id, asset_id, quantity, unit_price, "
+            "total) VALUES (?, ?, 1, 10.0, 10.0)",
+            ((i % 10, i % 50) for i in range(options['rows']))
+        )
+        connection.commit()
+        connection.close()
+
+        results = multiprocessing.Queue()
+        roles = ['write'] * options['writers'] + ['read'] * options['readers']
+        processes = [
+            multiprocessing.Process(
+                target=_worker,
+                args=(path, pragmas, role, options['seconds'], results)
+            )
+            for role in roles
+        ]
+        for process in processes:
+            process.start()
+        totals = {
+            'write': {'operations': 0, 'locked': 0},
+            'read': {'operations': 0, 'locked': 0},
+        }
+        for _ in processes:
+            role, operations, locked = results.get()
+            totals[role]['operations'] += operations
+            totals[role]['locked'] += locked
+        for process in processes:
+            process.join()
+        return totals
+
+    def handle(self, *args, **options):
+        seconds = options['seconds']
+        for profile in ('default', options['profile']):
+            totals = self.run_profile(profile, options)
+            self.stdout.write("Profile {}: {}".format(
+                profile, get_sqlite_pragmas(profile) or "SQLite defaults"))
+            for role in ('write', 'read'):
+                self.stdout.write(
+                    "  {:<5} {:>10.0f} ops/s {:>8} locked errors".format(
+                        role,
+                        totals[role]['operations'] / seconds,
+                        totals[role]['locked'],
+                    )
+                )
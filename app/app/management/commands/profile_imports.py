@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from app.startup import get_eager_lazy_modules, measure_imports
+
+
+class Command(BaseCommand):
+    help = (
+        "Report the import time of each module when a worker starts, "
+        "measured in a new interpreter with python -X importtime."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('modules', nargs='*', metavar='module',
+                            help="Modules imported after django.setup(), the "
+                                 "ROOT_URLCONF by default.")
+        parser.add_argument('--limit', type=int, default=25)
+        parser.add_argument('--sort', choices=['cumulative', 'self'],
+                            default='cumulative')
+        parser.add_argument('--check', action='store_true',
+                            help="Fail if a module of app.startup.LAZY_MODULES "
+                                 "is imported.")
+
+    def handle(self, *args, **options):
+        try:
+            times = measure_imports(options['modules'])
+        except RuntimeError as error:
+            raise CommandError(error)
+        total = sum(time.cumulative for time in times if time.depth == 0)
+        self.stdout.write("{} modules imported in {:.1f} ms".format(
+            len(times), total / 1000
+        ))
+        self.stdout.write("{:>10} {:>10}  module".format("self ms", "cumul ms"))
+        for time in sorted(times, key=lambda time: getattr(
+                time, options['sort']), reverse=True)[:options['limit']]:
+            self.stdout.write("{:>10.1f} {:>10.1f}  {}".format(
+                time.self / 1000, time.cumulative / 1000, time.module
+            ))
+
+        eager = get_eager_lazy_modules(times)
+        if eager:
+            message = "Imported at startup: {}".format(", ".join(eager))
+            if options['check']:
+                raise CommandError(message)
+            self.stderr.write(message)
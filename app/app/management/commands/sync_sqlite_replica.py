@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from app.routers import get_replicas
+
+
+class Command(BaseCommand):
+    help = (
+        "Copy a SQLite database over its replicas with the backup API, a "
+        "local stand-in for the replication."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        primary = connections[options['database']]
+        replicas = get_replicas(options['database'])
+        if not replicas:
+            raise CommandError(
+                "{} has no replica in DATABASE_REPLICAS.".format(
+                    options['database']
+                )
+            )
+        for alias in replicas:
+            replica = connections[alias]
+            if primary.vendor != 'sqlite' or replica.vendor != 'sqlite':
+                raise CommandError("Only SQLite databases can be copied.")
+            primary.ensure_connection()
+            replica.ensure_connection()
+            # the backup is consistent even with writers on the primary
+            primary.connection.backup(replica.connection)
+            self.stdout.write("{} copied to {}".format(primary.alias, alias))
@@ -0,0 +1,43 @@
+from .routers import (
+    count_route, end_request_route, is_pinned, pin_user, start_request_route,
+)
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Mark the safe requests (lists, charts, table pages and exports) as read
+    only, so the ReplicaRouter sends their reads to a replica. A user that
+    writes is pinned to the primary for REPLICA_PIN_SECONDS to read its own
+    writes, by a signed cookie or by the cache. The route is returned in the X-DB-Route
+    header and counted (see app.routers.get_route_counts). It must come
+    after the AuthenticationMiddleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        user = getattr(request, 'user', None)
+        user_id = user.pk if user is not None and user.is_authenticated \
+            else None
+        if request.method not in SAFE_METHODS:
+            token = start_request_route(False, "unsafe")
+        elif user_id is not None and is_pinned(request, user_id):
+            token = start_request_route(False, "pinned")
+        else:
+            token = start_request_route(True)
+        try:
+            response = self.get_response(request)
+        finally:
+            route = end_request_route(token)
+
+        # the user may have logged in or out in the request
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated and (
+                route.written or request.method not in SAFE_METHODS):
+            pin_user(response, user.pk)
+        count_route(route.route)
+        response['X-DB-Route'] = str(route)
+        return response
@@ -3,7 +3,6 @@ from django.contrib.contenttypes.models import ContentType
 from django.contrib.auth.models import Permission
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.db import transaction
-from django_tables2.export.export import TableExport
 from django_tables2 import LazyPaginator, RequestConfig
 from django.contrib import messages
 from django.http import HttpResponseRedirect
@@ -13,6 +12,15 @@ from django.utils.translation import gettext as _
 from django.contrib.auth.mixins import PermissionRequiredMixin
 
 
+def get_table_export():
+    """
+    Return the TableExport class, imported on the first export so tablib and
+    its writers aren't loaded when the workers start.
+    """
+    from django_tables2.export.export import TableExport
+    return TableExport
+
+
 class MyCreate:
     """This mixin has the methods to create a model."""
 
@@ -127,6 +135,7 @@ class MyTableMixin:
     def get_table(self, **kwargs):
         """Return an instance of the table to be used in this view."""
         table_class = self.get_table_class()
+        kwargs = {**self.get_table_kwargs(), **kwargs}
         table = table_class(data=self.get_table_data(), **kwargs)
         return RequestConfig(self.request, paginate=self.get_table_pagination(table)).configure(table)
 
@@ -158,7 +167,7 @@ class MyTableMixin:
 
     def get_export_table_response(self, export_format):
         """Export the data table with given format."""
-        exporter = TableExport(export_format, self.get_table())
+        exporter = get_table_export()(export_format, self.get_table())
         return exporter.response("{}.{}".format(self.export_table_name, export_format))
 
 
@@ -354,7 +363,8 @@ class MyViewCreateMixin(LoginRequiredMixin, PermissionRequiredMixin, MyFormMixin
     def get(self, request, *args, **kwargs):
         # check if user request a export table if so then export
         export_format = request.GET.get("_export", None)
-        if TableExport.is_valid_format(export_format):
+        if export_format is not None and \
+                get_table_export().is_valid_format(export_format):
             return self.get_export_table_response(export_format)
         if self.custom_response:
             return self.custom_response
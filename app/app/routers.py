@@ -0,0 +1,183 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, router
+
+PIN_COOKIE = "db_pin"
+PIN_KEY = "app:replica_pin:{}"
+ROUTE_COUNT_KEY = "app:db_route:{}"
+PRIMARY = "primary"
+REPLICA = "replica"
+
+_request_route = ContextVar('request_route', default=None)
+
+
+def get_replicas(alias):
+    """Return the replica aliases of a database."""
+    return getattr(settings, 'DATABASE_REPLICAS', {}).get(alias, [])
+
+
+def get_primary(alias):
+    """Return the primary database of an alias, itself if not a replica."""
+    replicas = getattr(settings, 'DATABASE_REPLICAS', {})
+    for primary, aliases in replicas.items():
+        if alias in aliases:
+            return primary
+    return alias
+
+
+def is_pinned(request, user_id):
+    """
+    Return True if the user wrote recently and must read from the primary.
+    The pin is a signed cookie, seen by every worker, and a key in the cache
+    for the clients that don't keep cookies (token or basic auth), seen by
+    the other workers only if the cache is shared.
+    """
+    pinned = request.get_signed_cookie(
+        PIN_COOKIE, default=None, salt=PIN_COOKIE,
+        max_age=settings.REPLICA_PIN_SECONDS
+    )
+    if pinned == str(user_id):
+        return True
+    return cache.get(PIN_KEY.format(user_id)) is not None
+
+
+def pin_user(response, user_id):
+    """Read from the primary for a while, so the user reads its own writes."""
+    response.set_signed_cookie(
+        PIN_COOKIE, user_id, salt=PIN_COOKIE,
+        max_age=settings.REPLICA_PIN_SECONDS, httponly=True, samesite='Lax'
+    )
+    cache.set(PIN_KEY.format(user_id), True, settings.REPLICA_PIN_SECONDS)
+
+
+def count_route(route):
+    """
+    Increment the counter of requests by database route, in the default
+    cache, so they are counted by process if it isn't shared.
+    """
+    key = ROUTE_COUNT_KEY.format(route)
+    if not cache.add(key, 1, timeout=None):
+        cache.incr(key)
+
+
+def get_route_counts():
+    """Return a dict of route to the number of requests routed there."""
+    return {
+        route: cache.get(ROUTE_COUNT_KEY.format(route), 0)
+        for route in (PRIMARY, REPLICA)
+    }
+
+
+class RequestRoute:
+    """Database route of the current request."""
+
+    def __init__(self, read_only, reason=None):
+        self.read_only = read_only
+        self.reason = reason
+        self.replicas = {}
+        self.used_replica = False
+        self.written = False
+
+    def get_replica(self, primary):
+        """Return the replica used by the request for the primary, if any."""
+        if primary not in self.replicas:
+            replicas = get_replicas(primary)
+            self.replicas[primary] = random.choice(replicas) if replicas \
+                else None
+        replica = self.replicas[primary]
+        if replica is not None:
+            self.used_replica = True
+        return replica
+
+    def wrote(self):
+        """After a write the request reads what it wrote, from the primary."""
+        if self.reason is None:
+            self.reason = "write"
+        self.written = True
+        self.read_only = False
+
+    @property
+    def route(self):
+        return REPLICA if self.used_replica else PRIMARY
+
+    def __str__(self):
+        if self.reason and not self.used_replica:
+            return "{}; reason={}".format(self.route, self.reason)
+        return self.route
+
+
+def start_request_route(read_only, reason=None):
+    """Set the route of the current request, return the token to reset it."""
+    return _request_route.set(RequestRoute(read_only, reason))
+
+
+def end_request_route(token):
+    route = _request_route.get()
+    _request_route.reset(token)
+    return route
+
+
+@contextmanager
+def primary_reads():
+    """
+    Read from the primary inside the block, use it around reads that decide
+    what to write, a lagging replica would write stale data back.
+    """
+    route = _request_route.get()
+    if route is None or not route.read_only:
+        yield
+        return
+    route.read_only = False
+    try:
+        yield
+    finally:
+        route.read_only = not route.written
+
+
+class ReplicaRouter:
+    """
+    Send the reads of read-only requests to a replica of the database they
+    would use, see app/middleware.py. It must be the first router, the
+    others decide the primary database.
+    """
+
+    def _get_primary(self, method, model, **hints):
+        for other in router.routers:
+            if isinstance(other, ReplicaRouter):
+                continue
+            chosen = getattr(other, method, None)
+            alias = chosen(model, **hints) if chosen else None
+            if alias:
+                return get_primary(alias)
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            return get_primary(instance._state.db)
+        return DEFAULT_DB_ALIAS
+
+    def db_for_read(self, model, **hints):
+        route = _request_route.get()
+        primary = self._get_primary('db_for_read', model, **hints)
+        if route is None or not route.read_only:
+            return primary
+        return route.get_replica(primary) or primary
+
+    def db_for_write(self, model, **hints):
+        route = _request_route.get()
+        if route is not None:
+            route.wrote()
+        return self._get_primary('db_for_write', model, **hints)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if get_primary(obj1._state.db) == get_primary(obj2._state.db):
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # a replica is a copy of its primary
+        if get_primary(db) != db:
+            return False
+        return None
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/3.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -54,6 +55,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'app.middleware.ReplicaRoutingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'django.middleware.locale.LocaleMiddleware',  # activate translation
@@ -91,6 +93,65 @@ DATABASES = {
     }
 }
 
+# Databases holding the financial data of the users (see financial/routers.py),
+# each user is placed on one of them by a stable hash of its id. Set
+# FINANCIAL_SHARD_COUNT to split the data in local SQLite files.
+FINANCIAL_SHARD_COUNT = int(os.environ.get('FINANCIAL_SHARD_COUNT', 0))
+for shard in range(FINANCIAL_SHARD_COUNT):
+    DATABASES['shard_{}'.format(shard)] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'db_shard_{}.sqlite3'.format(shard),
+    }
+FINANCIAL_SHARDS = [
+    'shard_{}'.format(shard) for shard in range(FINANCIAL_SHARD_COUNT)
+] or ['default']
+# seconds a process keeps the shard of a user (see ShardAssignment), a user
+# moved to another shard is routed there by every worker after this long
+FINANCIAL_SHARD_CACHE_TIMEOUT = 5
+# the ids of the sharded tables start at the shard index times this value, so
+# a user can be moved to another shard keeping the ids of its rows
+FINANCIAL_SHARD_ID_SPAN = 10 ** 12
+
+# Read replicas of each database, the reads of the safe requests go to one of
+# them (see app/routers.py). DATABASE_REPLICA is the path of a SQLite copy of
+# the default database used as its replica (see sync_sqlite_replica).
+DATABASE_REPLICAS = {}
+if os.environ.get('DATABASE_REPLICA'):
+    DATABASES['replica'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ['DATABASE_REPLICA'],
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS['default'] = ['replica']
+# seconds a user reads from the primary after a write, to read its own writes
+REPLICA_PIN_SECONDS = 5
+
+# the replica router must be the first, it asks the others for the primary
+DATABASE_ROUTERS = [
+    'app.routers.ReplicaRouter',
+    'financial.routers.UserShardRouter',
+]
+
+# SQLite profile applied on every new connection (see app/db.py), it can be
+# changed per database using the SQLITE_PROFILE key inside DATABASES. Use the
+# "default" profile to keep the SQLite defaults.
+SQLITE_PROFILE = os.environ.get('SQLITE_PROFILE', 'performance')
+SQLITE_PROFILES = {
+    'default': {},
+    'performance': {
+        # readers don't block the writer and the writer don't block readers
+        'journal_mode': 'WAL',
+        # safe with WAL, only the checkpoint waits for fsync
+        'synchronous': 'NORMAL',
+        'mmap_size': 128 * 1024 * 1024,
+        # negative value is the size in KiB
+        'cache_size': -32000,
+        'temp_store': 'MEMORY',
+        # wait (ms) for the lock instead of raising "database is locked"
+        'busy_timeout': 5000,
+    },
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
@@ -141,11 +202,34 @@ STATIC_URL = '/static/'
 STATIC_ROOT = BASE_DIR / 'static/'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media/'
+# Monthly statements written by the generate_statements command
+STATEMENTS_ROOT = BASE_DIR / 'statements/'
+
+# The versions of the financial data, prices and assets (see financial.utils)
+# invalidate what is memoized by them in every worker only if the cache is
+# shared by the workers. With more than one process set CACHE_BACKEND and
+# CACHE_LOCATION, e.g. to ...memcached.PyMemcacheCache, or on a single host
+# to ...filebased.FileBasedCache and a directory. check --deploy warns about
+# a cache local to the process.
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.environ.get('CACHE_LOCATION', ''),
+    }
+}
 
 # Login redirect
 LOGIN_URL = "/login/"
 LOGIN_REDIRECT_URL = '/'
 
+# The permissions of the users are cached between requests (see
+# app/backends.py), the cache is invalidated when they change. A worker not
+# sharing the cache keeps a revoked permission for up to the timeout.
+AUTHENTICATION_BACKENDS = ['app.backends.CachedModelBackend']
+PERMISSION_CACHE_TIMEOUT = 10
+
 # Custom settings
 VERSION = "1.0.0+0"
 NAME_OF_ENTERPRISE = "ByeBnk Desafio"
@@ -169,6 +253,55 @@ DEFAULT_COST_PRICE = 2
 DEFAULT_DECIMAL_PLACES = 2
 DEFAULT_MAX_DIGITS = 11
 
+# Method used to match redeems against the appliance lots, "AVG" for the
+# brazilian average cost or "FIFO"
+LOT_METHOD = "AVG"
+
+# Coordinate the identical computations in flight between the processes too,
+# through a lock in the cache (see financial.utils.SingleFlight), it needs a
+# cache shared by the processes
+SINGLE_FLIGHT_SHARED = False
+
+# The sync endpoint returns again the rows changed this many seconds before
+# the token, a write committed late isn't missed
+SYNC_OVERLAP_SECONDS = 5
+
+# Server-Sent Events of the dashboard totals, served by app/asgi.py, the
+# comment sent to idle connections keeps the proxies from closing them
+SSE_DASHBOARD_PATH = '/dashboard/events/'
+SSE_KEEPALIVE_SECONDS = 15
+# seconds between the checks of the data version in the cache, a write served
+# by another process reaches the connections of this one within it
+SSE_POLL_SECONDS = 5
+
+# Latest transactions returned by the dashboard summary endpoint by default
+# and at most
+DASHBOARD_LATEST = 10
+DASHBOARD_LATEST_MAX = 50
+
+# Token bucket throttling of the financial write endpoints, per user and per
+# client ip (see financial.throttles): burst requests at once, refilled at
+# rate requests per second. The buckets are kept in each process, with
+# FINANCIAL_THROTTLE_SHARED in the cache, it needs a cache shared by them
+FINANCIAL_THROTTLE_RATES = {
+    'asset_add': {'burst': 10, 'rate': 0.5},
+    'appliance_add': {'burst': 30, 'rate': 2},
+    'redeem_add': {'burst': 30, 'rate': 2},
+}
+FINANCIAL_THROTTLE_SHARED = False
+
+# Records accepted at once by the appliance and redeem add endpoints
+FINANCIAL_ADD_MAX_RECORDS = 500
+# Seconds an asset looked up by pk is kept in each process, they are dropped
+# before when an asset is saved or deleted (see financial.lookups). Without a
+# shared cache it bounds how long another process serves a changed asset.
+ASSET_CACHE_TIMEOUT = 30
+# Seconds the asset name index of a process is searched before it's rebuilt
+# in the background, to see the assets changed by the other processes when
+# the cache isn't shared (see financial.search). None disables it, with a
+# shared cache the version changes are enough.
+ASSET_INDEX_MAX_AGE = 60 * 15
+
 ACCESS_USER = 1
 ACCESS_DELIVERY_MAN = 2
 ACCESS_ADMIN = 3
@@ -0,0 +1,61 @@
+import os
+import subprocess
+import sys
+from collections import namedtuple
+
+from django.conf import settings
+
+ImportTime = namedtuple('ImportTime', 'module self cumulative depth')
+
+# heavy dependencies used by few requests, they must be imported on the
+# first use and not when a worker starts
+LAZY_MODULES = ['numpy', 'tablib', 'openpyxl', 'django_tables2.export']
+
+
+def parse_importtime(output):
+    """
+    Return a list of ImportTime from the output of python -X importtime,
+    the times in microseconds.
+    """
+    times = []
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        times.append(ImportTime(
+            name.strip(), int(self_us), int(cumulative_us),
+            (len(name) - len(name.lstrip()) - 1) // 2,
+        ))
+    return times
+
+
+def measure_imports(modules=None):
+    """
+    Import Django and the modules in a new interpreter with -X importtime,
+    so nothing is imported yet, and return the list of ImportTime. By default
+    the ROOT_URLCONF, which imports the views of all the apps. The modules
+    imported with importlib (e.g. by include()) aren't reported, their time
+    is in the cumulative time of the importer.
+    """
+    code = "import django; django.setup()\n" + "".join(
+        "import {}\n".format(module)
+        for module in (modules or [settings.ROOT_URLCONF])
+    )
+    env = dict(os.environ)
+    env.setdefault('DJANGO_SETTINGS_MODULE', settings.SETTINGS_MODULE)
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+    )
+    if result.returncode:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    return parse_importtime(result.stderr)
+
+
+def get_eager_lazy_modules(times):
+    """Return the LAZY_MODULES (or their submodules) that were imported."""
+    return sorted({
+        time.module for time in times
+        for lazy in LAZY_MODULES
+        if time.module == lazy or time.module.startswith(lazy + '.')
+    })
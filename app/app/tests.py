@@ -0,0 +1,249 @@
+from django.conf import settings
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from .db import get_sqlite_pragmas
+
+
+class TestSQLiteProfile(TestCase):
+
+    def test_profile_applied_on_connection(self):
+        """Testar se os pragmas do perfil são aplicados na conexão."""
+        pragmas = get_sqlite_pragmas('performance')
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA cache_size")
+            cache_size = cursor.fetchone()[0]
+            cursor.execute("PRAGMA temp_store")
+            temp_store = cursor.fetchone()[0]
+        # the SQLite defaults are -2000 and 0 (the file)
+        self.assertEqual(cache_size, pragmas['cache_size'])
+        self.assertEqual(temp_store, 2)
+        self.assertEqual(pragmas['temp_store'], 'MEMORY')
+
+    @override_settings(SQLITE_PROFILE='default')
+    def test_default_profile_without_pragmas(self):
+        """Testar se o perfil default não altera nenhum pragma."""
+        self.assertEqual(get_sqlite_pragmas(), {})
+
+
+# every database stands in for its replica
+SELF_REPLICAS = {alias: [alias] for alias in settings.DATABASES}
+
+
+class TestReplicaRouting(TestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        from django.contrib.auth.models import User
+        from financial.models import Asset
+        self.user = User.objects.create_user(
+            username='testuser1',
+            password='123456'
+        )
+        self.client.login(username='testuser1', password="123456")
+        self.asset = Asset.objects.create(
+            name="BITCOIN",
+            modality="CR",
+            user=self.user,
+        )
+
+    def tearDown(self):
+        from django.core.cache import cache
+        cache.clear()
+
+    @override_settings(DATABASE_REPLICAS={'default': ['replica']})
+    def test_router(self):
+        """Testar se as leituras vão para a réplica até uma escrita."""
+        from financial.models import Asset
+        from .routers import (
+            ReplicaRouter, end_request_route, primary_reads,
+            start_request_route,
+        )
+        router = ReplicaRouter()
+        self.assertEqual(router.db_for_read(Asset), 'default')
+        token = start_request_route(True)
+        try:
+            self.assertEqual(router.db_for_read(Asset), 'replica')
+            with primary_reads():
+                self.assertEqual(router.db_for_read(Asset), 'default')
+            self.assertEqual(router.db_for_read(Asset), 'replica')
+            # an object read from the replica is written to the primary
+            self.asset._state.db = 'replica'
+            self.assertEqual(
+                router.db_for_write(Asset, instance=self.asset), 'default'
+            )
+            self.assertEqual(router.db_for_read(Asset), 'default')
+        finally:
+            route = end_request_route(token)
+        self.assertEqual(str(route), 'replica')
+        self.assertFalse(router.allow_migrate('replica', 'financial'))
+
+    # the default database stands in for its replica
+    @override_settings(DATABASE_REPLICAS={'default': ['default']})
+    def test_read_your_writes(self):
+        """Testar se o usuário é fixado no primário depois de escrever."""
+        from .routers import get_route_counts
+        response = self.client.get('/financial/api/rest/appliance/list/')
+        self.assertEqual(response['X-DB-Route'], 'replica')
+        response = self.client.post('/financial/api/rest/appliance/add/', {
+            'asset': self.asset.pk,
+            'request_date': '2021-01-10',
+            'quantity': 10,
+            'unit_price': 10,
+            'user': self.user.pk,
+        })
+        self.assertEqual(response['X-DB-Route'], 'primary; reason=unsafe')
+        response = self.client.get('/financial/api/rest/appliance/list/')
+        self.assertEqual(response['X-DB-Route'], 'primary; reason=pinned')
+        self.assertEqual(len(response.data), 1)
+        self.assertEqual(get_route_counts(), {'primary': 2, 'replica': 1})
+
+    @override_settings(DATABASE_REPLICAS=SELF_REPLICAS)
+    def test_pin_cookie(self):
+        """Testar se a fixação vem do cookie assinado e expira."""
+        from django.core.cache import cache
+        from .routers import PIN_COOKIE
+        url = '/financial/api/rest/appliance/list/'
+        self.client.post('/financial/api/rest/appliance/add/', {
+            'asset': self.asset.pk,
+            'request_date': '2021-01-10',
+            'quantity': 10,
+            'unit_price': 10,
+            'user': self.user.pk,
+        })
+        self.assertEqual(
+            self.client.cookies[PIN_COOKIE]['max-age'],
+            settings.REPLICA_PIN_SECONDS
+        )
+        # the pin isn't in the cache, another worker sees it as well
+        cache.clear()
+        self.assertEqual(
+            self.client.get(url)['X-DB-Route'], 'primary; reason=pinned'
+        )
+        # the age of the signature is checked, the cookie may be kept
+        with override_settings(REPLICA_PIN_SECONDS=-1):
+            self.assertEqual(self.client.get(url)['X-DB-Route'], 'replica')
+        # a forged cookie isn't accepted
+        self.client.cookies[PIN_COOKIE] = str(self.user.pk)
+        self.assertEqual(self.client.get(url)['X-DB-Route'], 'replica')
+
+    @override_settings(DATABASE_REPLICAS=SELF_REPLICAS)
+    def test_pin_without_cookie(self):
+        """Testar a fixação de um cliente que não guarda cookies."""
+        from .routers import PIN_COOKIE
+        url = '/financial/api/rest/appliance/list/'
+        self.client.post('/financial/api/rest/appliance/add/', {
+            'asset': self.asset.pk,
+            'request_date': '2021-01-10',
+            'quantity': 10,
+            'unit_price': 10,
+            'user': self.user.pk,
+        })
+        del self.client.cookies[PIN_COOKIE]
+        response = self.client.get(url)
+        self.assertEqual(response['X-DB-Route'], 'primary; reason=pinned')
+        self.assertEqual(len(response.data), 1)
+
+
+class TestCachedPermissions(TestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        from django.contrib.auth.models import Permission, User
+        self.user = User.objects.create_user(
+            username='testuser1',
+            password='123456'
+        )
+        self.user.user_permissions.add(*Permission.objects.filter(
+            content_type__app_label='financial',
+            codename__in=['view_asset', 'add_asset'],
+        ))
+        self.perms = ('financial.view_asset', 'financial.add_asset')
+
+    def tearDown(self):
+        from django.core.cache import cache
+        cache.clear()
+
+    def get_user(self):
+        """A new instance, like each request loads the user."""
+        from django.contrib.auth.models import User
+        return User.objects.get(pk=self.user.pk)
+
+    def test_steady_state_without_queries(self):
+        """Testar se as permissões em cache não consultam o banco."""
+        self.assertTrue(self.get_user().has_perms(self.perms))
+        user = self.get_user()
+        with self.assertNumQueries(0):
+            self.assertTrue(user.has_perms(self.perms))
+
+        # the view checks the permissions without joining auth_permission
+        self.client.login(username='testuser1', password="123456")
+        self.client.get('/financial/asset/view/')
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/financial/asset/view/')
+        self.assertEqual(response.status_code, 200)
+        queries = [query['sql'] for query in context.captured_queries]
+        self.assertFalse(any('auth_permission' in sql for sql in queries))
+
+    def test_invalidated_on_change(self):
+        """Testar se mudanças nos grupos e permissões invalidam o cache."""
+        from django.contrib.auth.models import Group, Permission
+        self.assertTrue(self.get_user().has_perms(self.perms))
+        view_redeem = Permission.objects.get(codename='view_redeem')
+        self.assertFalse(self.get_user().has_perm('financial.view_redeem'))
+
+        group = Group.objects.create(name='investors')
+        self.user.groups.add(group)
+        group.permissions.add(view_redeem)
+        self.assertTrue(self.get_user().has_perm('financial.view_redeem'))
+        group.permissions.remove(view_redeem)
+        self.assertFalse(self.get_user().has_perm('financial.view_redeem'))
+
+        view_redeem.user_set.add(self.user)
+        self.assertTrue(self.get_user().has_perm('financial.view_redeem'))
+        self.user.user_permissions.clear()
+        self.assertFalse(self.get_user().has_perms(self.perms))
+
+    def test_invalidated_only_by_permission_flags(self):
+        """Testar se o login não invalida o cache e o superusuário sim."""
+        from django.core.cache import cache
+        from financial.utils import _get_version
+        from .backends import USER_VERSION_KEY
+        key = USER_VERSION_KEY.format(self.user.pk)
+        version = _get_version(key)
+        self.client.login(username='testuser1', password="123456")
+        user = self.get_user()
+        user.first_name = "Test"
+        user.save()
+        self.assertEqual(cache.get(key), version)
+        self.assertFalse(user.has_perm('financial.view_redeem'))
+
+        user = self.get_user()
+        user.is_superuser = True
+        user.save()
+        self.assertNotEqual(cache.get(key), version)
+        self.assertTrue(self.get_user().has_perm('financial.view_redeem'))
+
+
+class TestStartupImports(TestCase):
+
+    def test_parse_importtime(self):
+        """Testar a leitura da saída do python -X importtime."""
+        from .startup import parse_importtime
+        times = parse_importtime(
+            "import time: self [us] | cumulative | imported package\n"
+            "import time:       120 |        120 |   financial.utils\n"
+            "import time:       300 |        420 | financial\n"
+        )
+        self.assertEqual(
+            [tuple(time) for time in times],
+            [('financial.utils', 120, 120, 1), ('financial', 300, 420, 0)]
+        )
+
+    def test_lazy_modules_not_imported(self):
+        """Testar se as dependências pesadas não são importadas no início."""
+        from .startup import get_eager_lazy_modules, measure_imports
+        times = measure_imports()
+        self.assertIn('financial.views', [time.module for time in times])
+        self.assertEqual(get_eager_lazy_modules(times), [])
@@ -0,0 +1,33 @@
+from django.conf import settings
+from django.utils.http import parse_etags
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.status import HTTP_200_OK, HTTP_304_NOT_MODIFIED
+
+from financial.summary import get_dashboard_summary, get_summary_etag
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def rest_dashboard_summary(request):
+    """
+    Retorna em uma requisição os totais, os totais por ativo, por modalidade
+    e por mês e as últimas latest transações do usuário. Com If-None-Match
+    igual ao ETag retorna 304 sem calcular nada.
+    """
+    latest = request.GET.get('latest', str(settings.DASHBOARD_LATEST))
+    if not latest.isdigit() or int(latest) > settings.DASHBOARD_LATEST_MAX:
+        raise ValidationError({'latest': "Use um número de 0 a {}.".format(
+            settings.DASHBOARD_LATEST_MAX
+        )})
+    latest = int(latest)
+    etag = get_summary_etag(request.user.pk, latest)
+    headers = {'ETag': etag, 'Cache-Control': 'private, no-cache'}
+    if etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+        return Response(status=HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(
+        get_dashboard_summary(request.user, latest), status=HTTP_200_OK,
+        headers=headers
+    )
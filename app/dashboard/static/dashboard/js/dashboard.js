@@ -1,35 +1,84 @@
 document.addEventListener("DOMContentLoaded", function () {
-    var endpoint = "/financial/appliance/dashboard/data/chart/donut/";
-    $.ajax({
-        method: "GET",
-        url: endpoint,
-        success: function (response_data) {
-            dataSeries = response_data.series;
-            dataLabels = response_data.labels;
+    var element = document.getElementById('chart-appliance');
+    var endpoint = element.dataset.summaryUrl;
+    // used when the server can't push, e.g. served without ASGI, the
+    // summary is sent again only when its ETag changed
+    var pollInterval = 30000;
+    var chart = null;
 
-            window.ApexCharts && (new ApexCharts(document.getElementById('chart-appliance'), {
-                chart: {
-                    type: "pie",
-                    width: "100%",
-                    height: 250
-                },
-                series: dataSeries,
-                responsive: [{
-                    breakpoint: 480,
-                    options: {
-                        chart: {
-                            width: "100%",
-                        },
-                        legend: {
-                            position: 'bottom'
-                        }
-                    }
-                }],
-                labels: dataLabels,
-            })).render();
-        },
-        error: function (error_data) {
-            console.log(error_data);
+    function renderChart(donut) {
+        if (chart !== null) {
+            chart.updateOptions({series: donut.series, labels: donut.labels});
+            return;
+        }
+        if (!window.ApexCharts) {
+            return;
         }
-    });
-});
\ No newline at end of file
+        chart = new ApexCharts(element, {
+            chart: {
+                type: "pie",
+                width: "100%",
+                height: 250
+            },
+            series: donut.series,
+            responsive: [{
+                breakpoint: 480,
+                options: {
+                    chart: {
+                        width: "100%",
+                    },
+                    legend: {
+                        position: 'bottom'
+                    }
+                }
+            }],
+            labels: donut.labels,
+        });
+        chart.render();
+    }
+
+    function loadChart() {
+        $.ajax({
+            method: "GET",
+            url: endpoint,
+            ifModified: true,
+            success: function (summary, status) {
+                if (status !== "notmodified") {
+                    renderChart(summary.donut);
+                }
+            },
+            error: function (error_data) {
+                console.log(error_data);
+            }
+        });
+    }
+
+    function poll() {
+        setInterval(loadChart, pollInterval);
+    }
+
+    function listen(url) {
+        var source = new EventSource(url);
+        source.addEventListener("totals", function (event) {
+            var totals = JSON.parse(event.data);
+            document.querySelectorAll("[data-total]").forEach(function (span) {
+                span.textContent = totals[span.dataset.total];
+            });
+            renderChart(totals.donut);
+        });
+        source.onerror = function () {
+            // closed for good (not found or forbidden), the browser retries
+            // the dropped connections by itself
+            if (source.readyState === EventSource.CLOSED) {
+                poll();
+            }
+        };
+    }
+
+    loadChart();
+    if (window.EventSource && element.dataset.eventsUrl) {
+        listen(element.dataset.eventsUrl);
+    } else {
+        poll();
+    }
+});
@@ -1,9 +1,11 @@
 from django.urls import path
 
+from .rest_views import rest_dashboard_summary
 from .views import *
 
 app_name = 'dashboard'
 
 urlpatterns = [
     path('', DashboardView.as_view(), name='dashboard'),
+    path('summary/', rest_dashboard_summary, name='summary'),
 ]
@@ -10,6 +10,7 @@ from django.views import View
 from django.shortcuts import render
 
 from app.templatetags.currency import currency
+from financial.summary import get_dashboard_summary
 from financial.utils import FinancialMixin
 
 from .models import *
@@ -22,11 +23,17 @@ class DashboardView(FinancialMixin, View, LoginRequiredMixin):
     success_url = reverse_lazy("dashboard:dashboard")
 
     def get_context_data(self, **kwargs):
+        # the same cached summary is then fetched by the page for the chart
+        summary = get_dashboard_summary(
+            self.request.user, settings.DASHBOARD_LATEST
+        )
         context = {
             'page_title': self.page_title,
             'page_title_icon': self.page_title_icon,
-            'total_appliance': self.get_total_appliance(),
-            'total_redeemed': self.get_total_redeem(),
+            'total_appliance': summary['totals']['appliance']['total'],
+            'total_redeemed': summary['totals']['redeem']['total'],
+            'sse_url': settings.SSE_DASHBOARD_PATH,
+            'summary_url': reverse_lazy('dashboard:summary'),
         }
         return context
 
@@ -1,7 +1,161 @@
 from django.contrib import admin
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
 
 from .models import *
 
-admin.site.register(Asset)
-admin.site.register(Appliance)
-admin.site.register(Redeem)
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator of the changelists of the large tables. The rows are counted
+    up to count_limit, past it the count of the whole table is estimated
+    from the statistics of the database (kept by ANALYZE) without a scan. A
+    filtered count stops at count_limit rows, the later pages aren't listed.
+    """
+
+    count_limit = 10000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list.order_by()
+        count = queryset[:self.count_limit].count()
+        if count == self.count_limit and not queryset.query.where:
+            estimate = get_estimated_count(queryset)
+            if estimate is not None:
+                return max(estimate, count)
+        return count
+
+
+def get_estimated_count(queryset):
+    """
+    Return the estimated rows of the table of the queryset, or None before
+    the table is analyzed.
+    """
+    connection = connections[queryset.db]
+    table = queryset.model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(
+                "SELECT reltuples FROM pg_class WHERE relname = %s", [table]
+            )
+        elif connection.vendor == 'sqlite':
+            cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'"
+            )
+            if cursor.fetchone() is None:
+                return None
+            # the first number of the stat is the rows of the table
+            cursor.execute(
+                "SELECT CAST(stat AS INTEGER) FROM sqlite_stat1 "
+                "WHERE tbl = %s LIMIT 1", [table]
+            )
+        else:
+            return None
+        row = cursor.fetchone()
+    # -1 or 0 before the table is analyzed
+    if row is not None and row[0] > 0:
+        return int(row[0])
+    return None
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """
+    Admin of the tables with millions of rows, the changelist runs a fixed
+    number of queries bounded by the page size: the related objects shown
+    are joined, the counts are estimated, the foreign keys are edited as raw
+    ids (a select would list every user) and no filter lists the values of
+    a column.
+    """
+
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    ordering = ['-pk']
+    raw_id_fields = ['user']
+
+
+class FinancialAdmin(LargeTableAdmin):
+    """Aplicações e resgates, a hierarquia de datas usa o índice da data."""
+
+    list_display = ['pk', 'request_date', 'asset', 'quantity', 'unit_price',
+                    'total', 'user']
+    list_select_related = ['asset', 'user']
+    date_hierarchy = 'request_date'
+    autocomplete_fields = ['asset']
+
+
+class ArchivedFinancialAdmin(LargeTableAdmin):
+
+    list_display = ['pk', 'request_date', 'asset', 'quantity', 'total',
+                    'user']
+    list_select_related = ['asset', 'user']
+    raw_id_fields = ['asset', 'user']
+
+
+@admin.register(Asset)
+class AssetAdmin(admin.ModelAdmin):
+
+    list_display = ['name', 'modality', 'user']
+    list_select_related = ['user']
+    list_filter = ['modality']
+    search_fields = ['name']
+    raw_id_fields = ['user']
+
+
+admin.site.register(Appliance, FinancialAdmin)
+admin.site.register(Redeem, FinancialAdmin)
+admin.site.register(ArchivedAppliance, ArchivedFinancialAdmin)
+admin.site.register(ArchivedRedeem, ArchivedFinancialAdmin)
+
+
+@admin.register(AssetPrice)
+class AssetPriceAdmin(LargeTableAdmin):
+
+    list_display = ['asset', 'date', 'price']
+    list_select_related = ['asset']
+    raw_id_fields = ['asset']
+
+
+@admin.register(Lot)
+class LotAdmin(LargeTableAdmin):
+
+    list_display = ['pk', 'request_date', 'asset', 'method', 'quantity',
+                    'cost', 'user']
+    list_select_related = ['asset', 'user']
+    raw_id_fields = ['user', 'asset', 'appliance']
+
+
+@admin.register(RealizedGain)
+class RealizedGainAdmin(LargeTableAdmin):
+
+    list_display = ['pk', 'asset', 'gain', 'user']
+    list_select_related = ['asset', 'user']
+    raw_id_fields = ['user', 'asset', 'redeem']
+
+
+@admin.register(PositionSnapshot)
+class PositionSnapshotAdmin(LargeTableAdmin):
+
+    list_display = ['pk', 'as_of', 'asset', 'quantity', 'user']
+    list_select_related = ['asset', 'user']
+    raw_id_fields = ['user', 'asset']
+
+
+@admin.register(TransactionEvent)
+class TransactionEventAdmin(LargeTableAdmin):
+
+    list_display = ['seq', 'created_at', 'kind', 'action', 'transaction_id',
+                    'quantity', 'total', 'user_id', 'asset_id']
+    ordering = ['-seq']
+    raw_id_fields = ['user', 'asset']
+
+
+admin.site.register(ProjectionCheckpoint)
+
+
+@admin.register(AssetBalance)
+class AssetBalanceAdmin(LargeTableAdmin):
+
+    list_display = ['asset', 'applied_total', 'redeemed_total', 'user']
+    list_select_related = ['asset', 'user']
+    raw_id_fields = ['user', 'asset']
@@ -0,0 +1,212 @@
+import numpy as np
+from django.core.cache import cache
+from django.utils import timezone
+
+from .models import *
+from .utils import (
+    get_assets_version, get_prices_version, get_user_data_version,
+)
+from .valuation import get_user_valuation
+
+DAYS_PER_YEAR = 365
+# one entry a user and versions, it holds the last period computed, so the
+# distinct periods requested don't add entries to the cache
+CACHE_KEY = "financial:analytics:{}:{}:{}:{}"
+CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def daily_returns(market_value, cash_flow):
+    """
+    Return the daily returns of each column, the flows of the day are
+    considered at the end of the day. A day without value invested on the day
+    before has return zero and it is not active.
+    """
+    previous = np.zeros_like(market_value)
+    previous[1:] = market_value[:-1]
+    active = previous > 0
+    returns = np.divide(
+        market_value - cash_flow, previous,
+        out=np.ones_like(market_value), where=active
+    ) - 1
+    return returns, active
+
+
+def time_weighted_return(returns):
+    """Return the time weighted return of each column."""
+    return np.prod(1 + returns, axis=0) - 1
+
+
+def annualized_volatility(returns, active):
+    """Return the annualized standard deviation of the active daily returns."""
+    count = active.sum(axis=0)
+    mean = np.divide(
+        (returns * active).sum(axis=0), count,
+        out=np.zeros(returns.shape[1]), where=count > 0
+    )
+    variance = np.divide(
+        (((returns - mean) ** 2) * active).sum(axis=0), count - 1,
+        out=np.full(returns.shape[1], np.nan), where=count > 1
+    )
+    return np.sqrt(variance * DAYS_PER_YEAR)
+
+
+def max_drawdown(returns):
+    """Return the largest fall from a peak of the wealth index of each column."""
+    if not len(returns):
+        return np.zeros(returns.shape[1])
+    wealth = np.cumprod(1 + returns, axis=0)
+    peak = np.maximum.accumulate(wealth, axis=0)
+    return (wealth / peak - 1).min(axis=0)
+
+
+def xirr(days, amounts, tolerance=1e-7, max_iterations=50):
+    """
+    Return the annual internal rate of return of the cash flows, days is the
+    number of days of each flow since the first one. Newton's method is tried
+    first and bisection is used if it doesn't converge. Return None if the
+    flows don't have a positive and a negative amount.
+    """
+    amounts = np.asarray(amounts, dtype=np.float64)
+    years = np.asarray(days, dtype=np.float64) / DAYS_PER_YEAR
+    if not (amounts > 0).any() or not (amounts < 0).any():
+        return None
+
+    def npv(rate):
+        return (amounts * (1 + rate) ** -years).sum()
+
+    rate = 0.1
+    for _ in range(max_iterations):
+        discount = (1 + rate) ** -years
+        value = (amounts * discount).sum()
+        derivative = (-years * amounts * discount / (1 + rate)).sum()
+        if derivative == 0:
+            break
+        new_rate = rate - value / derivative
+        if not np.isfinite(new_rate) or new_rate <= -1:
+            break
+        if abs(new_rate - rate) < tolerance:
+            return float(new_rate)
+        rate = new_rate
+
+    low, high = -0.999999, 1.0
+    while npv(high) * npv(low) > 0:
+        high *= 10
+        if high > 1e9:
+            return None
+    for _ in range(200):
+        middle = (low + high) / 2
+        if npv(low) * npv(middle) <= 0:
+            high = middle
+        else:
+            low = middle
+        if high - low < tolerance:
+            break
+    return float((low + high) / 2)
+
+
+def _column_xirr(market_value, cash_flow):
+    """
+    Return the xirr of one column as if the position was bought by its value
+    on the first day and sold by its value on the last day.
+    """
+    if not len(cash_flow):
+        return None
+    flows = -cash_flow.copy()
+    flows[0] = -market_value[0]
+    flows[-1] += market_value[-1]
+    days = np.flatnonzero(flows)
+    return xirr(days, flows[days])
+
+
+def compute_analytics(market_value, cash_flow):
+    """
+    Compute the metrics of each column of the daily market value and cash
+    flow matrices, return a list of dicts in the order of the columns.
+    """
+    returns, active = daily_returns(market_value, cash_flow)
+    metrics = zip(
+        time_weighted_return(returns),
+        annualized_volatility(returns, active),
+        max_drawdown(returns),
+    )
+    result = []
+    for column, (twr, volatility, drawdown) in enumerate(metrics):
+        result.append({
+            'twr': _to_float(twr),
+            'xirr': _to_float(
+                _column_xirr(market_value[:, column], cash_flow[:, column])
+            ),
+            'volatility': _to_float(volatility),
+            'max_drawdown': _to_float(drawdown),
+        })
+    return result
+
+
+def _to_float(value):
+    if value is None or not np.isfinite(value):
+        return None
+    return round(float(value), 6)
+
+
+def get_user_analytics(user, start=None, end=None, max_days=None):
+    """
+    Return the metrics of the user portfolio, by modality and by asset. The
+    result of the last period is memoized until the user data, the prices
+    or the assets (e.g. a modality) change, in the other workers too if the
+    cache is shared. Raise PeriodTooLong as get_user_valuation.
+    """
+    if end is None:
+        end = timezone.localdate()
+    key = CACHE_KEY.format(
+        user.pk, get_user_data_version(user.pk), get_prices_version(),
+        get_assets_version()
+    )
+    cached = cache.get(key)
+    if cached is not None and cached[:2] == (start, end):
+        return cached[2]
+    analytics = _compute_user_analytics(user, start, end, max_days)
+    cache.set(key, (start, end, analytics), CACHE_TIMEOUT)
+    return analytics
+
+
+def _compute_user_analytics(user, start, end, max_days):
+    valuation = get_user_valuation(
+        user, start=start, end=end, max_days=max_days
+    )
+    assets = Asset.objects.in_bulk(valuation.asset_ids.tolist())
+    modalities = sorted(
+        {assets[pk].modality for pk in valuation.asset_ids.tolist()}
+    )
+    # one column per modality with the sum of the columns of its assets
+    grouping = np.zeros((len(valuation.asset_ids), len(modalities)))
+    for column, pk in enumerate(valuation.asset_ids.tolist()):
+        grouping[column, modalities.index(assets[pk].modality)] = 1
+    market_value = np.hstack([
+        valuation.asset_market_value,
+        valuation.asset_market_value @ grouping,
+        valuation.market_value[:, None],
+    ])
+    cash_flow = np.hstack([
+        valuation.asset_cash_flow,
+        valuation.asset_cash_flow @ grouping,
+        valuation.asset_cash_flow.sum(axis=1)[:, None],
+    ])
+    metrics = compute_analytics(market_value, cash_flow)
+
+    n_assets = len(valuation.asset_ids)
+    return {
+        'portfolio': metrics[-1],
+        'modalities': {
+            modality: metrics[n_assets + index]
+            for index, modality in enumerate(modalities)
+        },
+        'assets': [
+            dict(
+                asset=pk,
+                name=assets[pk].name,
+                modality=assets[pk].modality,
+                **metrics[column]
+            )
+            for column, pk in enumerate(valuation.asset_ids.tolist())
+        ],
+    }
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class FinancialConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'financial'
+
+    def ready(self):
+        # connect the signal handlers
+        from . import signals  # noqa: F401
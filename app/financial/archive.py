@@ -0,0 +1,134 @@
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Sum
+
+from .models import *
+
+# hot model -> (archive model, kind in the rollup)
+ARCHIVES = {
+    Appliance: (ArchivedAppliance, ArchiveRollup.APPLIANCE),
+    Redeem: (ArchivedRedeem, ArchiveRollup.REDEEM),
+}
+FIELDS = [field.attname for field in Appliance._meta.concrete_fields]
+
+
+def get_ledger_models(model):
+    """Return the hot model and its archive model, to query both."""
+    return (model, ARCHIVES[model][0])
+
+
+def get_history(model, user, only=None, **filters):
+    """
+    Return a queryset with the rows of the user in the hot and archive tables
+    as a union, the rows are instances of the hot model. The union can still
+    be ordered, sliced and counted but not filtered, so pass the filters here,
+    and the fields to load in only.
+    """
+    hot, archive = get_ledger_models(model)
+    hot_rows = hot.objects.for_user(user).filter(**filters)
+    archive_rows = archive.objects.for_user(user).filter(**filters)
+    if only is not None:
+        hot_rows, archive_rows = hot_rows.only(*only), archive_rows.only(*only)
+    return hot_rows.union(archive_rows, all=True)
+
+
+def get_rollup_totals(model, user_id):
+    """Return a dict of asset_id to the total archived of the user."""
+    return dict(
+        ArchiveRollup.objects.for_user(user_id).filter(
+            kind=ARCHIVES[model][1]
+        ).values_list('asset_id', 'total')
+    )
+
+
+def get_totals_by_asset(model, user_id):
+    """
+    Return a dict of asset_id to the exact total of the user, the hot rows
+    are aggregated and the archived ones come from the rollups.
+    """
+    totals = defaultdict(int, get_rollup_totals(model, user_id))
+    for asset_id, total in model.objects.for_user(user_id).values(
+        'asset_id'
+    ).annotate(total=Sum('total')).values_list('asset_id', 'total'):
+        totals[asset_id] += total or 0
+    return dict(totals)
+
+
+def bulk_copy(queryset, objs):
+    """
+    bulk_create() copies of rows keeping their auto_now and auto_now_add
+    fields, bulk_create() sets them to now, so they are written back.
+    """
+    fields = [
+        field for field in queryset.model._meta.concrete_fields
+        if getattr(field, 'auto_now', False)
+        or getattr(field, 'auto_now_add', False)
+    ]
+    values = [[getattr(obj, field.attname) for field in fields] for obj in objs]
+    queryset.bulk_create(objs)
+    if not fields or not objs:
+        return
+    for obj, row in zip(objs, values):
+        for field, value in zip(fields, row):
+            setattr(obj, field.attname, value)
+    queryset.bulk_update(objs, [field.name for field in fields])
+
+
+def _archive_chunk(model, rows, using):
+    """Copy the rows to the archive, update the rollups and remove them."""
+    archive, kind = ARCHIVES[model]
+    rollups = defaultdict(lambda: [0, 0, 0])
+    for row in rows:
+        rollup = rollups[(row['user_id'], row['asset_id'])]
+        rollup[0] += 1
+        rollup[1] += row['quantity']
+        rollup[2] += row['total'] or 0
+    with transaction.atomic(using=using):
+        bulk_copy(
+            archive.objects.using(using), [archive(**row) for row in rows]
+        )
+        for (user_id, asset_id), (count, quantity, total) in rollups.items():
+            updated = ArchiveRollup.objects.using(using).filter(
+                user_id=user_id, asset_id=asset_id, kind=kind
+            ).update(
+                count=F('count') + count,
+                quantity=F('quantity') + quantity,
+                total=F('total') + total,
+            )
+            if not updated:
+                ArchiveRollup.objects.using(using).create(
+                    user_id=user_id, asset_id=asset_id, kind=kind,
+                    count=count, quantity=quantity, total=total,
+                )
+        # raw delete, the rows still exist in the archive so nothing derived
+        # from them (signals and lots) must change
+        queryset = model.objects.using(using).filter(
+            pk__in=[row['id'] for row in rows]
+        )
+        queryset._raw_delete(using)
+
+
+def archive_transactions(cutoff, chunk_size=1000, progress=None):
+    """
+    Move the transactions with request date before the cutoff to the archive
+    in chunks, each chunk in its own transaction so the lock is released
+    between them. Each shard is archived in turn. Return a dict of model name
+    to the number of rows moved.
+    """
+    moved = {model.__name__: 0 for model in ARCHIVES}
+    for using in settings.FINANCIAL_SHARDS:
+        for model in ARCHIVES:
+            while True:
+                rows = list(
+                    model.objects.using(using).filter(request_date__lt=cutoff)
+                    .order_by('pk').values(*FIELDS)[:chunk_size]
+                )
+                if not rows:
+                    break
+                _archive_chunk(model, rows, using)
+                moved[model.__name__] += len(rows)
+                if progress is not None:
+                    progress(model, moved[model.__name__])
+    return moved
@@ -0,0 +1,143 @@
+from functools import partial
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from .archive import get_ledger_models
+from .models import *
+
+KINDS = {
+    Appliance: TransactionEvent.APPLIANCE,
+    Redeem: TransactionEvent.REDEEM,
+}
+STATE_FIELDS = ['user_id', 'asset_id', 'request_date', 'quantity', 'total']
+
+
+def get_state(instance):
+    """Return the fields of a transaction recorded in its events."""
+    return {field: getattr(instance, field) for field in STATE_FIELDS}
+
+
+def load_previous_state(instance, using):
+    """
+    Return the stored state of a transaction about to be updated, or None
+    when it is being created.
+    """
+    if instance._state.adding or instance.pk is None:
+        return None
+    return type(instance)._base_manager.using(using).filter(
+        pk=instance.pk
+    ).values(*STATE_FIELDS).first()
+
+
+def append_event(model, transaction_id, action, state,
+                 using=DEFAULT_DB_ALIAS):
+    """
+    Append an event of a transaction written on the database using to the
+    log. The log is a single sequence on the default database, the event of
+    a transaction on a shard is written to the PendingEvent outbox of the
+    shard in the same transaction and moved to the log once committed (see
+    relay_events), so a rollback of either leaves no phantom event.
+    """
+    fields = dict(
+        kind=KINDS[model], action=action, transaction_id=transaction_id,
+        **state
+    )
+    if using == DEFAULT_DB_ALIAS:
+        return TransactionEvent.objects.using(DEFAULT_DB_ALIAS).create(
+            **fields
+        )
+    event = PendingEvent.objects.using(using).create(**fields)
+    transaction.on_commit(partial(relay_events, using), using=using)
+    return event
+
+
+def relay_events(using, chunk_size=1000):
+    """
+    Move the events of the outbox of a shard to the log in the order they
+    were written. The log keeps the id of the outbox row, an event moved by
+    a relay that failed before removing it isn't appended again. Return the
+    number of events moved.
+    """
+    relayed = 0
+    if using == DEFAULT_DB_ALIAS:
+        # the events of the default database are appended directly
+        return relayed
+    while True:
+        pending = list(
+            PendingEvent.objects.using(using).order_by('pk')[:chunk_size]
+        )
+        if not pending:
+            break
+        TransactionEvent.objects.using(DEFAULT_DB_ALIAS).bulk_create([
+            TransactionEvent(
+                outbox_id=event.pk, kind=event.kind, action=event.action,
+                transaction_id=event.transaction_id,
+                **{field: getattr(event, field) for field in STATE_FIELDS}
+            )
+            for event in pending
+        ], ignore_conflicts=True)
+        PendingEvent.objects.using(using).filter(
+            pk__in=[event.pk for event in pending]
+        )._raw_delete(using)
+        relayed += len(pending)
+    return relayed
+
+
+def relay_all_events():
+    """Move the pending events of every shard to the log, see relay_events."""
+    return sum(relay_events(alias) for alias in settings.FINANCIAL_SHARDS)
+
+
+def record_saved(instance, previous=None, using=DEFAULT_DB_ALIAS):
+    """
+    Append the events of a saved transaction, an update removes the previous
+    state before adding the new one.
+    """
+    model = type(instance)
+    if previous is not None:
+        append_event(
+            model, instance.pk, TransactionEvent.REMOVED, previous, using
+        )
+    append_event(
+        model, instance.pk, TransactionEvent.ADDED, get_state(instance), using
+    )
+
+
+def record_deleted(instance, using=DEFAULT_DB_ALIAS):
+    append_event(
+        type(instance), instance.pk, TransactionEvent.REMOVED,
+        get_state(instance), using
+    )
+
+
+def seed_events(using, chunk_size=1000):
+    """
+    Append an added event for each transaction (hot or archived) of a
+    database, for the data written before the log existed. Run it once per
+    shard on an empty log. Return the number of events appended.
+    """
+    # the data already holds the writes of the pending events
+    PendingEvent.objects.using(using)._raw_delete(using)
+    appended = 0
+    for model, kind in KINDS.items():
+        for ledger_model in get_ledger_models(model):
+            queryset = ledger_model._base_manager.using(using).order_by(
+                'pk'
+            ).values_list('pk', *STATE_FIELDS)
+            last = 0
+            while True:
+                rows = list(queryset.filter(pk__gt=last)[:chunk_size])
+                if not rows:
+                    break
+                TransactionEvent.objects.using(DEFAULT_DB_ALIAS).bulk_create([
+                    TransactionEvent(
+                        kind=kind, action=TransactionEvent.ADDED,
+                        transaction_id=row[0],
+                        **dict(zip(STATE_FIELDS, row[1:]))
+                    )
+                    for row in rows
+                ])
+                last = rows[-1][0]
+                appended += len(rows)
+    return appended
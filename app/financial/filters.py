@@ -1,24 +1,64 @@
 import django_filters
+from django.utils.translation import gettext as _
 
 from .models import *
+from .search import search_assets
+from .widgets import AssetLookupSelect
+
+# the filter is a list of ids, a search matching more is truncated
+ASSET_SEARCH_MAX_RESULTS = 1000
 
 
 class AssetFilter(django_filters.FilterSet):
-    name = django_filters.CharFilter(lookup_expr="name__icontains")
+    name = django_filters.CharFilter(method='filter_name')
+
+    def filter_name(self, queryset, name, value):
+        """Assets with a word starting with the value, ignoring accents."""
+        return queryset.filter(
+            pk__in=search_assets(value, limit=ASSET_SEARCH_MAX_RESULTS)
+        )
 
     class Meta:
         model = Asset
         fields = ['name', 'modality']
 
 
-class ApplianceFilter(django_filters.FilterSet):
+class FinancialFilter(django_filters.FilterSet):
+    """
+    Base of the appliance and redeem filters. The views filter by the user
+    too, so a date range is a range scan of the (user, request_date) index.
+    """
+    asset = django_filters.ModelChoiceFilter(
+        queryset=Asset.objects.all(),
+        widget=AssetLookupSelect(),
+    )
+    modality = django_filters.ChoiceFilter(
+        field_name='asset__modality',
+        choices=Asset.MODALITY_CHOICES,
+        label=_("Modality"),
+    )
+    request_date_from = django_filters.DateFilter(
+        field_name='request_date', lookup_expr='gte', label=_("From"),
+    )
+    request_date_to = django_filters.DateFilter(
+        field_name='request_date', lookup_expr='lte', label=_("To"),
+    )
+    total_min = django_filters.NumberFilter(
+        field_name='total', lookup_expr='gte', label=_("Minimum Total"),
+    )
+    total_max = django_filters.NumberFilter(
+        field_name='total', lookup_expr='lte', label=_("Maximum Total"),
+    )
+
+
+class ApplianceFilter(FinancialFilter):
 
     class Meta:
         model = Appliance
         fields = ['asset', 'request_date']
 
 
-class RedeemFilter(django_filters.FilterSet):
+class RedeemFilter(FinancialFilter):
 
     class Meta:
         model = Redeem
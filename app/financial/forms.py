@@ -6,6 +6,7 @@ from crispy_forms.bootstrap import PrependedText
 from django.utils.translation import gettext as _
 
 from .models import *
+from .widgets import AssetLookupSelect
 
 
 class AssetForm(forms.ModelForm):
@@ -69,6 +70,7 @@ class ApplianceForm(forms.ModelForm):
     class Meta:
         model = Appliance
         widgets = {
+            'asset': AssetLookupSelect(),
             'request_date': forms.DateInput(format='%Y-%m-%d', attrs={'type': 'date', 'class': 'form-control'}),
         }
         fields = '__all__'
@@ -104,6 +106,7 @@ class RedeemForm(forms.ModelForm):
     class Meta:
         model = Redeem
         widgets = {
+            'asset': AssetLookupSelect(),
             'request_date': forms.DateInput(format='%Y-%m-%d', attrs={'type': 'date', 'class': 'form-control'}),
         }
         fields = '__all__'
@@ -0,0 +1,191 @@
+import asyncio
+import json
+import threading
+from http.cookies import SimpleCookie
+from importlib import import_module
+from types import SimpleNamespace
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user
+from django.core.cache import cache
+
+from app.templatetags.currency import currency
+
+from .utils import FinancialMixin, get_user_data_version
+
+TOTALS_KEY = "financial:live_totals:{}:{}"
+# only bounds the memory, a new version of the data changes the key
+TOTALS_TIMEOUT = 60
+
+get_version = sync_to_async(get_user_data_version)
+
+
+class Broker:
+    """
+    In-process publish/subscribe of the users whose financial data changed.
+    Each subscriber is an asyncio.Event set in its own event loop, publish()
+    can be called from any thread (the signal handlers run in the thread of
+    the view). Several changes before the subscriber wakes up are coalesced
+    into one. Only the connections of this process are notified, the ones of
+    the other processes see the change by the data version in the shared
+    cache (see dashboard_events).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}
+
+    def subscribe(self, user_id):
+        """Return an asyncio.Event set when the data of the user changes."""
+        event = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add((event, loop))
+        return event
+
+    def unsubscribe(self, user_id, event):
+        with self._lock:
+            subscribers = self._subscribers.get(user_id, set())
+            subscribers.difference_update(
+                {item for item in subscribers if item[0] is event}
+            )
+            if not subscribers:
+                self._subscribers.pop(user_id, None)
+
+    def publish(self, user_id):
+        with self._lock:
+            subscribers = list(self._subscribers.get(user_id, ()))
+        for event, loop in subscribers:
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(event.set)
+
+    def count(self):
+        """Return the number of subscribers."""
+        with self._lock:
+            return sum(len(items) for items in self._subscribers.values())
+
+
+broker = Broker()
+
+
+def get_dashboard_totals(user):
+    """
+    Return the totals and the donut series shown in the dashboard, kept in
+    the cache by the data version so the connections of a user share them.
+    """
+    key = TOTALS_KEY.format(user.pk, get_user_data_version(user.pk))
+    totals = cache.get(key)
+    if totals is None:
+        totals = _get_dashboard_totals(user)
+        cache.set(key, totals, TOTALS_TIMEOUT)
+    return totals
+
+
+def _get_dashboard_totals(user):
+    mixin = FinancialMixin(SimpleNamespace(user=user))
+    total_appliance = mixin.get_total_appliance()
+    total_redeemed = mixin.get_total_redeem()
+    return {
+        'total_appliance': currency(total_appliance),
+        'total_redeemed': currency(total_redeemed),
+        'donut': mixin.get_appliance_by_asset_donut_chart(),
+    }
+
+
+def _get_session_user(session_key):
+    engine = import_module(settings.SESSION_ENGINE)
+    request = SimpleNamespace(session=engine.SessionStore(session_key))
+    return get_user(request)
+
+
+async def get_scope_user(scope):
+    """Return the user of the session cookie, or scope['user'] if given."""
+    if 'user' in scope:
+        return scope['user']
+    cookie = SimpleCookie()
+    for name, value in scope.get('headers', []):
+        if name == b'cookie':
+            cookie.load(value.decode('latin-1'))
+    morsel = cookie.get(settings.SESSION_COOKIE_NAME)
+    return await sync_to_async(_get_session_user)(
+        morsel.value if morsel is not None else None
+    )
+
+
+def format_event(name, data):
+    return "event: {}\ndata: {}\n\n".format(name, json.dumps(data)).encode()
+
+
+async def _wait_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+async def dashboard_events(scope, receive, send):
+    """
+    ASGI app streaming the dashboard totals of the user as Server-Sent
+    Events, a "totals" event on connect and after each change of the data
+    of the user, and a comment every SSE_KEEPALIVE_SECONDS so the proxies
+    keep the idle connection open. The changes made in this process are
+    published by the broker, the ones made by the other processes are seen
+    by checking the data version in the cache every SSE_POLL_SECONDS. An
+    idle connection costs a task waiting on an asyncio.Event and a cache
+    read per check, no query.
+    """
+    user = await get_scope_user(scope)
+    if not user.is_authenticated:
+        await send({
+            'type': 'http.response.start', 'status': 403,
+            'headers': [(b'content-type', b'text/plain')],
+        })
+        await send({'type': 'http.response.body', 'body': b'Forbidden'})
+        return
+
+    changed = broker.subscribe(user.pk)
+    disconnect = asyncio.ensure_future(_wait_disconnect(receive))
+    try:
+        await send({
+            'type': 'http.response.start', 'status': 200,
+            'headers': [
+                (b'content-type', b'text/event-stream'),
+                (b'cache-control', b'no-cache'),
+                (b'x-accel-buffering', b'no'),
+            ],
+        })
+        # the totals may have changed since the page was rendered
+        changed.set()
+        loop = asyncio.get_running_loop()
+        version = None
+        sent = loop.time()
+        while not disconnect.done():
+            waiter = asyncio.ensure_future(changed.wait())
+            await asyncio.wait(
+                [waiter, disconnect], timeout=settings.SSE_POLL_SECONDS,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            if disconnect.done():
+                waiter.cancel()
+                break
+            if not changed.is_set():
+                waiter.cancel()
+                # a write served by another process isn't published here
+                if await get_version(user.pk) != version:
+                    changed.set()
+            if changed.is_set():
+                changed.clear()
+                # read first, a change while computing is pushed again
+                version = await get_version(user.pk)
+                totals = await sync_to_async(get_dashboard_totals)(user)
+                body = format_event('totals', totals)
+            elif loop.time() - sent >= settings.SSE_KEEPALIVE_SECONDS:
+                body = b": keepalive\n\n"
+            else:
+                continue
+            await send({
+                'type': 'http.response.body', 'body': body, 'more_body': True,
+            })
+            sent = loop.time()
+    finally:
+        disconnect.cancel()
+        broker.unsubscribe(user.pk, changed)
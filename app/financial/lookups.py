@@ -0,0 +1,86 @@
+import copy
+import threading
+import time
+
+from django.conf import settings
+
+from .models import *
+from .utils import get_assets_version
+
+
+class AssetCache:
+    """
+    Assets by pk kept in the process for ASSET_CACHE_TIMEOUT seconds, all of
+    them are dropped when the assets version changes (an asset was saved or
+    deleted). The change is seen at once by the process that made it and by
+    the others only if the cache is shared, otherwise they may serve the old
+    asset until its entry expires. Copies are returned, the cached instances
+    are shared by the threads.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._assets = {}
+
+    def get_many(self, pks, version):
+        """Return pk -> asset of the cached pks of the version."""
+        now = time.monotonic()
+        with self._lock:
+            if version != self._version:
+                return {}
+            found = {}
+            for pk in pks:
+                item = self._assets.get(pk)
+                if item is not None and item[1] > now:
+                    found[pk] = copy.copy(item[0])
+        return found
+
+    def set_many(self, assets, version):
+        expires = time.monotonic() + settings.ASSET_CACHE_TIMEOUT
+        with self._lock:
+            if version != self._version:
+                self._version = version
+                self._assets = {}
+            for pk, asset in assets.items():
+                self._assets[pk] = (copy.copy(asset), expires)
+
+    def clear(self):
+        with self._lock:
+            self._version = None
+            self._assets = {}
+
+
+asset_cache = AssetCache()
+
+
+class AssetLookup:
+    """
+    Assets by pk for the duration of a request, the assets version is read
+    once. The pks missing in the request and in the process are loaded with
+    one in_bulk() query, so prefetch() the pks of a multi-record payload
+    before validating it.
+    """
+
+    def __init__(self):
+        self.version = get_assets_version()
+        self._assets = {}
+
+    def prefetch(self, pks):
+        missing = set(pks) - set(self._assets)
+        if not missing:
+            return
+        found = asset_cache.get_many(missing, self.version)
+        missing -= set(found)
+        if missing:
+            loaded = Asset.objects.in_bulk(missing)
+            asset_cache.set_many(loaded, self.version)
+            found.update(loaded)
+        # unknown pks are remembered as well, they aren't queried again
+        self._assets.update(dict.fromkeys(missing))
+        self._assets.update(found)
+
+    def get(self, pk):
+        """Return the asset, None if it doesn't exist."""
+        self.prefetch([pk])
+        return self._assets[pk]
@@ -0,0 +1,300 @@
+import heapq
+from collections import deque
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+
+from app.routers import primary_reads
+
+from .archive import get_ledger_models
+from .models import *
+from .routers import get_user_shard
+
+APPLIANCE = 0
+REDEEM = 1
+CENTS = Decimal(10) ** -settings.DEFAULT_DECIMAL_PLACES
+BATCH_SIZE = 2000
+
+
+def _take(quantity, cost, take):
+    """Return the cost of taking some quantity of a lot."""
+    if take == quantity:
+        return cost
+    return (cost * take / quantity).quantize(CENTS)
+
+
+def match_lots(transactions, method):
+    """
+    Match the redeems against the appliance lots. transactions is an iterable
+    of (kind, pk, asset_id, request_date, quantity, total) in the processing
+    order (see get_order_key).
+
+    Return a tuple (lots, gains, last) where lots is a dict of asset_id to a
+    deque of open lots [appliance_id, request_date, quantity, cost], gains is
+    a list of (redeem_id, asset_id, request_date, quantity, proceeds, cost)
+    and last is a dict of asset_id to the order key of the last transaction.
+
+    A redeem without enough quantity in the lots has zero cost for the part
+    that is missing.
+    """
+    lots = {}
+    gains = []
+    last = {}
+    for kind, pk, asset_id, request_date, quantity, total in transactions:
+        total = total or Decimal(0)
+        asset_lots = lots.setdefault(asset_id, deque())
+        last[asset_id] = (request_date, kind, pk)
+        if kind == APPLIANCE:
+            if method == Lot.AVERAGE and asset_lots:
+                lot = asset_lots[0]
+                lot[2] += quantity
+                lot[3] += total
+            else:
+                asset_lots.append([pk, request_date, quantity, total])
+            continue
+        remaining = quantity
+        cost = Decimal(0)
+        while remaining > 0 and asset_lots:
+            lot = asset_lots[0]
+            take = min(remaining, lot[2])
+            taken_cost = _take(lot[2], lot[3], take)
+            cost += taken_cost
+            remaining -= take
+            lot[2] -= take
+            lot[3] -= taken_cost
+            if lot[2] == 0:
+                asset_lots.popleft()
+        gains.append((pk, asset_id, request_date, quantity, total, cost))
+    return lots, gains, last
+
+
+def get_order_key(instance):
+    """Return the processing order key of an appliance or redeem."""
+    kind = REDEEM if isinstance(instance, Redeem) else APPLIANCE
+    return (instance.request_date, kind, instance.pk)
+
+
+class LotEngine:
+    """
+    Keep the open lots and the realized gains of the users up to date. Each
+    new transaction is processed incrementally, consuming the oldest lots
+    through an index, a transaction that is not the last one of the asset
+    (backdated) triggers a rebuild of the user asset.
+    """
+
+    def __init__(self, method=None):
+        self.method = method or settings.LOT_METHOD
+
+    def process(self, instance):
+        """Process a new appliance or redeem."""
+        with transaction.atomic(using=get_user_shard(instance.user_id)):
+            state = LotState.objects.for_user(
+                instance.user_id
+            ).select_for_update().filter(
+                asset_id=instance.asset_id,
+                method=self.method,
+            ).first()
+            key = get_order_key(instance)
+            if state is None or key <= (
+                state.last_date, state.last_kind, state.last_id
+            ):
+                self.rebuild(instance.user_id, instance.asset_id)
+                return
+            if key[1] == APPLIANCE:
+                self._add_lot(instance)
+            else:
+                self._consume_lots(instance)
+            state.last_date, state.last_kind, state.last_id = key
+            state.save(update_fields=['last_date', 'last_kind', 'last_id'])
+
+    def _add_lot(self, appliance):
+        lot = None
+        if self.method == Lot.AVERAGE:
+            lot = Lot.objects.for_user(appliance.user_id).filter(
+                asset_id=appliance.asset_id,
+                method=self.method,
+            ).first()
+        if lot is None:
+            Lot.objects.create(
+                user_id=appliance.user_id,
+                asset_id=appliance.asset_id,
+                method=self.method,
+                appliance=appliance,
+                request_date=appliance.request_date,
+                quantity=appliance.quantity,
+                cost=appliance.total or 0,
+            )
+        else:
+            lot.quantity += appliance.quantity
+            lot.cost += appliance.total or 0
+            lot.save(update_fields=['quantity', 'cost'])
+
+    def _consume_lots(self, redeem):
+        lots = Lot.objects.for_user(redeem.user_id).filter(
+            asset_id=redeem.asset_id,
+            method=self.method,
+        ).order_by('request_date', 'id')
+        remaining = redeem.quantity
+        cost = Decimal(0)
+        while remaining > 0:
+            lot = lots.first()
+            if lot is None:
+                break
+            take = min(remaining, lot.quantity)
+            taken_cost = _take(lot.quantity, lot.cost, take)
+            cost += taken_cost
+            remaining -= take
+            if take == lot.quantity:
+                lot.delete()
+            else:
+                lot.quantity -= take
+                lot.cost -= taken_cost
+                lot.save(update_fields=['quantity', 'cost'])
+        proceeds = redeem.total or Decimal(0)
+        RealizedGain.objects.create(
+            user_id=redeem.user_id,
+            asset_id=redeem.asset_id,
+            redeem=redeem,
+            method=self.method,
+            request_date=redeem.request_date,
+            quantity=redeem.quantity,
+            proceeds=proceeds,
+            cost=cost,
+            gain=proceeds - cost,
+        )
+
+    def _get_transactions(self, user_id, asset_id=None):
+        """Return an iterator of the transactions in the processing order."""
+        filters = {}
+        if asset_id is not None:
+            filters['asset_id'] = asset_id
+        fields = ('pk', 'asset_id', 'request_date', 'quantity', 'total')
+        ordering = ('request_date', 'pk')
+
+        def rows(model, kind):
+            queryset = model.objects.for_user(user_id).filter(
+                **filters
+            ).order_by(*ordering)
+            for row in queryset.values_list(*fields).iterator(chunk_size=5000):
+                yield (kind,) + row
+
+        return heapq.merge(
+            *[
+                rows(model, kind)
+                for base, kind in ((Appliance, APPLIANCE), (Redeem, REDEEM))
+                for model in get_ledger_models(base)
+            ],
+            key=lambda row: (row[3], row[0], row[1]),
+        )
+
+    def rebuild(self, user_id, asset_id=None):
+        """
+        Rebuild the lots and realized gains of the user from all of its
+        transactions, or only of the given asset.
+        """
+        filters = {'method': self.method}
+        if asset_id is not None:
+            filters['asset_id'] = asset_id
+        with primary_reads():
+            lots, gains, last = match_lots(
+                self._get_transactions(user_id, asset_id), self.method
+            )
+        using = get_user_shard(user_id)
+        with transaction.atomic(using=using):
+            for model in (Lot, RealizedGain, LotState):
+                model.objects.for_user(user_id).filter(**filters).delete()
+            Lot.objects.using(using).bulk_create(
+                (
+                    Lot(
+                        user_id=user_id,
+                        asset_id=_asset_id,
+                        method=self.method,
+                        appliance_id=appliance_id,
+                        request_date=request_date,
+                        quantity=quantity,
+                        cost=cost,
+                    )
+                    for _asset_id, asset_lots in lots.items()
+                    for appliance_id, request_date, quantity, cost in asset_lots
+                ),
+                batch_size=BATCH_SIZE,
+            )
+            RealizedGain.objects.using(using).bulk_create(
+                (
+                    RealizedGain(
+                        user_id=user_id,
+                        asset_id=_asset_id,
+                        redeem_id=redeem_id,
+                        method=self.method,
+                        request_date=request_date,
+                        quantity=quantity,
+                        proceeds=proceeds,
+                        cost=cost,
+                        gain=proceeds - cost,
+                    )
+                    for redeem_id, _asset_id, request_date, quantity, proceeds,
+                    cost in gains
+                ),
+                batch_size=BATCH_SIZE,
+            )
+            LotState.objects.using(using).bulk_create(
+                (
+                    LotState(
+                        user_id=user_id,
+                        asset_id=_asset_id,
+                        method=self.method,
+                        last_date=key[0],
+                        last_kind=key[1],
+                        last_id=key[2],
+                    )
+                    for _asset_id, key in last.items()
+                ),
+                batch_size=BATCH_SIZE,
+            )
+
+    def invalidate(self, user_id, asset_id=None):
+        """Mark the lots of the user (or of one asset) to be rebuilt."""
+        states = LotState.objects.for_user(user_id)
+        if asset_id is not None:
+            states = states.filter(asset_id=asset_id)
+        states.delete()
+
+    def refresh(self, user_id):
+        """Rebuild the assets of the user that were invalidated."""
+        with primary_reads():
+            self._refresh(user_id)
+
+    def _refresh(self, user_id):
+        assets = set(
+            ArchiveRollup.objects.for_user(user_id)
+            .values_list('asset_id', flat=True)
+        )
+        for model in (Appliance, Redeem):
+            assets.update(
+                model.objects.for_user(user_id)
+                .values_list('asset_id', flat=True).distinct()
+            )
+        current = set(
+            LotState.objects.for_user(user_id).filter(method=self.method)
+            .values_list('asset_id', flat=True)
+        )
+        # assets without a state may not have transactions anymore
+        for model in (Lot, RealizedGain):
+            model.objects.for_user(user_id).filter(method=self.method).exclude(
+                asset_id__in=current
+            ).delete()
+        for asset_id in assets - current:
+            self.rebuild(user_id, asset_id)
+
+    def get_open_lots(self, user_id):
+        """Return the open lots of the user, rebuilding them if needed."""
+        self.refresh(user_id)
+        return Lot.objects.for_user(user_id).filter(method=self.method)
+
+    def get_realized_gains(self, user_id):
+        """Return the realized gains of the user, rebuilding them if needed."""
+        self.refresh(user_id)
+        return RealizedGain.objects.for_user(user_id).filter(
+            method=self.method
+        )
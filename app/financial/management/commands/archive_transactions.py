@@ -0,0 +1,25 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+
+from financial.archive import archive_transactions
+
+
+class Command(BaseCommand):
+    help = "Move the appliances and redeems before a date to the archive tables."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--before', required=True,
+                            type=datetime.date.fromisoformat,
+                            help="YYYY-MM-DD, transactions before it are moved.")
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        def progress(model, moved):
+            self.stdout.write("{}: {} archived".format(model.__name__, moved))
+
+        moved = archive_transactions(
+            options['before'], options['chunk_size'], progress
+        )
+        for name, count in moved.items():
+            self.stdout.write("{} {} rows archived".format(count, name))
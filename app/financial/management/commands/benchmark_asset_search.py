@@ -0,0 +1,51 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from financial.search import AssetNameIndex
+
+WORDS = [
+    "Ação", "Tesouro", "Direto", "Prefixado", "IPCA", "Selic", "Fundo",
+    "Imobiliário", "Crédito", "Privado", "Debênture", "Incentivada", "Banco",
+    "Energia", "Elétrica", "Petróleo", "Mineração", "Saúde", "Educação",
+    "Logística", "Varejo", "Bitcoin", "Ethereum", "Índice", "Câmbio",
+]
+
+
+class Command(BaseCommand):
+    help = "Benchmark the asset name index with synthetic names, without the database."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--assets', type=int, default=1000000)
+        parser.add_argument('--searches', type=int, default=10000)
+        parser.add_argument('--limit', type=int, default=20)
+
+    def handle(self, *args, **options):
+        random.seed(0)
+        rows = (
+            (pk, "{} {} {}".format(
+                random.choice(WORDS), random.choice(WORDS), pk
+            ))
+            for pk in range(options['assets'])
+        )
+        index = AssetNameIndex()
+        begin = time.perf_counter()
+        index.build(rows)
+        self.stdout.write("index of {} assets built in {:.2f} s".format(
+            options['assets'], time.perf_counter() - begin
+        ))
+
+        prefixes = [
+            random.choice(WORDS)[:random.randint(1, 5)].lower()
+            for _ in range(options['searches'])
+        ]
+        begin = time.perf_counter()
+        for prefix in prefixes:
+            index.search(prefix, options['limit'])
+        elapsed = time.perf_counter() - begin
+        self.stdout.write(
+            "{} searches, {:.1f} us per top {} search".format(
+                len(prefixes), elapsed / len(prefixes) * 1e6, options['limit']
+            )
+        )
@@ -0,0 +1,46 @@
+import datetime
+import random
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+
+from financial.lots import APPLIANCE, REDEEM, match_lots
+from financial.models import Lot
+
+
+class Command(BaseCommand):
+    help = "Benchmark the lot matching with synthetic transactions of one user."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--transactions', type=int, default=1000000)
+        parser.add_argument('--assets', type=int, default=50)
+
+    def handle(self, *args, **options):
+        random.seed(0)
+        start = datetime.date(2010, 1, 1)
+        transactions = []
+        for pk in range(options['transactions']):
+            # one in three transactions is a redeem
+            kind = REDEEM if pk % 3 == 2 else APPLIANCE
+            quantity = random.randint(1, 100)
+            transactions.append((
+                kind,
+                pk,
+                random.randint(1, options['assets']),
+                start + datetime.timedelta(days=pk // 300),
+                quantity,
+                Decimal(quantity * random.randint(100, 10000)) / 100,
+            ))
+        for method in (Lot.FIFO, Lot.AVERAGE):
+            begin = time.perf_counter()
+            lots, gains, _ = match_lots(transactions, method)
+            elapsed = time.perf_counter() - begin
+            self.stdout.write(
+                "{}: {} transactions in {:.2f} s, {} open lots, "
+                "{} realized gains".format(
+                    method, len(transactions), elapsed,
+                    sum(len(asset_lots) for asset_lots in lots.values()),
+                    len(gains),
+                )
+            )
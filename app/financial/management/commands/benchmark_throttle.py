@@ -0,0 +1,44 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory, override_settings
+from rest_framework.request import Request
+
+from financial.throttles import TokenBuckets, get_throttle_classes
+
+
+class Command(BaseCommand):
+    help = "Benchmark the token bucket throttle checks, without the database."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--checks', type=int, default=200000)
+        parser.add_argument('--clients', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        checks, clients = options['checks'], options['clients']
+        keys = ["appliance_add:user:{}".format(i) for i in range(clients)]
+        buckets = TokenBuckets()
+        begin = time.perf_counter()
+        for index in range(checks):
+            buckets.consume(keys[index % clients], 30, 2)
+        self.report("bucket consume", begin, checks)
+
+        # the checks of an endpoint: the user and the ip throttles
+        request = Request(RequestFactory().post(
+            '/', REMOTE_ADDR='10.0.0.1'
+        ))
+        request.user = User(pk=1)
+        throttles = [cls() for cls in get_throttle_classes('appliance_add')]
+        rates = {'appliance_add': {'burst': checks, 'rate': 1}}
+        with override_settings(FINANCIAL_THROTTLE_RATES=rates):
+            begin = time.perf_counter()
+            for _ in range(checks):
+                for throttle in throttles:
+                    throttle.allow_request(request, None)
+            self.report("endpoint check (user and ip)", begin, checks)
+
+    def report(self, name, begin, checks):
+        self.stdout.write("{}: {:.2f} us per check".format(
+            name, (time.perf_counter() - begin) / checks * 1e6
+        ))
@@ -0,0 +1,57 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from financial.valuation import compute_valuation
+
+
+class Command(BaseCommand):
+    help = "Benchmark the vectorized valuation with a synthetic portfolio."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--assets', type=int, default=200)
+        parser.add_argument('--years', type=int, default=10)
+        parser.add_argument('--transactions', type=int, default=20000)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(0)
+        start = np.datetime64('2010-01-01')
+        n_days = options['years'] * 365
+        end = start + n_days - 1
+        asset_ids = np.arange(1, options['assets'] + 1)
+
+        n = options['transactions']
+        quantity = rng.integers(1, 100, n).astype(np.float64)
+        # one in four transactions is a redeem
+        quantity[rng.random(n) < 0.25] *= -1
+        transactions = (
+            start + rng.integers(0, n_days, n),
+            rng.choice(asset_ids, n),
+            quantity,
+            np.abs(quantity) * rng.uniform(1, 100, n),
+        )
+        # prices only on business days, weekends are forward filled
+        days = np.arange(start, end + 1)
+        days = days[np.is_busday(days)]
+        price_date = np.tile(days, len(asset_ids))
+        price_asset = np.repeat(asset_ids, len(days))
+        prices = (
+            price_date,
+            price_asset,
+            rng.uniform(1, 100, len(price_date)),
+        )
+
+        timings = []
+        for _ in range(options['repeat']):
+            begin = time.perf_counter()
+            compute_valuation(start, end, asset_ids, transactions, prices)
+            timings.append(time.perf_counter() - begin)
+        self.stdout.write(
+            "{} days x {} assets, {} transactions, {} prices: "
+            "best {:.1f} ms, mean {:.1f} ms".format(
+                n_days, len(asset_ids), n, len(price_date),
+                min(timings) * 1000, sum(timings) / len(timings) * 1000,
+            )
+        )
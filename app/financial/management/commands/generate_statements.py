@@ -0,0 +1,60 @@
+import multiprocessing
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from financial.statements import generate_statement, get_month_range
+
+
+def _close_connections():
+    """The connections inherited from the parent can't be shared."""
+    connections.close_all()
+
+
+def _generate(args):
+    user_id, month, force = args
+    return user_id, generate_statement(user_id, month, force)
+
+
+class Command(BaseCommand):
+    help = "Generate the monthly statements of the users using a process pool."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--month', required=True, help="YYYY-MM")
+        parser.add_argument('--workers', type=int, default=1)
+        parser.add_argument('--user', type=int, action='append',
+                            help="User id, it can be repeated. All by default.")
+        parser.add_argument('--force', action='store_true',
+                            help="Generate even the statements up to date.")
+
+    def handle(self, *args, **options):
+        month = options['month']
+        try:
+            get_month_range(month)
+        except ValueError:
+            raise CommandError("Invalid month {}, use YYYY-MM.".format(month))
+        users = options['user'] or list(
+            User.objects.order_by('pk').values_list('pk', flat=True)
+        )
+        tasks = [(user_id, month, options['force']) for user_id in users]
+
+        if options['workers'] > 1:
+            _close_connections()
+            pool = multiprocessing.get_context('fork').Pool(
+                options['workers'], initializer=_close_connections
+            )
+            with pool:
+                results = list(pool.imap_unordered(
+                    _generate, tasks,
+                    chunksize=max(1, len(tasks) // (options['workers'] * 8))
+                ))
+        else:
+            results = [_generate(task) for task in tasks]
+
+        generated = sum(1 for _, written in results if written)
+        self.stdout.write(
+            "{} statements generated, {} already up to date".format(
+                generated, len(results) - generated
+            )
+        )
@@ -0,0 +1,32 @@
+import csv
+import datetime
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+
+from financial.models import AssetPrice
+
+
+class Command(BaseCommand):
+    help = "Load asset prices from a csv file with the columns asset,date,price."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        with open(options['path'], newline='') as csv_file:
+            rows = (
+                (
+                    int(row['asset']),
+                    datetime.date.fromisoformat(row['date']),
+                    Decimal(row['price']),
+                )
+                for row in csv.DictReader(csv_file)
+            )
+            created, updated = AssetPrice.objects.bulk_load(
+                rows, batch_size=options['batch_size']
+            )
+        self.stdout.write(
+            "{} prices created, {} prices updated".format(created, updated)
+        )
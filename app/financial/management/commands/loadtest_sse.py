@@ -0,0 +1,152 @@
+import asyncio
+import resource
+import threading
+import time
+import tracemalloc
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from financial.live import broker, dashboard_events
+
+
+class Connection:
+    """A client of the dashboard events driven in-process."""
+
+    def __init__(self, user):
+        self.scope = {
+            'type': 'http', 'path': settings.SSE_DASHBOARD_PATH,
+            'headers': [], 'user': user,
+        }
+        self.closed = asyncio.get_running_loop().create_future()
+        self.events = 0
+        self.received = asyncio.Event()
+
+    async def receive(self):
+        await self.closed
+        return {'type': 'http.disconnect'}
+
+    async def send(self, message):
+        if message.get('body', b'').startswith(b'event: totals'):
+            self.events += 1
+            self.received.set()
+
+    def close(self):
+        if not self.closed.done():
+            self.closed.set_result(None)
+
+
+class Command(BaseCommand):
+    help = (
+        "Open many idle dashboard event streams on one event loop and push a "
+        "change to them. By default the ASGI app is driven in-process, with "
+        "--url the connections are opened against a running ASGI server."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--connections', type=int, default=5000)
+        parser.add_argument('--users', type=int, default=100,
+                            help="The connections are spread over user ids "
+                                 "1 to N, nothing is written.")
+        parser.add_argument('--idle', type=float, default=5,
+                            help="Seconds the connections stay idle.")
+        parser.add_argument('--url', help="e.g. http://127.0.0.1:8000, only "
+                                          "opens and holds the connections.")
+        parser.add_argument('--session', help="Session cookie for --url.")
+
+    def handle(self, *args, **options):
+        if options['url']:
+            asyncio.run(self.run_remote(options))
+        else:
+            asyncio.run(self.run_local(options))
+
+    async def run_local(self, options):
+        users = [
+            User(pk=pk, username='loadtest{}'.format(pk))
+            for pk in range(1, options['users'] + 1)
+        ]
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        begin = time.perf_counter()
+        connections = [
+            Connection(users[index % len(users)])
+            for index in range(options['connections'])
+        ]
+        tasks = [
+            asyncio.ensure_future(dashboard_events(
+                connection.scope, connection.receive, connection.send
+            ))
+            for connection in connections
+        ]
+        await asyncio.gather(*(c.received.wait() for c in connections))
+        self.stdout.write(
+            "{} connections open in {:.2f} s, {} subscribers".format(
+                len(connections), time.perf_counter() - begin, broker.count()
+            )
+        )
+
+        await asyncio.sleep(options['idle'])
+        memory = tracemalloc.get_traced_memory()[0] - before
+        self.stdout.write(
+            "idle {:.0f} s: {:.1f} KiB per connection, max RSS {:.0f} MiB"
+            .format(
+                options['idle'], memory / len(connections) / 1024,
+                resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+            )
+        )
+
+        # a write of the first user, published from another thread as the
+        # signal handlers do
+        notified = [c for c in connections if c.scope['user'] is users[0]]
+        for connection in notified:
+            connection.received.clear()
+        begin = time.perf_counter()
+        threading.Thread(target=broker.publish, args=[users[0].pk]).start()
+        await asyncio.gather(*(c.received.wait() for c in notified))
+        self.stdout.write("{} connections of a user pushed in {:.1f} ms".format(
+            len(notified), (time.perf_counter() - begin) * 1000
+        ))
+
+        for connection in connections:
+            connection.close()
+        await asyncio.gather(*tasks)
+        tracemalloc.stop()
+        self.stdout.write("closed, {} subscribers left".format(broker.count()))
+
+    async def run_remote(self, options):
+        url = urlsplit(options['url'])
+        request = (
+            "GET {} HTTP/1.1\r\nHost: {}\r\nAccept: text/event-stream\r\n"
+            "Cookie: {}={}\r\n\r\n".format(
+                settings.SSE_DASHBOARD_PATH, url.netloc,
+                settings.SESSION_COOKIE_NAME, options['session'] or '',
+            )
+        ).encode()
+
+        async def connect():
+            reader, writer = await asyncio.open_connection(
+                url.hostname, url.port or 80
+            )
+            writer.write(request)
+            status = await reader.readline()
+            return reader, writer, b' 200 ' in status
+
+        begin = time.perf_counter()
+        streams = await asyncio.gather(
+            *(connect() for _ in range(options['connections'])),
+            return_exceptions=True
+        )
+        opened = [s for s in streams if not isinstance(s, Exception) and s[2]]
+        self.stdout.write("{} of {} connections open in {:.2f} s".format(
+            len(opened), len(streams), time.perf_counter() - begin
+        ))
+        await asyncio.sleep(options['idle'])
+        alive = sum(1 for reader, _, _ in opened if not reader.at_eof())
+        self.stdout.write("{} still open after {:.0f} s idle".format(
+            alive, options['idle']
+        ))
+        for stream in streams:
+            if not isinstance(stream, Exception):
+                stream[1].close()
@@ -0,0 +1,42 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from financial.purge import purge_user
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete a user and its financial data in small chunks, so the other "
+        "writers aren't blocked while a large account is removed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('user', help="Id or username of the user.")
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument('--pause', type=float, default=0.05,
+                            help="Seconds to wait between the chunks.")
+        parser.add_argument('--keep-user', action='store_true',
+                            help="Delete only the transactions, the user is "
+                                 "kept deactivated.")
+
+    def handle(self, *args, **options):
+        user = User.objects.filter(username=options['user']).first()
+        if user is None and options['user'].isdigit():
+            user = User.objects.filter(pk=options['user']).first()
+        if user is None:
+            raise CommandError("User {} not found.".format(options['user']))
+
+        def progress(model, using, deleted):
+            self.stdout.write("{} on {}: {} deleted".format(
+                model.__name__, using, deleted
+            ))
+
+        deleted = purge_user(
+            user.pk, options['chunk_size'], options['pause'], progress,
+            delete_user=not options['keep_user']
+        )
+        for name, count in deleted.items():
+            if count:
+                self.stdout.write("{} {} rows deleted".format(count, name))
+        if not options['keep_user']:
+            self.stdout.write("User {} deleted".format(user.username))
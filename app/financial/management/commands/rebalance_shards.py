@@ -0,0 +1,57 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from financial.shards import (
+    find_misplaced_users, get_replica_aliases, move_user, move_user_data,
+    sync_replicas,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Move a user to another shard, or without --user move every user "
+        "whose data isn't on its shard (after adding a shard)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, help="User id to move.")
+        parser.add_argument('--to', help="Database alias of the new shard.")
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Only list the users that would be moved.")
+
+    def handle(self, *args, **options):
+        if options['user'] is not None:
+            if options['to'] not in settings.FINANCIAL_SHARDS:
+                raise CommandError(
+                    "--to must be one of {}.".format(
+                        ", ".join(settings.FINANCIAL_SHARDS)
+                    )
+                )
+            if not options['dry_run']:
+                moved = move_user(
+                    options['user'], options['to'], options['chunk_size']
+                )
+                self.stdout.write("{} rows moved to {}".format(
+                    moved, options['to']
+                ))
+            return
+
+        if not options['dry_run']:
+            for alias in get_replica_aliases():
+                copied = sync_replicas(alias, options['chunk_size'])
+                self.stdout.write("{}: {} users and assets copied".format(
+                    alias, copied
+                ))
+        for user_id, source, target in find_misplaced_users():
+            if options['dry_run']:
+                self.stdout.write("user {}: {} -> {}".format(
+                    user_id, source, target
+                ))
+                continue
+            moved = move_user_data(
+                user_id, source, target, options['chunk_size']
+            )
+            self.stdout.write("user {}: {} rows moved from {} to {}".format(
+                user_id, moved, source, target
+            ))
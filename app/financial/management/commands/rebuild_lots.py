@@ -0,0 +1,21 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from financial.lots import LotEngine
+from financial.models import Lot
+
+
+class Command(BaseCommand):
+    help = "Rebuild the open lots and realized gains from the transactions."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append',
+                            help="User id, it can be repeated. All by default.")
+        parser.add_argument('--method', choices=[Lot.FIFO, Lot.AVERAGE])
+
+    def handle(self, *args, **options):
+        engine = LotEngine(options['method'])
+        users = options['user'] or User.objects.values_list('pk', flat=True)
+        for user_id in users:
+            engine.rebuild(user_id)
+            self.stdout.write("Lots of user {} rebuilt".format(user_id))
@@ -0,0 +1,38 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from financial.events import seed_events
+from financial.models import TransactionEvent
+from financial.projections import PROJECTIONS, get_projection
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild projections from the first event of the transaction log, "
+        "all of them by default."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('names', nargs='*', metavar='name',
+                            help="One of: {}.".format(", ".join(PROJECTIONS)))
+        parser.add_argument('--batch-size', type=int)
+        parser.add_argument('--seed', action='store_true',
+                            help="Log the existing transactions first, only "
+                                 "when the log is empty.")
+
+    def handle(self, *args, **options):
+        unknown = set(options['names']) - set(PROJECTIONS)
+        if unknown:
+            raise CommandError(
+                "Unknown projection: {}.".format(", ".join(sorted(unknown)))
+            )
+        if options['seed']:
+            if TransactionEvent.objects.exists():
+                raise CommandError("The transaction log isn't empty.")
+            for alias in settings.FINANCIAL_SHARDS:
+                self.stdout.write("{} events logged from {}".format(
+                    seed_events(alias), alias
+                ))
+        for name in options['names'] or PROJECTIONS:
+            applied = get_projection(name).replay(options['batch_size'])
+            self.stdout.write("{} replayed from {} events".format(name, applied))
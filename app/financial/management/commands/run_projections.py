@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from financial.projections import PROJECTIONS, run_projections
+
+
+class Command(BaseCommand):
+    help = (
+        "Apply the new events of the transaction log to the projections, "
+        "schedule it to keep them up to date."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('names', nargs='*', metavar='name',
+                            help="One of: {}.".format(", ".join(PROJECTIONS)))
+        parser.add_argument('--batch-size', type=int)
+
+    def handle(self, *args, **options):
+        unknown = set(options['names']) - set(PROJECTIONS)
+        if unknown:
+            raise CommandError(
+                "Unknown projection: {}.".format(", ".join(sorted(unknown)))
+            )
+        applied = run_projections(options['names'], options['batch_size'])
+        for name, count in applied.items():
+            self.stdout.write("{}: {} events applied".format(name, count))
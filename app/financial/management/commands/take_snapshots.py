@@ -0,0 +1,40 @@
+import datetime
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from financial.snapshots import count_transactions_since_snapshot, take_snapshot
+
+
+class Command(BaseCommand):
+    help = (
+        "Store the positions of the users at a date, by default at the end of "
+        "the last month. Schedule it monthly or with --every to snapshot only "
+        "the users with many transactions since the last snapshot."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', type=datetime.date.fromisoformat,
+                            help="YYYY-MM-DD, default is the last month end.")
+        parser.add_argument('--every', type=int,
+                            help="Only users with at least N transactions "
+                                 "since the last snapshot.")
+        parser.add_argument('--user', type=int, action='append',
+                            help="User id, it can be repeated. All by default.")
+
+    def handle(self, *args, **options):
+        date = options['date']
+        if date is None:
+            date = timezone.localdate().replace(day=1) - datetime.timedelta(1)
+        users = options['user'] or User.objects.order_by('pk').values_list(
+            'pk', flat=True
+        )
+        taken = 0
+        for user_id in users:
+            if options['every'] and count_transactions_since_snapshot(
+                    user_id) < options['every']:
+                continue
+            take_snapshot(user_id, date)
+            taken += 1
+        self.stdout.write("{} snapshots taken at {}".format(taken, date))
@@ -0,0 +1,27 @@
+# Generated by Django 3.2.5 on 2026-10-19 16:43
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('financial', '0002_auto_20210720_1104'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AssetPrice',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Date')),
+                ('price', models.DecimalField(decimal_places=2, max_digits=11, verbose_name='Price')),
+                ('asset', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='prices', to='financial.asset', verbose_name='Asset')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='assetprice',
+            constraint=models.UniqueConstraint(fields=('asset', 'date'), name='unique_asset_price_date'),
+        ),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 3.2.5 on 2026-10-19 16:48
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('financial', '0003_assetprice'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RealizedGain',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('method', models.CharField(choices=[('FIFO', 'FIFO'), ('AVG', 'Custo Médio')], max_length=4, verbose_name='Method')),
+                ('request_date', models.DateField(verbose_name='Request Date')),
+                ('quantity', models.IntegerField(verbose_name='Quantity')),
+                ('proceeds', models.DecimalField(decimal_places=2, max_digits=11, verbose_name='Proceeds')),
+                ('cost', models.DecimalField(decimal_places=2, max_digits=11, verbose_name='Cost')),
+                ('gain', models.DecimalField(decimal_places=2, max_digits=11, verbose_name='Gain')),
+                ('asset', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='financial.asset', verbose_name='Asset')),
+                ('redeem', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='financial.redeem', verbose_name='Redeem')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='User')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='LotState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('method', models.CharField(choices=[('FIFO', 'FIFO'), ('AVG', 'Custo Médio')], max_length=4, verbose_name='Method')),
+                ('last_date', models.DateField()),
+                ('last_kind', models.PositiveSmallIntegerField()),
+                ('last_id', models.BigIntegerField()),
+                ('asset', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='financial.asset', verbose_name='Asset')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='User')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Lot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('method', models.CharField(choices=[('FIFO', 'FIFO'), ('AVG', 'Custo Médio')], max_length=4, verbose_name='Method')),
+                ('request_date', models.DateField(verbose_name='Request Date')),
+                ('quantity', models.IntegerField(verbose_name='Quantity')),
+                ('cost', models.DecimalField(decimal_places=2, max_digits=11, verbose_name='Cost')),
+                ('appliance', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='financial.appliance', verbose_name='Appliance')),
+                ('asset', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='financial.asset', verbose_name='Asset')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='User')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='realizedgain',
+            index=models.Index(fields=['user', 'method', 'request_date'], name='realized_gain_user_date_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='lotstate',
+            constraint=models.UniqueConstraint(fields=('user', 'asset', 'method'), name='unique_lot_state'),
+        ),
+        migrations.AddIndex(
+            model_name='lot',
+            index=models.Index(fields=['user', 'asset', 'method', 'request_date', 'id'], name='lot_consume_order_idx'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 3.2.5 on 2026-10-19 16:50
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('financial', '0004_lots'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PositionSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('as_of', models.DateField(verbose_name='Date')),
+                ('quantity', models.IntegerField(verbose_name='Quantity')),
+                ('invested', models.DecimalField(decimal_places=2, max_digits=11, verbose_name='Invested')),
+                ('asset', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='financial.asset', verbose_name='Asset')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='User')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='positionsnapshot',
+            constraint=models.UniqueConstraint(fields=('user', 'as_of', 'asset'), name='unique_position_snapshot'),
+        ),
+    ]
@@ -0,0 +1,76 @@
+# Generated by Django 3.2.5 on 2026-10-19 16:52
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('financial', '0005_positionsnapshot'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='lot',
+            name='appliance',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, to='financial.appliance', verbose_name='Appliance'),
+        ),
+        migrations.AlterField(
+            model_name='realizedgain',
+            name='redeem',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, to='financial.redeem', verbose_name='Redeem'),
+        ),
+        migrations.CreateModel(
+            name='ArchiveRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('A', 'Appliance'), ('R', 'Redeem')], max_length=1)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('quantity', models.BigIntegerField(default=0)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=15, verbose_name='Total')),
+                ('asset', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='financial.asset', verbose_name='Asset')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='User')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedRedeem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('request_date', models.DateField(verbose_name='Request Date')),
+                ('quantity', models.IntegerField(verbose_name='Quantity')),
+                ('unit_price', models.DecimalField(decimal_places=2, max_digits=11, verbose_name='Unit Price')),
+                ('ip_address', models.GenericIPAddressField()),
+                ('total', models.DecimalField(blank=True, decimal_places=2, max_digits=11, null=True, verbose_name='Total')),
+                ('asset', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='financial.asset', verbose_name='Modality')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='User')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedAppliance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('request_date', models.DateField(verbose_name='Request Date')),
+                ('quantity', models.IntegerField(verbose_name='Quantity')),
+                ('unit_price', models.DecimalField(decimal_places=2, max_digits=11, verbose_name='Unit Price')),
+                ('ip_address', models.GenericIPAddressField()),
+                ('total', models.DecimalField(blank=True, decimal_places=2, max_digits=11, null=True, verbose_name='Total')),
+                ('asset', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='financial.asset', verbose_name='Modality')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='User')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='archiverollup',
+            constraint=models.UniqueConstraint(fields=('user', 'kind', 'asset'), name='unique_archive_rollup'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedredeem',
+            index=models.Index(fields=['user', 'request_date'], name='archived_redeem_user_date'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedappliance',
+            index=models.Index(fields=['user', 'request_date'], name='archived_appliance_user_date'),
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 3.2.5 on 2026-10-19 17:13
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('financial', '0007_shardassignment'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProjectionCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=64, unique=True, verbose_name='Name')),
+                ('last_seq', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='TransactionEvent',
+            fields=[
+                ('seq', models.BigAutoField(primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Created At')),
+                ('kind', models.CharField(choices=[('A', 'Appliance'), ('R', 'Redeem')], max_length=1)),
+                ('action', models.CharField(choices=[('+', 'Added'), ('-', 'Removed')], max_length=1)),
+                ('transaction_id', models.BigIntegerField()),
+                ('request_date', models.DateField(verbose_name='Request Date')),
+                ('quantity', models.IntegerField(verbose_name='Quantity')),
+                ('total', models.DecimalField(decimal_places=2, max_digits=11, verbose_name='Total')),
+                ('asset', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, to='financial.asset', verbose_name='Asset')),
+                ('user', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, to=settings.AUTH_USER_MODEL, verbose_name='User')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='AssetBalance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('applied_quantity', models.BigIntegerField(default=0)),
+                ('applied_total', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('redeemed_quantity', models.BigIntegerField(default=0)),
+                ('redeemed_total', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('asset', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='financial.asset', verbose_name='Asset')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='User')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='assetbalance',
+            constraint=models.UniqueConstraint(fields=('user', 'asset'), name='unique_asset_balance'),
+        ),
+    ]
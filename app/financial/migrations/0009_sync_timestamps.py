@@ -0,0 +1,74 @@
+# Generated by Django 3.2.5 on 2026-10-19 17:40
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('financial', '0008_events'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='appliance',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now, verbose_name='Created At'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='appliance',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now, verbose_name='Updated At'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='redeem',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now, verbose_name='Created At'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='redeem',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now, verbose_name='Updated At'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='archivedappliance',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now, verbose_name='Created At'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='archivedappliance',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now, verbose_name='Updated At'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='archivedredeem',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now, verbose_name='Created At'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='archivedredeem',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now, verbose_name='Updated At'),
+            preserve_default=False,
+        ),
+        migrations.AddIndex(
+            model_name='appliance',
+            index=models.Index(fields=['user', 'updated_at'], name='appliance_user_updated'),
+        ),
+        migrations.AddIndex(
+            model_name='redeem',
+            index=models.Index(fields=['user', 'updated_at'], name='redeem_user_updated'),
+        ),
+        migrations.AddIndex(
+            model_name='transactionevent',
+            index=models.Index(fields=['user', 'created_at'], name='event_user_created'),
+        ),
+    ]
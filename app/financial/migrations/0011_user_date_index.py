@@ -0,0 +1,24 @@
+# Generated by Django 3.2.5 on 2026-10-19 17:46
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('financial', '0010_request_date_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='appliance',
+            index=models.Index(fields=['user', 'request_date'], name='appliance_user_date'),
+        ),
+        migrations.AddIndex(
+            model_name='redeem',
+            index=models.Index(fields=['user', 'request_date'], name='redeem_user_date'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 3.2.5 on 2026-10-19 18:29
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('financial', '0011_user_date_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transactionevent',
+            name='outbox_id',
+            field=models.BigIntegerField(null=True, unique=True),
+        ),
+        migrations.CreateModel(
+            name='PendingEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('A', 'Appliance'), ('R', 'Redeem')], max_length=1)),
+                ('action', models.CharField(choices=[('+', 'Added'), ('-', 'Removed')], max_length=1)),
+                ('transaction_id', models.BigIntegerField()),
+                ('request_date', models.DateField(verbose_name='Request Date')),
+                ('quantity', models.IntegerField(verbose_name='Quantity')),
+                ('total', models.DecimalField(decimal_places=2, max_digits=11, verbose_name='Total')),
+                ('asset', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, to='financial.asset', verbose_name='Asset')),
+                ('user', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, to=settings.AUTH_USER_MODEL, verbose_name='User')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+    ]
@@ -41,6 +41,27 @@ class Asset(models.Model):
         super(Asset, self).save(*args, **kwargs)
 
 
+class UserShardQuerySet(models.QuerySet):
+    """QuerySet of the models placed on the shard of their user."""
+
+    def for_user(self, user):
+        """
+        Return the rows of the user (or user id), the hint routes the query to
+        the shard of the user (or to a replica of it).
+        """
+        queryset = self.filter(user=user)
+        queryset._add_hints(user_id=getattr(user, 'pk', user))
+        return queryset
+
+    def create(self, **kwargs):
+        # without using() the router places the object by its user, the
+        # default create() would route by the model only
+        obj = self.model(**kwargs)
+        self._for_write = True
+        obj.save(force_insert=True, using=self._db)
+        return obj
+
+
 class BaseFinancial(models.Model):
     """Modelo de base para aplicações (Appliance) e retiradas (Redeem)."""
 
@@ -73,12 +94,36 @@ class BaseFinancial(models.Model):
         blank=True,
         null=True
     )
+    created_at = models.DateTimeField(
+        verbose_name=_("Created At"),
+        auto_now_add=True
+    )
+    updated_at = models.DateTimeField(
+        verbose_name=_("Updated At"),
+        auto_now=True
+    )
+
+    objects = UserShardQuerySet.as_manager()
 
     def __str__(self):
         return f"{self.asset} - {self.total} - {self.user}"
 
     class Meta:
         abstract = True
+        # the changes of a user since a moment, for the sync endpoint, the
+        # date ranges of a user, for the filters, and the dates of all the
+        # users, for the date hierarchy of the admin
+        indexes = [
+            models.Index(
+                fields=['user', 'updated_at'], name='%(class)s_user_updated'
+            ),
+            models.Index(
+                fields=['user', 'request_date'], name='%(class)s_user_date'
+            ),
+            models.Index(
+                fields=['request_date'], name='%(class)s_request_date'
+            ),
+        ]
 
     def save(self, *args, **kwargs):
         """Set the total."""
@@ -89,9 +134,542 @@ class BaseFinancial(models.Model):
         return round(self.quantity * self.unit_price, settings.DEFAULT_DECIMAL_PLACES)
 
 
+class AssetPriceManager(models.Manager):
+
+    def bulk_load(self, rows, batch_size=1000):
+        """
+        Insert or update prices from an iterable of (asset_id, date, price),
+        a price already stored for the same asset and date is overwritten.
+        Return a tuple with the number of created and updated prices.
+        """
+        created = updated = 0
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= batch_size:
+                _created, _updated = self._load_batch(batch, batch_size)
+                created += _created
+                updated += _updated
+                batch = []
+        if batch:
+            _created, _updated = self._load_batch(batch, batch_size)
+            created += _created
+            updated += _updated
+        # bulk operations don't send signals
+        from .utils import bump_prices_version
+        bump_prices_version()
+        return created, updated
+
+    def _load_batch(self, batch, batch_size):
+        # the last price wins if the same asset and date is repeated
+        prices = {(asset_id, date): price for asset_id, date, price in batch}
+        existing = {
+            (asset_id, date): pk
+            for asset_id, date, pk in self.filter(
+                asset_id__in={asset_id for asset_id, _ in prices},
+                date__in={date for _, date in prices},
+            ).values_list('asset_id', 'date', 'pk')
+        }
+        to_create = []
+        to_update = []
+        for (asset_id, date), price in prices.items():
+            asset_price = self.model(asset_id=asset_id, date=date, price=price)
+            if (asset_id, date) in existing:
+                asset_price.pk = existing[(asset_id, date)]
+                to_update.append(asset_price)
+            else:
+                to_create.append(asset_price)
+        self.bulk_create(to_create, batch_size=batch_size)
+        self.bulk_update(to_update, ['price'], batch_size=batch_size)
+        return len(to_create), len(to_update)
+
+
+class AssetPrice(models.Model):
+    """Cotações diárias dos ativos."""
+
+    asset = models.ForeignKey(
+        "financial.Asset",
+        verbose_name=_("Asset"),
+        related_name="prices",
+        on_delete=models.CASCADE
+    )
+    date = models.DateField(
+        verbose_name=_("Date")
+    )
+    price = models.DecimalField(
+        verbose_name=_("Price"),
+        max_digits=settings.DEFAULT_MAX_DIGITS,
+        decimal_places=settings.DEFAULT_DECIMAL_PLACES,
+    )
+
+    objects = AssetPriceManager()
+
+    def __str__(self):
+        return f"{self.asset} - {self.date} - {self.price}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['asset', 'date'], name='unique_asset_price_date'
+            ),
+        ]
+
+
 class Appliance(BaseFinancial):
     """Aplicações."""
 
 
 class Redeem(BaseFinancial):
     """Resgates."""
+
+
+class ArchivedAppliance(BaseFinancial):
+    """
+    Aplicações antigas movidas para o arquivo, mantém a mesma chave primária
+    e os mesmos campos de Appliance, assim podem ser unidas em uma query.
+    """
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['user', 'request_date'],
+                name='archived_appliance_user_date'
+            ),
+        ]
+
+
+class ArchivedRedeem(BaseFinancial):
+    """Resgates antigos movidos para o arquivo, assim como ArchivedAppliance."""
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['user', 'request_date'],
+                name='archived_redeem_user_date'
+            ),
+        ]
+
+
+class ArchiveRollup(models.Model):
+    """
+    Totais das transações arquivadas de um usuário em um ativo, somados aos
+    totais das tabelas principais mantém os valores exatos.
+    """
+
+    APPLIANCE = "A"
+    REDEEM = "R"
+
+    KIND_CHOICES = [
+        (APPLIANCE, 'Appliance'),
+        (REDEEM, 'Redeem'),
+    ]
+
+    user = models.ForeignKey(
+        User,
+        verbose_name=_("User"),
+        on_delete=models.CASCADE
+    )
+    asset = models.ForeignKey(
+        "financial.Asset",
+        verbose_name=_("Asset"),
+        on_delete=models.CASCADE
+    )
+    kind = models.CharField(
+        choices=KIND_CHOICES,
+        max_length=1,
+    )
+    count = models.PositiveIntegerField(default=0)
+    quantity = models.BigIntegerField(default=0)
+    total = models.DecimalField(
+        verbose_name=_("Total"),
+        max_digits=settings.DEFAULT_MAX_DIGITS + 4,
+        decimal_places=settings.DEFAULT_DECIMAL_PLACES,
+        default=0
+    )
+
+    objects = UserShardQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'kind', 'asset'], name='unique_archive_rollup'
+            ),
+        ]
+
+
+class Lot(models.Model):
+    """
+    Lotes em aberto de um ativo, quantity e cost são o que ainda resta do lote.
+    No método de custo médio há somente um lote por usuário e ativo.
+    """
+
+    FIFO = "FIFO"
+    AVERAGE = "AVG"
+
+    METHOD_CHOICES = [
+        (FIFO, 'FIFO'),
+        (AVERAGE, 'Custo Médio'),
+    ]
+
+    user = models.ForeignKey(
+        User,
+        verbose_name=_("User"),
+        on_delete=models.CASCADE
+    )
+    asset = models.ForeignKey(
+        "financial.Asset",
+        verbose_name=_("Asset"),
+        on_delete=models.CASCADE
+    )
+    method = models.CharField(
+        verbose_name=_("Method"),
+        choices=METHOD_CHOICES,
+        max_length=4,
+    )
+    # without constraint, the appliance may be moved to the archive
+    appliance = models.ForeignKey(
+        "financial.Appliance",
+        verbose_name=_("Appliance"),
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        blank=True,
+        null=True
+    )
+    request_date = models.DateField(
+        verbose_name=_("Request Date")
+    )
+    quantity = models.IntegerField(
+        verbose_name=_("Quantity")
+    )
+    cost = models.DecimalField(
+        verbose_name=_("Cost"),
+        max_digits=settings.DEFAULT_MAX_DIGITS,
+        decimal_places=settings.DEFAULT_DECIMAL_PLACES,
+    )
+
+    objects = UserShardQuerySet.as_manager()
+
+    def __str__(self):
+        return f"{self.asset} - {self.quantity} - {self.cost}"
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['user', 'asset', 'method', 'request_date', 'id'],
+                name='lot_consume_order_idx'
+            ),
+        ]
+
+
+class LotState(models.Model):
+    """
+    Última transação processada nos lotes de um usuário e ativo, se não
+    existir os lotes precisam ser reconstruídos.
+    """
+
+    user = models.ForeignKey(
+        User,
+        verbose_name=_("User"),
+        on_delete=models.CASCADE
+    )
+    asset = models.ForeignKey(
+        "financial.Asset",
+        verbose_name=_("Asset"),
+        on_delete=models.CASCADE
+    )
+    method = models.CharField(
+        verbose_name=_("Method"),
+        choices=Lot.METHOD_CHOICES,
+        max_length=4,
+    )
+    last_date = models.DateField()
+    # 0 for appliance and 1 for redeem, the appliances are processed first
+    last_kind = models.PositiveSmallIntegerField()
+    last_id = models.BigIntegerField()
+
+    objects = UserShardQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'asset', 'method'], name='unique_lot_state'
+            ),
+        ]
+
+
+class RealizedGain(models.Model):
+    """Ganho (ou perda) realizado por um resgate."""
+
+    user = models.ForeignKey(
+        User,
+        verbose_name=_("User"),
+        on_delete=models.CASCADE
+    )
+    asset = models.ForeignKey(
+        "financial.Asset",
+        verbose_name=_("Asset"),
+        on_delete=models.CASCADE
+    )
+    # without constraint, the redeem may be moved to the archive
+    redeem = models.ForeignKey(
+        "financial.Redeem",
+        verbose_name=_("Redeem"),
+        on_delete=models.DO_NOTHING,
+        db_constraint=False
+    )
+    method = models.CharField(
+        verbose_name=_("Method"),
+        choices=Lot.METHOD_CHOICES,
+        max_length=4,
+    )
+    request_date = models.DateField(
+        verbose_name=_("Request Date")
+    )
+    quantity = models.IntegerField(
+        verbose_name=_("Quantity")
+    )
+    proceeds = models.DecimalField(
+        verbose_name=_("Proceeds"),
+        max_digits=settings.DEFAULT_MAX_DIGITS,
+        decimal_places=settings.DEFAULT_DECIMAL_PLACES,
+    )
+    cost = models.DecimalField(
+        verbose_name=_("Cost"),
+        max_digits=settings.DEFAULT_MAX_DIGITS,
+        decimal_places=settings.DEFAULT_DECIMAL_PLACES,
+    )
+    gain = models.DecimalField(
+        verbose_name=_("Gain"),
+        max_digits=settings.DEFAULT_MAX_DIGITS,
+        decimal_places=settings.DEFAULT_DECIMAL_PLACES,
+    )
+
+    objects = UserShardQuerySet.as_manager()
+
+    def __str__(self):
+        return f"{self.asset} - {self.gain} - {self.user}"
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['user', 'method', 'request_date'],
+                name='realized_gain_user_date_idx'
+            ),
+        ]
+
+
+class PositionSnapshot(models.Model):
+    """
+    Posição de um usuário em um ativo no fim de um dia, a posição em uma data
+    qualquer é o snapshot mais próximo somado às transações depois dele.
+    """
+
+    user = models.ForeignKey(
+        User,
+        verbose_name=_("User"),
+        on_delete=models.CASCADE
+    )
+    asset = models.ForeignKey(
+        "financial.Asset",
+        verbose_name=_("Asset"),
+        on_delete=models.CASCADE
+    )
+    as_of = models.DateField(
+        verbose_name=_("Date")
+    )
+    quantity = models.IntegerField(
+        verbose_name=_("Quantity")
+    )
+    # applied minus redeemed
+    invested = models.DecimalField(
+        verbose_name=_("Invested"),
+        max_digits=settings.DEFAULT_MAX_DIGITS,
+        decimal_places=settings.DEFAULT_DECIMAL_PLACES,
+    )
+
+    objects = UserShardQuerySet.as_manager()
+
+    def __str__(self):
+        return f"{self.asset} - {self.as_of} - {self.quantity} - {self.user}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'as_of', 'asset'],
+                name='unique_position_snapshot'
+            ),
+        ]
+
+
+class ShardAssignment(models.Model):
+    """
+    Shard de um usuário movido pelo rebalanceamento, os demais usuários são
+    distribuídos pelo hash do id.
+    """
+
+    user = models.OneToOneField(
+        User,
+        verbose_name=_("User"),
+        on_delete=models.CASCADE
+    )
+    alias = models.CharField(
+        verbose_name=_("Database"),
+        max_length=64,
+    )
+
+    def __str__(self):
+        return f"{self.user} - {self.alias}"
+
+
+class BaseTransactionEvent(models.Model):
+    """Estado de uma aplicação ou resgate registrado em um evento."""
+
+    APPLIANCE = "A"
+    REDEEM = "R"
+
+    KIND_CHOICES = [
+        (APPLIANCE, 'Appliance'),
+        (REDEEM, 'Redeem'),
+    ]
+
+    ADDED = "+"
+    REMOVED = "-"
+
+    ACTION_CHOICES = [
+        (ADDED, 'Added'),
+        (REMOVED, 'Removed'),
+    ]
+
+    # without constraints, the log outlives the users and assets removed
+    user = models.ForeignKey(
+        User,
+        verbose_name=_("User"),
+        on_delete=models.DO_NOTHING,
+        db_constraint=False
+    )
+    asset = models.ForeignKey(
+        "financial.Asset",
+        verbose_name=_("Asset"),
+        on_delete=models.DO_NOTHING,
+        db_constraint=False
+    )
+    kind = models.CharField(
+        choices=KIND_CHOICES,
+        max_length=1,
+    )
+    action = models.CharField(
+        choices=ACTION_CHOICES,
+        max_length=1,
+    )
+    transaction_id = models.BigIntegerField()
+    request_date = models.DateField(
+        verbose_name=_("Request Date")
+    )
+    quantity = models.IntegerField(
+        verbose_name=_("Quantity")
+    )
+    total = models.DecimalField(
+        verbose_name=_("Total"),
+        max_digits=settings.DEFAULT_MAX_DIGITS,
+        decimal_places=settings.DEFAULT_DECIMAL_PLACES,
+    )
+
+    class Meta:
+        abstract = True
+
+
+class TransactionEvent(BaseTransactionEvent):
+    """
+    Registro ordenado e somente de inserção das escritas de aplicações e
+    resgates, seq cresce a cada evento. Uma alteração é registrada como a
+    remoção do estado anterior seguida da adição do novo. As projeções
+    (financial/projections.py) consomem os eventos a partir de seq.
+    """
+
+    seq = models.BigAutoField(primary_key=True)
+    created_at = models.DateTimeField(
+        verbose_name=_("Created At"),
+        auto_now_add=True
+    )
+    # id of the PendingEvent moved here, so it isn't appended twice
+    outbox_id = models.BigIntegerField(null=True, unique=True)
+
+    def __str__(self):
+        return f"{self.seq} {self.action}{self.kind} {self.transaction_id}"
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['user', 'created_at'], name='event_user_created'
+            ),
+        ]
+
+
+class PendingEvent(BaseTransactionEvent):
+    """
+    Caixa de saída dos eventos das transações escritas em um shard, gravada
+    na mesma transação delas e movida para TransactionEvent depois do commit
+    (financial/events.py).
+    """
+
+    objects = UserShardQuerySet.as_manager()
+
+    def __str__(self):
+        return f"{self.pk} {self.action}{self.kind} {self.transaction_id}"
+
+
+class ProjectionCheckpoint(models.Model):
+    """Último evento aplicado por uma projeção."""
+
+    name = models.CharField(
+        verbose_name=_("Name"),
+        max_length=64,
+        unique=True
+    )
+    last_seq = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} - {self.last_seq}"
+
+
+class AssetBalance(models.Model):
+    """
+    Totais aplicados e resgatados de um usuário em um ativo, incluindo os
+    arquivados, mantidos pela AssetBalanceProjection a partir dos eventos.
+    """
+
+    user = models.ForeignKey(
+        User,
+        verbose_name=_("User"),
+        on_delete=models.CASCADE
+    )
+    asset = models.ForeignKey(
+        "financial.Asset",
+        verbose_name=_("Asset"),
+        on_delete=models.CASCADE
+    )
+    applied_quantity = models.BigIntegerField(default=0)
+    applied_total = models.DecimalField(
+        max_digits=settings.DEFAULT_MAX_DIGITS + 4,
+        decimal_places=settings.DEFAULT_DECIMAL_PLACES,
+        default=0
+    )
+    redeemed_quantity = models.BigIntegerField(default=0)
+    redeemed_total = models.DecimalField(
+        max_digits=settings.DEFAULT_MAX_DIGITS + 4,
+        decimal_places=settings.DEFAULT_DECIMAL_PLACES,
+        default=0
+    )
+
+    objects = UserShardQuerySet.as_manager()
+
+    def __str__(self):
+        return f"{self.asset} - {self.applied_total} - {self.user}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'asset'], name='unique_asset_balance'
+            ),
+        ]
@@ -0,0 +1,153 @@
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import F
+
+from .events import relay_all_events
+from .models import *
+from .routers import get_user_shard
+
+# name -> projection class, filled by register()
+PROJECTIONS = {}
+
+
+def register(cls):
+    """Class decorator making the projection known to the commands."""
+    PROJECTIONS[cls.name] = cls
+    return cls
+
+
+def get_projection(name):
+    return PROJECTIONS[name]()
+
+
+class Projection:
+    """
+    Base of the read models derived from the TransactionEvent log. run()
+    applies the events after the checkpoint of the projection in batches, so
+    it can be scheduled to catch up incrementally, and replay() rebuilds it
+    from the first event after a reset. Subclasses set a unique name and
+    implement reset() and apply().
+
+    The checkpoint is saved in the same transaction as the batch on the
+    default database. With shards the read model is written on the shards,
+    a failure between them applies the batch again, replay() repairs it.
+    """
+
+    name = None
+    batch_size = 1000
+
+    def reset(self):
+        """Remove everything written by the projection."""
+        raise NotImplementedError
+
+    def apply(self, events):
+        """Apply a batch of events, ordered by seq."""
+        raise NotImplementedError
+
+    def get_checkpoint(self):
+        return ProjectionCheckpoint.objects.using(
+            DEFAULT_DB_ALIAS
+        ).get_or_create(name=self.name)[0]
+
+    def run(self, batch_size=None):
+        """Apply the events after the checkpoint, return how many."""
+        batch_size = batch_size or self.batch_size
+        # the events a relay after a commit didn't move yet
+        relay_all_events()
+        applied = 0
+        while True:
+            with transaction.atomic(using=DEFAULT_DB_ALIAS):
+                # locked so concurrent runs don't apply the same batch
+                checkpoint = ProjectionCheckpoint.objects.using(
+                    DEFAULT_DB_ALIAS
+                ).select_for_update().get_or_create(name=self.name)[0]
+                events = list(
+                    TransactionEvent.objects.using(DEFAULT_DB_ALIAS).filter(
+                        seq__gt=checkpoint.last_seq
+                    ).order_by('seq')[:batch_size]
+                )
+                if not events:
+                    break
+                self.apply(events)
+                checkpoint.last_seq = events[-1].seq
+                checkpoint.save(update_fields=['last_seq', 'updated_at'])
+            applied += len(events)
+        return applied
+
+    def replay(self, batch_size=None):
+        """Rebuild the projection from the first event, return how many."""
+        with transaction.atomic(using=DEFAULT_DB_ALIAS):
+            self.reset()
+            ProjectionCheckpoint.objects.using(
+                DEFAULT_DB_ALIAS
+            ).update_or_create(name=self.name, defaults={'last_seq': 0})
+        return self.run(batch_size)
+
+
+@register
+class AssetBalanceProjection(Projection):
+    """
+    Keep the AssetBalance of each user and asset, the events of a batch are
+    summed by user and asset before writing, the new balances are inserted
+    in bulk so a replay writes each balance once per batch.
+    """
+
+    name = 'asset_balance'
+    batch_size = 5000
+
+    def reset(self):
+        for alias in settings.FINANCIAL_SHARDS:
+            AssetBalance.objects.using(alias).all().delete()
+
+    def apply(self, events):
+        deltas = defaultdict(lambda: [0, 0, 0, 0])
+        for event in events:
+            sign = 1 if event.action == TransactionEvent.ADDED else -1
+            delta = deltas[(event.user_id, event.asset_id)]
+            offset = 0 if event.kind == TransactionEvent.APPLIANCE else 2
+            delta[offset] += sign * event.quantity
+            delta[offset + 1] += sign * event.total
+        # the balances of the removed assets were removed with them
+        assets = set(Asset.objects.using(DEFAULT_DB_ALIAS).filter(
+            pk__in={asset_id for _, asset_id in deltas}
+        ).values_list('pk', flat=True))
+        by_shard = defaultdict(dict)
+        for (user_id, asset_id), delta in deltas.items():
+            if asset_id in assets:
+                by_shard[get_user_shard(user_id)][(user_id, asset_id)] = delta
+        for alias, shard_deltas in by_shard.items():
+            self._write(alias, shard_deltas)
+
+    def _write(self, alias, deltas):
+        balances = AssetBalance.objects.using(alias)
+        existing = set(balances.filter(
+            user_id__in={user_id for user_id, _ in deltas},
+            asset_id__in={asset_id for _, asset_id in deltas},
+        ).values_list('user_id', 'asset_id'))
+        new = []
+        with transaction.atomic(using=alias):
+            for (user_id, asset_id), delta in deltas.items():
+                if (user_id, asset_id) not in existing:
+                    new.append(AssetBalance(
+                        user_id=user_id, asset_id=asset_id,
+                        applied_quantity=delta[0], applied_total=delta[1],
+                        redeemed_quantity=delta[2], redeemed_total=delta[3],
+                    ))
+                    continue
+                balances.filter(user_id=user_id, asset_id=asset_id).update(
+                    applied_quantity=F('applied_quantity') + delta[0],
+                    applied_total=F('applied_total') + delta[1],
+                    redeemed_quantity=F('redeemed_quantity') + delta[2],
+                    redeemed_total=F('redeemed_total') + delta[3],
+                )
+            balances.bulk_create(new)
+
+
+def run_projections(names=None, batch_size=None):
+    """Catch up the projections (all by default), return name -> applied."""
+    return {
+        name: get_projection(name).run(batch_size)
+        for name in (names or PROJECTIONS)
+    }
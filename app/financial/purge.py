@@ -0,0 +1,129 @@
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from .events import relay_events
+from .models import *
+from .shards import get_sharded_models
+from .utils import bump_user_data_version
+
+
+def get_purge_aliases():
+    """
+    Return the databases that may hold data of a user, the default one too
+    since the data of a user not rebalanced yet may still be there.
+    """
+    return list(dict.fromkeys([DEFAULT_DB_ALIAS] + settings.FINANCIAL_SHARDS))
+
+
+def purge_rows(queryset, using, chunk_size=1000, pause=0, progress=None):
+    """
+    Delete the rows of the queryset in ranges of chunk_size primary keys,
+    each range with a raw delete in its own transaction, so the write lock
+    is released (for pause seconds) between them. Return how many.
+    """
+    queryset = queryset.using(using).order_by('pk')
+    deleted = 0
+    last = None
+    while True:
+        rows = queryset if last is None else queryset.filter(pk__gt=last)
+        pks = list(rows.values_list('pk', flat=True)[:chunk_size])
+        if not pks:
+            break
+        with transaction.atomic(using=using):
+            chunk = queryset.filter(pk__gte=pks[0], pk__lte=pks[-1])
+            # raw delete, no rows are collected nor signals sent
+            chunk._raw_delete(using)
+        last = pks[-1]
+        deleted += len(pks)
+        if progress is not None:
+            progress(queryset.model, using, deleted)
+        if pause:
+            time.sleep(pause)
+    return deleted
+
+
+def get_asset_users(asset_ids, exclude_user_id):
+    """
+    Return a dict of asset id to the smallest id of the other users holding
+    data of the asset, on any database.
+    """
+    users = {}
+    for using in get_purge_aliases():
+        for model in get_sharded_models():
+            if not any(f.name == 'asset' for f in model._meta.fields):
+                continue
+            for asset_id, user_id in model._base_manager.using(using).filter(
+                asset_id__in=asset_ids
+            ).exclude(user_id=exclude_user_id).values_list(
+                'asset_id', 'user_id'
+            ).distinct():
+                users[asset_id] = min(users.get(asset_id, user_id), user_id)
+    return users
+
+
+def release_user_assets(user_id, chunk_size=1000, pause=0):
+    """
+    Hand the assets created by the user over to another user holding data of
+    them (the assets are shared) and delete the others, one at a time so the
+    delete of the user cascades to nothing. Return the number of assets
+    deleted.
+    """
+    deleted = 0
+    assets = Asset.objects.filter(user_id=user_id).order_by('pk')
+    last = 0
+    while True:
+        chunk = list(assets.filter(pk__gt=last)[:chunk_size])
+        if not chunk:
+            break
+        last = chunk[-1].pk
+        users = get_asset_users([asset.pk for asset in chunk], user_id)
+        for asset in chunk:
+            if asset.pk in users:
+                # saved, not updated, so the shards get the new owner
+                asset.user_id = users[asset.pk]
+                asset.save(update_fields=['user'])
+            elif not get_asset_users([asset.pk], user_id):
+                # checked again, another user may have used it meanwhile
+                asset.delete()
+                deleted += 1
+        if pause:
+            time.sleep(pause)
+    return deleted
+
+
+def purge_user(user_id, chunk_size=1000, pause=0, progress=None,
+               delete_user=True):
+    """
+    Remove the financial data of the user in chunks (see purge_rows), then
+    its assets no one else uses (see release_user_assets) and the user. The
+    user is deactivated first so nothing is written meanwhile. Return a dict
+    of model name to the number of rows deleted.
+    """
+    User.objects.filter(pk=user_id).update(is_active=False)
+    deleted = {}
+    for using in get_purge_aliases():
+        # the pending events are purged from the log below
+        relay_events(using)
+        for model in get_sharded_models():
+            count = purge_rows(
+                model._base_manager.filter(user_id=user_id), using,
+                chunk_size, pause, progress
+            )
+            deleted[model.__name__] = deleted.get(model.__name__, 0) + count
+    # the log isn't removed by the cascade, it has no constraint
+    deleted[TransactionEvent.__name__] = purge_rows(
+        TransactionEvent.objects.filter(user_id=user_id), DEFAULT_DB_ALIAS,
+        chunk_size, pause, progress
+    )
+    bump_user_data_version(user_id)
+    if delete_user:
+        deleted[Asset.__name__] = release_user_assets(
+            user_id, chunk_size, pause
+        )
+        user = User.objects.filter(pk=user_id).first()
+        if user is not None:
+            user.delete()
+    return deleted
@@ -0,0 +1,29 @@
+import json
+
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+
+def encode_json(data):
+    """Encode the data as compact JSON, as the JSONRenderer does."""
+    return json.dumps(
+        data, cls=JSONEncoder, ensure_ascii=False, separators=(',', ':')
+    ).encode()
+
+
+class NDJSONRenderer(BaseRenderer):
+    """
+    Newline delimited JSON, one line per item of a list. The list endpoints
+    stream it (see rest_views._stream_list), this renders the other
+    responses, e.g. the errors.
+    """
+
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        items = data if isinstance(data, list) else [data]
+        return b''.join(encode_json(item) + b'\n' for item in items)
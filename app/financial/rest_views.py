@@ -1,15 +1,41 @@
-from rest_framework.decorators import api_view, permission_classes
+from itertools import chain, islice
+
+from rest_framework.decorators import (
+    api_view, permission_classes, renderer_classes, throttle_classes,
+)
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
+from django.conf import settings
 from django.db import transaction
 from rest_framework.status import HTTP_200_OK, HTTP_201_CREATED
+from rest_framework.exceptions import ValidationError
+from django.utils.dateparse import parse_date
+from django.utils import timezone
+from django.http import StreamingHttpResponse
+from rest_framework.settings import api_settings
 
 from .serializers import *
 from .utils import get_client_ip, FinancialMixin
+from .routers import get_user_shard
+from .snapshots import get_positions_as_of
+from .search import search_assets
+from .renderers import NDJSONRenderer, encode_json
+from .sync import InvalidToken, get_changes, read_token
+from .throttles import get_throttle_classes
+
+ASSET_LOOKUP_PAGE_SIZE = 20
+# days of the valuation and analytics series, one row of each matrix a day
+PORTFOLIO_MAX_DAYS = 366 * 50
+# rows fetched from the database and encoded at a time when streaming
+STREAM_CHUNK_SIZE = 2000
+LIST_RENDERER_CLASSES = api_settings.DEFAULT_RENDERER_CLASSES + [
+    NDJSONRenderer
+]
 
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@throttle_classes(get_throttle_classes('asset_add'))
 def rest_add_asset(request):
     """Adiciona um ativo depois de validado."""
     asset_serializer = AssetAddSerializer(data=request.data)
@@ -36,24 +62,168 @@ def rest_list_asset(request):
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+def rest_lookup_asset(request):
+    """
+    Retorna uma página de ativos com uma palavra do nome começando com q,
+    sem diferenciar acentos, no formato do select2 (results e pagination),
+    usado pelo AssetLookupSelect.
+    """
+    query = request.GET.get('q', '').strip()
+    try:
+        page = max(int(request.GET.get('page', 1)), 1)
+    except ValueError:
+        page = 1
+    offset = (page - 1) * ASSET_LOOKUP_PAGE_SIZE
+    # one extra row tells if there is a next page without counting
+    if query:
+        ids = search_assets(query, ASSET_LOOKUP_PAGE_SIZE + 1, offset)
+        names = dict(
+            Asset.objects.filter(pk__in=ids).values_list('pk', 'name')
+        )
+        rows = [(pk, names[pk]) for pk in ids if pk in names]
+    else:
+        rows = list(Asset.objects.order_by('name', 'pk').values_list(
+            'pk', 'name'
+        )[offset:offset + ASSET_LOOKUP_PAGE_SIZE + 1])
+    return Response({
+        'results': [
+            {'id': pk, 'text': name}
+            for pk, name in rows[:ASSET_LOOKUP_PAGE_SIZE]
+        ],
+        'pagination': {'more': len(rows) > ASSET_LOOKUP_PAGE_SIZE},
+    }, status=HTTP_200_OK)
+
+
+def _get_query_fields(request, serializer_class):
+    """
+    Return the fields passed by GET separated by commas or None if not
+    passed, only the fields of the serializer are allowed.
+    """
+    value = request.GET.get('fields', None)
+    if value is None:
+        return None
+    fields = [name.strip() for name in value.split(',') if name.strip()]
+    allowed = serializer_class.Meta.fields
+    invalid = [name for name in fields if name not in allowed]
+    if invalid or not fields:
+        raise ValidationError({
+            'fields': "Campos inválidos: {}, use {}.".format(
+                ", ".join(invalid), ", ".join(allowed)
+            )
+        })
+    return fields
+
+
+def _encode_rows(queryset, serializer, ndjson=False):
+    """
+    Yield the serialized rows of the queryset in encoded chunks, as a JSON
+    array or as lines of JSON. Only a chunk of rows is in memory at a time.
+    """
+    rows = queryset.iterator(chunk_size=STREAM_CHUNK_SIZE)
+    prefix = b'' if ndjson else b'['
+    while True:
+        chunk = list(islice(rows, STREAM_CHUNK_SIZE))
+        if not chunk:
+            break
+        encoded = [
+            encode_json(serializer.to_representation(row)) for row in chunk
+        ]
+        if ndjson:
+            yield b''.join(line + b'\n' for line in encoded)
+        else:
+            yield prefix + b','.join(encoded)
+            prefix = b','
+    if not ndjson:
+        yield b'[]' if prefix == b'[' else b']'
+
+
+def _is_streaming(request):
+    return (
+        bool(request.GET.get('stream'))
+        or request.accepted_renderer.format == NDJSONRenderer.format
+    )
+
+
+def _stream_list(request, queryset, serializer):
+    """
+    Return a response streaming the serialized rows of the queryset, as
+    NDJSON if accepted or else as a JSON array, in constant memory.
+    """
+    ndjson = request.accepted_renderer.format == NDJSONRenderer.format
+    chunks = _encode_rows(queryset, serializer, ndjson)
+    # the query runs now, routed as the request, the rest is streamed after
+    # the view returns
+    first = next(chunks)
+    return StreamingHttpResponse(
+        chain([first], chunks),
+        content_type=(
+            NDJSONRenderer.media_type if ndjson else 'application/json'
+        ),
+    )
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@renderer_classes(LIST_RENDERER_CLASSES)
 def rest_appliance_list(request):
-    """Retorna uma lista de aplicações pertencentes ao usuário da requisição."""
+    """
+    Retorna uma lista de aplicações pertencentes ao usuário da requisição, com
+    history=1 as aplicações arquivadas também são retornadas e com fields
+    somente os campos pedidos (ex: fields=asset,request_date,total). Com
+    stream=1, ou aceitando application/x-ndjson, a lista é enviada aos
+    poucos, sem carregar todo o histórico na memória.
+    """
+    fields = _get_query_fields(request, ApplianceGetSerializer)
+    financialMixin = FinancialMixin(
+        request, history=bool(request.GET.get('history')), only=fields
+    )
+    if _is_streaming(request):
+        return _stream_list(
+            request, financialMixin.get_appliances(),
+            ApplianceGetSerializer(fields=fields)
+        )
     appliance_serializer = ApplianceGetSerializer(
-        Appliance.objects.filter(user=request.user),
-        many=True
+        financialMixin.get_appliances(),
+        many=True,
+        fields=fields
     )
     return Response(appliance_serializer.data, status=HTTP_200_OK)
 
 
+def _get_add_data(request):
+    """
+    Return the records to add with the ip address of the request, and
+    whether there are many (a list was sent).
+    """
+    ip_address = get_client_ip(request)
+    if not isinstance(request.data, list):
+        data = request.data.copy()
+        data['ip_address'] = ip_address
+        return data, False
+    if len(request.data) > settings.FINANCIAL_ADD_MAX_RECORDS:
+        raise ValidationError("Envie no máximo {} registros.".format(
+            settings.FINANCIAL_ADD_MAX_RECORDS
+        ))
+    return [
+        dict(item, ip_address=ip_address) if isinstance(item, dict) else item
+        for item in request.data
+    ], True
+
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@throttle_classes(get_throttle_classes('appliance_add'))
 def rest_appliance_add(request):
-    """Cria uma aplicação e adiciona o endereço de ip."""
-    # transformando a criação em atômica
-    with transaction.atomic():
-        data = request.data.copy()
-        data['ip_address'] = get_client_ip(request)
-        appliance_serializer = ApplianceAddSerializer(data=data)
+    """
+    Cria uma aplicação e adiciona o endereço de ip, ou várias se for enviada
+    uma lista, os ativos são validados com uma consulta.
+    """
+    # transformando a criação em atômica, no banco de dados do usuário
+    with transaction.atomic(using=get_user_shard(request.user)):
+        data, many = _get_add_data(request)
+        appliance_serializer = ApplianceAddSerializer(
+            data=data, many=many, context={'request': request}
+        )
         if appliance_serializer.is_valid(raise_exception=True):
             appliance = appliance_serializer.save()
             return Response(appliance_serializer.data, status=HTTP_201_CREATED)
@@ -61,13 +231,18 @@ def rest_appliance_add(request):
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@throttle_classes(get_throttle_classes('redeem_add'))
 def rest_redeem_add(request):
-    """Cria um resgate e adiciona o endereço de ip."""
-    # transformando a criação em atômica
-    with transaction.atomic():
-        data = request.data.copy()
-        data['ip_address'] = get_client_ip(request)
-        redeem_serializer = RedeemAddSerializer(data=data)
+    """
+    Cria um resgate e adiciona o endereço de ip, ou vários se for enviada
+    uma lista, assim como em rest_appliance_add.
+    """
+    # transformando a criação em atômica, no banco de dados do usuário
+    with transaction.atomic(using=get_user_shard(request.user)):
+        data, many = _get_add_data(request)
+        redeem_serializer = RedeemAddSerializer(
+            data=data, many=many, context={'request': request}
+        )
         if redeem_serializer.is_valid(raise_exception=True):
             redeem = redeem_serializer.save()
             return Response(redeem_serializer.data, status=HTTP_201_CREATED)
@@ -75,18 +250,158 @@ def rest_redeem_add(request):
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@renderer_classes(LIST_RENDERER_CLASSES)
 def rest_redeem_list(request):
-    """Retorna a lista de resgates pertencentes ao usuário da requisição."""
+    """
+    Retorna a lista de resgates pertencentes ao usuário da requisição, com
+    history=1 os resgates arquivados também são retornados, com fields
+    somente os campos pedidos e com stream=1 enviada aos poucos, assim como
+    em rest_appliance_list.
+    """
+    fields = _get_query_fields(request, RedeemGetSerializer)
+    financialMixin = FinancialMixin(
+        request, history=bool(request.GET.get('history')), only=fields
+    )
+    if _is_streaming(request):
+        return _stream_list(
+            request, financialMixin.get_redeems(),
+            RedeemGetSerializer(fields=fields)
+        )
     redeem_serializer = RedeemGetSerializer(
-        Redeem.objects.filter(user=request.user),
-        many=True
+        financialMixin.get_redeems(),
+        many=True,
+        fields=fields
     )
     return Response(redeem_serializer.data, status=HTTP_200_OK)
 
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def rest_sync(request):
+    """
+    Retorna as aplicações e os resgates do usuário criados ou alterados
+    depois do token (query since), os ids dos removidos e o token da próxima
+    sincronização. Sem since retorna todos.
+    """
+    since = request.GET.get('since')
+    try:
+        since = read_token(since) if since else None
+    except InvalidToken:
+        raise ValidationError({'since': "Token inválido."})
+    changes = get_changes(request.user, since)
+    return Response({
+        'token': changes['token'],
+        'appliances': ApplianceSyncSerializer(
+            changes['appliances'], many=True
+        ).data,
+        'redeems': RedeemSyncSerializer(changes['redeems'], many=True).data,
+        'deleted': changes['deleted'],
+    }, status=HTTP_200_OK)
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_appliance_data_chart_donut(request):
     """Retorna dados para preencher um gráfico de pizza."""
     financialMixin = FinancialMixin(request)
     return Response(financialMixin.get_appliance_by_asset_donut_chart())
+
+
+def _get_query_date(request, name):
+    """Return the date passed by GET in iso format or None if not passed."""
+    value = request.GET.get(name, None)
+    if value is None:
+        return None
+    try:
+        date = parse_date(value)
+    except ValueError:
+        date = None
+    if date is None:
+        raise ValidationError({name: "Data inválida, use o formato AAAA-MM-DD."})
+    return date
+
+
+def _get_query_period(request):
+    """
+    Return the start and end dates passed by GET, None if not passed. The
+    end can't be after today, the start must be before the end and the
+    period at most PORTFOLIO_MAX_DAYS, the default start (the first
+    transaction) is checked by get_user_valuation.
+    """
+    start = _get_query_date(request, 'start')
+    end = _get_query_date(request, 'end')
+    today = timezone.localdate()
+    if end is not None and end > today:
+        raise ValidationError({'end': "A data final não pode ser depois de "
+                                      "hoje."})
+    if start is not None:
+        last = end or today
+        if start > last:
+            raise ValidationError({'start': "A data inicial deve ser anterior "
+                                            "à data final."})
+        if (last - start).days >= PORTFOLIO_MAX_DAYS:
+            raise _period_too_long()
+    return start, end
+
+
+def _period_too_long():
+    return ValidationError({'start': "O período deve ter no máximo {} "
+                                     "dias.".format(PORTFOLIO_MAX_DAYS)})
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def rest_portfolio_valuation(request):
+    """
+    Retorna a série diária de valor de mercado, custo e lucro não realizado da
+    carteira do usuário, com possibilidade de query por start e end.
+    """
+    # numpy is imported on the first use, not when the workers start
+    from .valuation import PeriodTooLong, get_user_valuation
+    start, end = _get_query_period(request)
+    try:
+        valuation = get_user_valuation(
+            request.user, start=start, end=end, max_days=PORTFOLIO_MAX_DAYS
+        )
+    except PeriodTooLong:
+        raise _period_too_long()
+    return Response(valuation.as_dict(), status=HTTP_200_OK)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def rest_portfolio_analytics(request):
+    """
+    Retorna a rentabilidade ponderada pelo tempo (TWR), a taxa interna de
+    retorno (XIRR), a volatilidade anualizada e o drawdown máximo da carteira,
+    de cada modalidade e de cada ativo do usuário.
+    """
+    from .analytics import get_user_analytics
+    from .valuation import PeriodTooLong
+    start, end = _get_query_period(request)
+    try:
+        analytics = get_user_analytics(
+            request.user, start=start, end=end, max_days=PORTFOLIO_MAX_DAYS
+        )
+    except PeriodTooLong:
+        raise _period_too_long()
+    return Response(analytics, status=HTTP_200_OK)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def rest_portfolio_positions(request):
+    """
+    Retorna a quantidade e o valor investido de cada ativo do usuário no fim
+    da data (query date), por padrão hoje.
+    """
+    date = _get_query_date(request, 'date') or timezone.localdate()
+    positions = get_positions_as_of(request.user.pk, date)
+    return Response(
+        [
+            dict(asset=asset_id, **position)
+            for asset_id, position in sorted(positions.items())
+            if position['quantity']
+        ],
+        status=HTTP_200_OK
+    )
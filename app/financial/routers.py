@@ -0,0 +1,101 @@
+import zlib
+
+from django.conf import settings
+from django.core.cache import cache
+
+SHARD_KEY = "financial:shard:{}"
+
+# models with the financial data of a single user, they live in the shard of
+# the user
+SHARDED_MODELS = [
+    'financial.appliance',
+    'financial.redeem',
+    'financial.archivedappliance',
+    'financial.archivedredeem',
+    'financial.archiverollup',
+    'financial.lot',
+    'financial.lotstate',
+    'financial.realizedgain',
+    'financial.positionsnapshot',
+    'financial.assetbalance',
+    'financial.pendingevent',
+]
+# models referenced by the financial data, they are written on the default
+# database and copied to every shard (see financial/shards.py)
+REPLICATED_MODELS = ['auth.user', 'financial.asset']
+
+
+def get_hashed_shard(user_id, shards=None):
+    """Return the shard of the user by a stable hash of its id."""
+    if shards is None:
+        shards = settings.FINANCIAL_SHARDS
+    return shards[zlib.crc32(str(user_id).encode()) % len(shards)]
+
+
+def get_user_shard(user):
+    """
+    Return the database alias holding the financial data of the user (or
+    user id). A user moved by the rebalance has its shard assigned, the
+    others are placed by the hash. The assignment is cached for
+    FINANCIAL_SHARD_CACHE_TIMEOUT seconds, the cache may be local to the
+    process.
+    """
+    shards = settings.FINANCIAL_SHARDS
+    if len(shards) == 1:
+        return shards[0]
+    user_id = getattr(user, 'pk', user)
+    key = SHARD_KEY.format(user_id)
+    alias = cache.get(key)
+    if alias is None:
+        from .models import ShardAssignment
+        alias = ShardAssignment.objects.filter(user_id=user_id).values_list(
+            'alias', flat=True
+        ).first() or ''
+        cache.set(key, alias, settings.FINANCIAL_SHARD_CACHE_TIMEOUT)
+    return alias or get_hashed_shard(user_id, shards)
+
+
+def forget_user_shard(user_id):
+    """
+    Drop the cached shard of the user, call it when it is reassigned. The
+    other processes read the assignment again once their entry expires.
+    """
+    cache.delete(SHARD_KEY.format(user_id))
+
+
+class UserShardRouter:
+    """
+    Route the rows of the sharded models to the shard of their user, given
+    by the instance or by the user_id hint. Model.objects.for_user() adds
+    the hint, a query without it can't be routed.
+    """
+
+    def _get_user_id(self, instance):
+        if instance._meta.label_lower == 'auth.user':
+            return instance.pk
+        return getattr(instance, 'user_id', None)
+
+    def _get_shard(self, model, **hints):
+        if model._meta.label_lower not in SHARDED_MODELS:
+            return None
+        user_id = hints.get('user_id')
+        if user_id is None and hints.get('instance') is not None:
+            user_id = self._get_user_id(hints['instance'])
+        if user_id is None:
+            return None
+        return get_user_shard(user_id)
+
+    db_for_read = _get_shard
+    db_for_write = _get_shard
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # the replicated models exist in every shard
+        labels = {obj1._meta.label_lower, obj2._meta.label_lower}
+        if labels & set(SHARDED_MODELS + REPLICATED_MODELS):
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # every database has all the tables, the shards need the users and
+        # assets and the empty ones don't hurt
+        return None
@@ -0,0 +1,179 @@
+import re
+import threading
+import time
+import unicodedata
+from bisect import bisect_left, insort
+
+from django.conf import settings
+from django.db import connections
+
+from .models import *
+from .utils import get_assets_version
+
+
+# combining diacritical marks, left apart from the letters by NFKD
+COMBINING_MARKS = re.compile('[\u0300-\u036f]')
+
+
+def fold(text):
+    """Return the text without accents and case, "Ação" becomes "acao"."""
+    return COMBINING_MARKS.sub(
+        '', unicodedata.normalize('NFKD', text)
+    ).casefold()
+
+
+def get_index_keys(name):
+    """
+    Return the keys of a name in the index, one starting at each word so a
+    search matches the beginning of any word ("ipca" finds "Tesouro IPCA").
+    """
+    folded = ' '.join(fold(name).split())
+    keys = [folded]
+    space = folded.find(' ')
+    while space != -1:
+        keys.append(folded[space + 1:])
+        space = folded.find(' ', space + 1)
+    return keys
+
+
+class AssetNameIndex:
+    """
+    Sorted in-memory index of the asset names, a list of (key, asset_id) with
+    the keys of get_index_keys, a search is a bisect to the first key with
+    the prefix followed by a scan of the matches. Each process keeps its own
+    index. The saves and deletes of the process are applied to it at once
+    (see update), the changes of the other processes by a full rebuild in a
+    background thread when the assets version changes (only seen if the
+    cache is shared) or the index is older than ASSET_INDEX_MAX_AGE seconds,
+    the searches use the previous index meanwhile.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._version = None
+        self._built = None
+        self._rebuilding = False
+        self._entries = []
+        self._names = {}
+
+    def build(self, rows):
+        """Return the entries and the names of an iterable of (id, name)."""
+        names = dict(rows)
+        entries = sorted(
+            (key, asset_id)
+            for asset_id, name in names.items()
+            for key in get_index_keys(name)
+        )
+        return entries, names
+
+    def rebuild(self, version=None):
+        """Rebuild the index from the database and swap it in."""
+        if version is None:
+            version = get_assets_version()
+        entries, names = self.build(
+            Asset.objects.values_list('pk', 'name').iterator()
+        )
+        with self._lock:
+            self._entries, self._names = entries, names
+            self._version = version
+            self._built = time.monotonic()
+
+    def _rebuild_in_background(self, version):
+        try:
+            self.rebuild(version)
+        finally:
+            with self._lock:
+                self._rebuilding = False
+            # the connections of the thread
+            connections.close_all()
+
+    def refresh(self):
+        """
+        Rebuild the index if the assets changed in another process or it
+        expired. Only the first build blocks, there is nothing to search
+        before it, the others run in a background thread.
+        """
+        version = get_assets_version()
+        if not self._is_stale(version):
+            return
+        if self._version is None:
+            with self._build_lock:
+                if self._version is None:
+                    self.rebuild(version)
+            return
+        with self._lock:
+            if self._rebuilding:
+                return
+            self._rebuilding = True
+        threading.Thread(
+            target=self._rebuild_in_background, args=(version,), daemon=True
+        ).start()
+
+    def _is_stale(self, version):
+        max_age = settings.ASSET_INDEX_MAX_AGE
+        return version != self._version or (
+            max_age is not None and time.monotonic() - self._built > max_age
+        )
+
+    def update(self, asset_id, name, previous, version):
+        """
+        Replace the name of an asset saved in this process, None removes it.
+        The index is moved to the new version only if it had the previous
+        one, else it's rebuilt as well.
+        """
+        with self._lock:
+            if self._version is None:
+                return
+            entries = self._entries
+            old = self._names.pop(asset_id, None)
+            if old is not None:
+                for key in get_index_keys(old):
+                    index = bisect_left(entries, (key, asset_id))
+                    if index < len(entries) and \
+                            entries[index] == (key, asset_id):
+                        del entries[index]
+            if name is not None:
+                self._names[asset_id] = name
+                for key in get_index_keys(name):
+                    insort(entries, (key, asset_id))
+            if self._version == previous:
+                self._version = version
+
+    def clear(self):
+        with self._lock:
+            self._version = None
+            self._built = None
+            self._rebuilding = False
+            self._entries = []
+            self._names = {}
+
+    def search(self, prefix, limit=20, offset=0):
+        """
+        Return the ids of the assets with a word starting with the prefix,
+        ordered by the matched key, at most limit of them (None for all).
+        """
+        prefix = ' '.join(fold(prefix).split())
+        entries = self._entries
+        found = []
+        seen = set()
+        index = bisect_left(entries, (prefix,))
+        while index < len(entries) and entries[index][0].startswith(prefix):
+            asset_id = entries[index][1]
+            index += 1
+            if asset_id in seen:
+                continue
+            seen.add(asset_id)
+            found.append(asset_id)
+            if limit is not None and len(found) >= offset + limit:
+                break
+        return found[offset:]
+
+
+asset_index = AssetNameIndex()
+
+
+def search_assets(prefix, limit=20, offset=0):
+    """Return the ids of the assets matching the prefix, see AssetNameIndex."""
+    asset_index.refresh()
+    return asset_index.search(prefix, limit, offset)
@@ -1,9 +1,84 @@
 from django.db.models import fields
 from rest_framework import serializers
 
+from .lookups import AssetLookup
 from .models import *
 
 
+class SparseFieldsMixin:
+    """
+    Serializer returning only the fields given in the fields argument, a
+    subset of Meta.fields, all of them if None.
+    """
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+def get_asset_lookup(field):
+    """Return the AssetLookup of the serializer context, adding one."""
+    context = field.root._context
+    if 'asset_lookup' not in context:
+        context['asset_lookup'] = AssetLookup()
+    return context['asset_lookup']
+
+
+def to_asset_pk(data):
+    """Return the asset pk given in data, None if it isn't one."""
+    if isinstance(data, bool):
+        return None
+    try:
+        return Asset._meta.pk.to_python(data)
+    except Exception:
+        return None
+
+
+class AssetLookupField(serializers.PrimaryKeyRelatedField):
+    """
+    Asset by pk resolved through the AssetLookup of the serializer context,
+    shared by the records of the request and cached in the process.
+    """
+
+    def to_internal_value(self, data):
+        pk = to_asset_pk(data)
+        if pk is None:
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        asset = get_asset_lookup(self).get(pk)
+        if asset is None:
+            self.fail('does_not_exist', pk_value=data)
+        return asset
+
+
+class RequestUserField(serializers.PrimaryKeyRelatedField):
+    """User by pk, the user of the request is returned without a query."""
+
+    def to_internal_value(self, data):
+        request = self.context.get('request')
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated and \
+                str(user.pk) == str(data):
+            return user
+        return super().to_internal_value(data)
+
+
+class FinancialAddListSerializer(serializers.ListSerializer):
+    """Load the assets of all the records with one query, then validate."""
+
+    def to_internal_value(self, data):
+        if isinstance(data, list):
+            # the invalid items and pks are reported by the records
+            pks = {
+                to_asset_pk(item.get('asset')) for item in data
+                if isinstance(item, dict)
+            }
+            pks.discard(None)
+            get_asset_lookup(self).prefetch(pks)
+        return super().to_internal_value(data)
+
+
 class AssetAddSerializer(serializers.ModelSerializer):
 
     def validate(self, data):
@@ -30,33 +105,59 @@ class AssetGetSerializer(serializers.ModelSerializer):
 
 class ApplianceAddSerializer(serializers.ModelSerializer):
 
+    asset = AssetLookupField(queryset=Asset.objects.all())
+    user = RequestUserField(queryset=User.objects.all())
+
     class Meta:
         model = Appliance
         fields = ['asset', 'request_date',
                   'quantity', 'unit_price', 'user', 'ip_address']
+        list_serializer_class = FinancialAddListSerializer
 
 
-class ApplianceGetSerializer(serializers.ModelSerializer):
+class ApplianceGetSerializer(SparseFieldsMixin, serializers.ModelSerializer):
 
     user = serializers.PrimaryKeyRelatedField(read_only=True)
 
     class Meta:
         model = Appliance
-        fields = ['asset', 'request_date', 'quantity', 'unit_price', 'user']
+        fields = ['asset', 'request_date', 'quantity', 'unit_price', 'total',
+                  'user']
 
 
 class RedeemAddSerializer(serializers.ModelSerializer):
 
+    asset = AssetLookupField(queryset=Asset.objects.all())
+    user = RequestUserField(queryset=User.objects.all())
+
     class Meta:
         model = Redeem
         fields = ['asset', 'request_date',
                   'quantity', 'unit_price', 'user', 'ip_address']
+        list_serializer_class = FinancialAddListSerializer
 
 
-class RedeemGetSerializer(serializers.ModelSerializer):
+class RedeemGetSerializer(SparseFieldsMixin, serializers.ModelSerializer):
 
     user = serializers.PrimaryKeyRelatedField(read_only=True)
 
     class Meta:
         model = Redeem
-        fields = ['asset', 'request_date', 'quantity', 'unit_price', 'user']
+        fields = ['asset', 'request_date', 'quantity', 'unit_price', 'total',
+                  'user']
+
+
+class ApplianceSyncSerializer(serializers.ModelSerializer):
+
+    class Meta:
+        model = Appliance
+        fields = ['pk', 'asset', 'request_date', 'quantity', 'unit_price',
+                  'total', 'created_at', 'updated_at']
+
+
+class RedeemSyncSerializer(serializers.ModelSerializer):
+
+    class Meta:
+        model = Redeem
+        fields = ['pk', 'asset', 'request_date', 'quantity', 'unit_price',
+                  'total', 'created_at', 'updated_at']
@@ -0,0 +1,207 @@
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+from .archive import bulk_copy
+from .events import relay_events
+from .models import *
+from .routers import (
+    REPLICATED_MODELS, SHARDED_MODELS, forget_user_shard, get_hashed_shard,
+    get_user_shard,
+)
+from .utils import bump_user_data_version
+
+
+def get_sharded_models():
+    return [apps.get_model(label) for label in SHARDED_MODELS]
+
+
+def get_replicated_models():
+    return [apps.get_model(label) for label in REPLICATED_MODELS]
+
+
+def get_replica_aliases():
+    """Return the shards receiving a copy of the replicated models."""
+    return [
+        alias for alias in settings.FINANCIAL_SHARDS
+        if alias != DEFAULT_DB_ALIAS
+    ]
+
+
+def _get_values(instance):
+    return {
+        field.attname: getattr(instance, field.attname)
+        for field in instance._meta.concrete_fields if not field.primary_key
+    }
+
+
+def replicate_instance(instance):
+    """Write a user or asset saved on the default database to every shard."""
+    model = type(instance)
+    for alias in get_replica_aliases():
+        model._base_manager.using(alias).update_or_create(
+            pk=instance.pk, defaults=_get_values(instance)
+        )
+
+
+def remove_replicas(instance):
+    """Remove a user or asset from every shard, its data there cascades."""
+    for alias in get_replica_aliases():
+        type(instance)._base_manager.using(alias).filter(
+            pk=instance.pk
+        ).delete()
+
+
+def sync_replicas(alias, chunk_size=1000):
+    """
+    Copy the users and assets of the default database missing on a shard,
+    used when a shard is added. Return the number of rows copied.
+    """
+    copied = 0
+    for model in get_replicated_models():
+        existing = set(
+            model._base_manager.using(alias).values_list('pk', flat=True)
+        )
+        missing = [
+            obj for obj in model._base_manager.using(DEFAULT_DB_ALIAS)
+            .order_by('pk').iterator(chunk_size=chunk_size)
+            if obj.pk not in existing
+        ]
+        model._base_manager.using(alias).bulk_create(
+            missing, batch_size=chunk_size
+        )
+        copied += len(missing)
+    return copied
+
+
+def set_shard_sequences(alias):
+    """
+    Start the ids of the sharded tables of a SQLite shard at its index times
+    FINANCIAL_SHARD_ID_SPAN, so rows moved between shards keep their ids.
+    """
+    shards = settings.FINANCIAL_SHARDS
+    connection = connections[alias]
+    if alias not in shards or connection.vendor != 'sqlite':
+        return
+    start = shards.index(alias) * settings.FINANCIAL_SHARD_ID_SPAN
+    if not start:
+        return
+    with connection.cursor() as cursor:
+        for model in get_sharded_models():
+            table = model._meta.db_table
+            cursor.execute(
+                "SELECT seq FROM sqlite_sequence WHERE name = %s", [table]
+            )
+            row = cursor.fetchone()
+            if row is None:
+                cursor.execute(
+                    "INSERT INTO sqlite_sequence (name, seq) VALUES (%s, %s)",
+                    [table, start]
+                )
+            elif row[0] < start:
+                cursor.execute(
+                    "UPDATE sqlite_sequence SET seq = %s WHERE name = %s",
+                    [start, table]
+                )
+
+
+def copy_user_data(user_id, source, target, chunk_size=1000):
+    """
+    Copy the financial data of the user from the source to the target
+    database keeping the ids and timestamps, the sync clients don't see the
+    rows as changed. Return the number of rows copied.
+    """
+    # the outbox of the source goes to the log, not to the target
+    relay_events(source)
+    copied = 0
+    with transaction.atomic(using=target):
+        for model in get_sharded_models():
+            queryset = model._base_manager.using(source).filter(
+                user_id=user_id
+            ).order_by('pk')
+            last = 0
+            while True:
+                rows = list(queryset.filter(pk__gt=last)[:chunk_size])
+                if not rows:
+                    break
+                bulk_copy(model._base_manager.using(target), rows)
+                last = rows[-1].pk
+                copied += len(rows)
+    return copied
+
+
+def delete_user_data(user_id, using):
+    """Remove the financial data of the user from a database."""
+    with transaction.atomic(using=using):
+        for model in get_sharded_models():
+            # raw delete, the rows were copied so nothing derived changes
+            queryset = model._base_manager.using(using).filter(user_id=user_id)
+            queryset._raw_delete(using)
+
+
+def move_user_data(user_id, source, target, chunk_size=1000):
+    """
+    Move the financial data of the user to the database it is routed to.
+    Return the number of rows moved.
+    """
+    moved = copy_user_data(user_id, source, target, chunk_size)
+    delete_user_data(user_id, source)
+    # everything memoized was computed from the old shard
+    bump_user_data_version(user_id)
+    return moved
+
+
+def assign_user_shard(user_id, alias):
+    """Route the user to the shard, without an assignment the hash is used."""
+    if alias == get_hashed_shard(user_id):
+        ShardAssignment.objects.filter(user_id=user_id).delete()
+    else:
+        ShardAssignment.objects.update_or_create(
+            user_id=user_id, defaults={'alias': alias}
+        )
+    forget_user_shard(user_id)
+
+
+def move_user(user_id, target, chunk_size=1000):
+    """
+    Move the user to another shard and assign it there. Return the number of
+    rows moved. The user must be idle meanwhile, a transaction written on the
+    old shard during the copy would be lost. The old copy is removed once
+    every process routes the user to the new shard.
+    """
+    if target not in settings.FINANCIAL_SHARDS:
+        raise ValueError("{} is not a financial shard.".format(target))
+    source = get_user_shard(user_id)
+    if source == target:
+        return 0
+    moved = copy_user_data(user_id, source, target, chunk_size)
+    # the data is on both until the old copy is removed, route it first
+    assign_user_shard(user_id, target)
+    # the other processes keep the old shard until their cache expires
+    time.sleep(settings.FINANCIAL_SHARD_CACHE_TIMEOUT)
+    delete_user_data(user_id, source)
+    bump_user_data_version(user_id)
+    return moved
+
+
+def find_misplaced_users():
+    """
+    Return a list of (user_id, alias holding its data, alias it's routed to)
+    of the users whose data isn't on their shard, after a shard is added or
+    when the data is still on the default database.
+    """
+    misplaced = []
+    for alias in [DEFAULT_DB_ALIAS] + get_replica_aliases():
+        users = set()
+        for model in (Appliance, Redeem, ArchivedAppliance, ArchivedRedeem):
+            users.update(
+                model._base_manager.using(alias)
+                .values_list('user_id', flat=True).distinct()
+            )
+        for user_id in sorted(users):
+            shard = get_user_shard(user_id)
+            if shard != alias:
+                misplaced.append((user_id, alias, shard))
+    return misplaced
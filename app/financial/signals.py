@@ -0,0 +1,142 @@
+from functools import partial
+
+from django.contrib.auth.models import User
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models.signals import (
+    post_delete, post_migrate, post_save, pre_save,
+)
+from django.dispatch import receiver
+
+from .events import load_previous_state, record_deleted, record_saved
+from .live import broker
+from .lots import LotEngine
+from .models import *
+from .search import asset_index
+from .shards import remove_replicas, replicate_instance, set_shard_sequences
+from .snapshots import invalidate_snapshots
+from .utils import (
+    bump_assets_version, bump_prices_version, bump_user_data_version,
+    get_assets_version,
+)
+
+
+@receiver(post_save, sender=Appliance)
+@receiver(post_delete, sender=Appliance)
+@receiver(post_save, sender=Redeem)
+@receiver(post_delete, sender=Redeem)
+def financial_data_changed(sender, instance, using=None, **kwargs):
+    """
+    Invalidate everything memoized from the user data and push the new
+    totals to the open dashboards of the user once committed. The version is
+    changed again then, anything read before the commit is keyed by the old
+    one, and the dashboards of the other processes see it (see live.py).
+    """
+    bump_user_data_version(instance.user_id)
+    transaction.on_commit(
+        partial(data_committed, instance.user_id), using=using
+    )
+
+
+def data_committed(user_id):
+    bump_user_data_version(user_id)
+    broker.publish(user_id)
+
+
+@receiver(pre_save, sender=Appliance)
+@receiver(pre_save, sender=Redeem)
+def keep_previous_state(sender, instance, raw=False, using=None, **kwargs):
+    """An update is logged as the removal of the stored state."""
+    if not raw:
+        instance._previous_state = load_previous_state(instance, using)
+
+
+@receiver(post_save, sender=Appliance)
+@receiver(post_save, sender=Redeem)
+def log_saved_transaction(sender, instance, raw=False, using=None,
+                          **kwargs):
+    if not raw:
+        record_saved(
+            instance, instance.__dict__.pop('_previous_state', None), using
+        )
+
+
+@receiver(post_delete, sender=Appliance)
+@receiver(post_delete, sender=Redeem)
+def log_deleted_transaction(sender, instance, using=None, **kwargs):
+    record_deleted(instance, using)
+
+
+@receiver(post_save, sender=Asset)
+@receiver(post_delete, sender=Asset)
+def asset_changed(sender, instance, signal, **kwargs):
+    """
+    Update the asset name index of this process and invalidate the lookup
+    cache, in the other processes only if the cache is shared, else they
+    expire (ASSET_INDEX_MAX_AGE and ASSET_CACHE_TIMEOUT).
+    """
+    previous = get_assets_version()
+    version = bump_assets_version()
+    asset_index.update(
+        instance.pk, instance.name if signal is post_save else None,
+        previous, version
+    )
+
+
+@receiver(post_save, sender=AssetPrice)
+@receiver(post_delete, sender=AssetPrice)
+def asset_price_changed(sender, instance, **kwargs):
+    """Invalidate everything memoized from the prices."""
+    bump_prices_version()
+
+
+@receiver(post_save, sender=Appliance)
+@receiver(post_save, sender=Redeem)
+def process_lots(sender, instance, created, **kwargs):
+    """Match the new transaction against the lots."""
+    if created:
+        LotEngine().process(instance)
+    else:
+        # the asset may have changed, so all the user lots are rebuilt
+        LotEngine().invalidate(instance.user_id)
+
+
+@receiver(post_delete, sender=Appliance)
+@receiver(post_delete, sender=Redeem)
+def invalidate_lots(sender, instance, **kwargs):
+    LotEngine().invalidate(instance.user_id, instance.asset_id)
+
+
+@receiver(post_save, sender=Appliance)
+@receiver(post_save, sender=Redeem)
+@receiver(post_delete, sender=Appliance)
+@receiver(post_delete, sender=Redeem)
+def invalidate_position_snapshots(sender, instance, created=False, **kwargs):
+    """
+    A new or removed transaction changes the snapshots from its date onwards,
+    a changed one may have moved from an older date so all are removed.
+    """
+    if kwargs['signal'] is post_save and not created:
+        invalidate_snapshots(instance.user_id)
+    else:
+        invalidate_snapshots(instance.user_id, instance.request_date)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_save, sender=Asset)
+def replicate_to_shards(sender, instance, raw=False, using=None, **kwargs):
+    """The financial data in the shards reference the users and assets."""
+    if not raw and using == DEFAULT_DB_ALIAS:
+        replicate_instance(instance)
+
+
+@receiver(post_delete, sender=User)
+@receiver(post_delete, sender=Asset)
+def remove_from_shards(sender, instance, using=None, **kwargs):
+    if using == DEFAULT_DB_ALIAS:
+        remove_replicas(instance)
+
+
+@receiver(post_migrate)
+def init_shard_sequences(sender, using=DEFAULT_DB_ALIAS, **kwargs):
+    if sender.name == 'financial':
+        set_shard_sequences(using)
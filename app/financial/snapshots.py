@@ -0,0 +1,97 @@
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max, Q, Sum
+
+from .archive import get_ledger_models
+from .models import *
+from .routers import get_user_shard
+
+
+def get_last_snapshot_date(user_id, date=None):
+    """Return the date of the last snapshot of the user until the date."""
+    snapshots = PositionSnapshot.objects.for_user(user_id)
+    if date is not None:
+        snapshots = snapshots.filter(as_of__lte=date)
+    return snapshots.aggregate(last=Max('as_of'))['last']
+
+
+def get_positions_as_of(user_id, date):
+    """
+    Return a dict of asset_id to the quantity and invested amount (applied
+    minus redeemed) of the user at the end of the date. The nearest snapshot
+    is used and only the transactions after it are aggregated.
+    """
+    positions = {}
+    snapshot_date = get_last_snapshot_date(user_id, date)
+    if snapshot_date is not None:
+        for asset_id, quantity, invested in PositionSnapshot.objects.for_user(
+            user_id
+        ).filter(as_of=snapshot_date).values_list('asset_id', 'quantity', 'invested'):
+            positions[asset_id] = {'quantity': quantity, 'invested': invested}
+
+    ledger = [(1, model) for model in get_ledger_models(Appliance)]
+    ledger += [(-1, model) for model in get_ledger_models(Redeem)]
+    for sign, model in ledger:
+        rows = model.objects.for_user(user_id).filter(request_date__lte=date)
+        if snapshot_date is not None:
+            rows = rows.filter(request_date__gt=snapshot_date)
+        rows = rows.values('asset_id').annotate(
+            quantity=Sum('quantity'), total=Sum('total')
+        ).values_list('asset_id', 'quantity', 'total')
+        for asset_id, quantity, total in rows:
+            position = positions.setdefault(
+                asset_id, {'quantity': 0, 'invested': Decimal(0)}
+            )
+            position['quantity'] += sign * quantity
+            position['invested'] += sign * (total or 0)
+
+    for position in positions.values():
+        position['invested'] = round(
+            Decimal(position['invested']), settings.DEFAULT_DECIMAL_PLACES
+        )
+    return positions
+
+
+def take_snapshot(user_id, date):
+    """Store the positions of the user at the end of the date."""
+    positions = get_positions_as_of(user_id, date)
+    using = get_user_shard(user_id)
+    with transaction.atomic(using=using):
+        PositionSnapshot.objects.for_user(user_id).filter(as_of=date).delete()
+        PositionSnapshot.objects.using(using).bulk_create([
+            PositionSnapshot(
+                user_id=user_id,
+                asset_id=asset_id,
+                as_of=date,
+                quantity=position['quantity'],
+                invested=position['invested'],
+            )
+            for asset_id, position in positions.items()
+            if position['quantity'] or position['invested']
+        ])
+
+
+def count_transactions_since_snapshot(user_id):
+    """Return the number of transactions after the last snapshot of the user."""
+    last = get_last_snapshot_date(user_id)
+    since = Q(request_date__gt=last) if last is not None else Q()
+    return sum(
+        model.objects.for_user(user_id).filter(since).aggregate(
+            count=Count('pk')
+        )['count']
+        for base in (Appliance, Redeem)
+        for model in get_ledger_models(base)
+    )
+
+
+def invalidate_snapshots(user_id, date=None):
+    """
+    Remove the snapshots of the user from the date onwards, they don't
+    include a transaction on that date. Without date all are removed.
+    """
+    snapshots = PositionSnapshot.objects.for_user(user_id)
+    if date is not None:
+        snapshots = snapshots.filter(as_of__gte=date)
+    snapshots.delete()
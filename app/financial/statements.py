@@ -0,0 +1,154 @@
+import calendar
+import csv
+import datetime
+import hashlib
+import json
+import os
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.models import Count, Max, Sum
+
+from .archive import get_ledger_models
+from .events import relay_events
+from .lots import LotEngine
+from .models import *
+from .routers import get_user_shard
+from .snapshots import get_positions_as_of
+
+OPERATION_FIELDS = [
+    'request_date', 'operation', 'asset', 'quantity', 'unit_price', 'total'
+]
+
+
+def get_month_range(month):
+    """Return the first and last day of a month in the YYYY-MM format."""
+    first = datetime.datetime.strptime(month, "%Y-%m").date()
+    last = first.replace(day=calendar.monthrange(first.year, first.month)[1])
+    return first, last
+
+
+def get_statement_directory(month):
+    return os.path.join(settings.STATEMENTS_ROOT, month)
+
+
+def get_statement_fingerprint(user_id, last_day):
+    """
+    Return a fingerprint of everything a statement depends on, if it doesn't
+    change the statement doesn't need to be generated again. The totals miss
+    an edit of the asset or the date of a row, the last event of the user up
+    to the last day (an edit logs the previous state too) and the names of
+    the assets don't.
+    """
+    relay_events(get_user_shard(user_id))
+    events = TransactionEvent.objects.filter(
+        user_id=user_id, request_date__lte=last_day
+    )
+    assets = Asset.objects.filter(
+        pk__in=events.values('asset_id')
+    ).order_by('pk').values_list('pk', 'name')
+    parts = [
+        settings.LOT_METHOD,
+        events.aggregate(last=Max('seq'))['last'],
+        list(assets),
+    ]
+    for base in (Appliance, Redeem):
+        totals = {'count': 0, 'last': 0, 'quantity': 0, 'total': 0}
+        # moving rows to the archive doesn't change the fingerprint
+        for model in get_ledger_models(base):
+            aggregate = model.objects.for_user(user_id).filter(
+                request_date__lte=last_day
+            ).aggregate(
+                count=Count('pk'), last=Max('pk'),
+                quantity=Sum('quantity'), total=Sum('total')
+            )
+            totals['count'] += aggregate['count']
+            totals['last'] = max(totals['last'], aggregate['last'] or 0)
+            totals['quantity'] += aggregate['quantity'] or 0
+            totals['total'] += aggregate['total'] or 0
+        totals['total'] = round(
+            Decimal(totals['total']), settings.DEFAULT_DECIMAL_PLACES
+        )
+        parts.append(totals)
+    return hashlib.sha1(
+        json.dumps(parts, sort_keys=True, default=str).encode()
+    ).hexdigest()
+
+
+def _get_operations(user_id, first, last):
+    """Yield the operations of the month ordered by date, one query by table."""
+    ledger = [('appliance', model) for model in get_ledger_models(Appliance)]
+    ledger += [('redeem', model) for model in get_ledger_models(Redeem)]
+    for operation, model in ledger:
+        queryset = model.objects.for_user(user_id).filter(
+            request_date__range=(first, last)
+        ).order_by('request_date', 'pk').values_list(
+            'request_date', 'asset__name', 'quantity', 'unit_price', 'total'
+        )
+        for request_date, asset, quantity, unit_price, total in \
+                queryset.iterator(chunk_size=2000):
+            yield (request_date, operation, asset, quantity, unit_price, total)
+
+
+def get_positions(user_id, last_day):
+    """Return the positions of the user at the end of the last day."""
+    positions = get_positions_as_of(user_id, last_day)
+    assets = Asset.objects.in_bulk(list(positions))
+    return [
+        dict(asset=assets[asset_id].name, **position)
+        for asset_id, position in positions.items() if position['quantity']
+    ]
+
+
+def generate_statement(user_id, month, force=False):
+    """
+    Write the statement of the user in the month, a json with the summary,
+    realized gains and positions on the end of the month and a csv with the
+    operations. Return False if the statement was already up to date.
+    """
+    first, last = get_month_range(month)
+    directory = get_statement_directory(month)
+    base = os.path.join(directory, "user_{}".format(user_id))
+    fingerprint = get_statement_fingerprint(user_id, last)
+    if not force and os.path.exists(base + ".fingerprint"):
+        with open(base + ".fingerprint") as fingerprint_file:
+            if fingerprint_file.read() == fingerprint:
+                return False
+    os.makedirs(directory, exist_ok=True)
+
+    totals = {'appliance': 0, 'redeem': 0}
+    with open(base + ".csv.tmp", 'w', newline='') as csv_file:
+        writer = csv.writer(csv_file)
+        writer.writerow(OPERATION_FIELDS)
+        for operation in _get_operations(user_id, first, last):
+            writer.writerow(operation)
+            totals[operation[1]] += operation[5] or 0
+
+    gains = LotEngine().get_realized_gains(user_id).filter(
+        request_date__range=(first, last)
+    ).order_by('request_date', 'pk').values_list(
+        'request_date', 'asset__name', 'quantity', 'proceeds', 'cost', 'gain'
+    )
+    realized_gains = [
+        dict(zip(('date', 'asset', 'quantity', 'proceeds', 'cost', 'gain'), row))
+        for row in gains.iterator(chunk_size=2000)
+    ]
+    statement = {
+        'user': user_id,
+        'month': month,
+        'method': settings.LOT_METHOD,
+        'total_appliance': totals['appliance'],
+        'total_redeem': totals['redeem'],
+        'realized_gain': sum(gain['gain'] for gain in realized_gains),
+        'realized_gains': realized_gains,
+        'positions': get_positions(user_id, last),
+    }
+    with open(base + ".json.tmp", 'w') as json_file:
+        json.dump(statement, json_file, separators=(',', ':'), default=str)
+
+    # the fingerprint is written last, so an interrupted run is redone
+    os.replace(base + ".csv.tmp", base + ".csv")
+    os.replace(base + ".json.tmp", base + ".json")
+    with open(base + ".fingerprint", 'w') as fingerprint_file:
+        fingerprint_file.write(fingerprint)
+    return True
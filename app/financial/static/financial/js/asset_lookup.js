@@ -0,0 +1,25 @@
+jQuery(function () {
+
+    // the asset selects render only the selected option, the others are
+    // fetched page by page while the user types
+    jQuery('select[data-lookup-url]').each(function () {
+        var select = jQuery(this);
+        var modal = select.closest('.modal');
+        select.select2({
+            theme: 'bootstrap',
+            width: '100%',
+            allowClear: true,
+            placeholder: '',
+            dropdownParent: modal.length ? modal : jQuery(document.body),
+            ajax: {
+                url: select.data('lookup-url'),
+                dataType: 'json',
+                delay: 250,
+                data: function (params) {
+                    return { q: params.term || '', page: params.page || 1 };
+                },
+            },
+        });
+    });
+
+});
@@ -0,0 +1,152 @@
+import hashlib
+from collections import defaultdict
+from heapq import nlargest
+from operator import itemgetter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import CharField, Count, Sum, Value
+from django.db.models.functions import TruncMonth
+
+from .lookups import AssetLookup
+from .models import *
+from .utils import get_assets_version, get_user_data_version, single_flight
+
+SUMMARY_KEY = "financial:dashboard_summary:{}:{}:{}:{}"
+# only bounds the memory, a new version of the data changes the key
+SUMMARY_TIMEOUT = 300
+# kind in the summary -> hot and archive model
+KINDS = {
+    'appliance': (Appliance, ArchivedAppliance),
+    'redeem': (Redeem, ArchivedRedeem),
+}
+
+
+def get_summary_etag(user_id, latest):
+    """
+    Return the ETag of the summary of the user, it changes with the data of
+    the user and the assets, so it's known without computing the summary.
+    """
+    key = "{}:{}:{}:{}".format(
+        user_id, get_user_data_version(user_id), get_assets_version(), latest
+    )
+    return '"{}"'.format(hashlib.md5(key.encode()).hexdigest())
+
+
+def get_dashboard_summary(user, latest=10):
+    """
+    Return the totals, the totals by asset, by modality and by month and the
+    latest transactions of the user, kept in the cache by the versions of
+    the data so the identical requests share them.
+    """
+    key = SUMMARY_KEY.format(
+        user.pk, get_user_data_version(user.pk), get_assets_version(), latest
+    )
+    summary = cache.get(key)
+    if summary is None:
+        summary = single_flight.do(
+            key, lambda: _get_dashboard_summary(user, latest),
+            shared=settings.SINGLE_FLIGHT_SHARED
+        )
+        cache.set(key, summary, SUMMARY_TIMEOUT)
+    return summary
+
+
+def get_grouped_totals(user):
+    """
+    Return the rows (kind, asset_id, month, count, quantity, total) of the
+    transactions of the user, hot and archived, summed by the database in
+    one query, a union of the grouped tables.
+    """
+    querysets = [
+        model.objects.for_user(user).annotate(
+            kind=Value(kind, output_field=CharField()),
+            month=TruncMonth('request_date'),
+        ).values('kind', 'asset_id', 'month').annotate(
+            count=Count('pk'), quantity=Sum('quantity'), total=Sum('total'),
+        ).values_list(
+            'kind', 'asset_id', 'month', 'count', 'quantity', 'total'
+        ).order_by()
+        for kind, models in KINDS.items() for model in models
+    ]
+    return list(querysets[0].union(*querysets[1:], all=True))
+
+
+def _get_dashboard_summary(user, latest):
+    rows = get_grouped_totals(user)
+    lookup = AssetLookup()
+    lookup.prefetch({row[1] for row in rows})
+    totals = {kind: {'count': 0, 'total': 0} for kind in KINDS}
+    by_asset = defaultdict(lambda: {kind: 0 for kind in KINDS})
+    quantities = defaultdict(int)
+    by_modality = defaultdict(lambda: {kind: 0 for kind in KINDS})
+    by_month = defaultdict(lambda: {kind: 0 for kind in KINDS})
+    for kind, asset_id, month, count, quantity, total in rows:
+        total = total or 0
+        totals[kind]['count'] += count
+        totals[kind]['total'] += total
+        by_asset[asset_id][kind] += total
+        quantities[asset_id] += quantity if kind == 'appliance' else -quantity
+        asset = lookup.get(asset_id)
+        if asset is not None:
+            by_modality[asset.modality][kind] += total
+        by_month[month][kind] += total
+
+    assets = []
+    for asset_id, sums in sorted(by_asset.items()):
+        asset = lookup.get(asset_id)
+        if asset is not None:
+            assets.append(dict(
+                sums, asset=asset_id, name=asset.name,
+                modality=asset.modality, quantity=quantities[asset_id],
+            ))
+    labels = dict(Asset.MODALITY_CHOICES)
+    return {
+        'totals': dict(
+            totals,
+            balance=totals['appliance']['total'] - totals['redeem']['total'],
+        ),
+        'by_asset': assets,
+        'by_modality': [
+            dict(sums, modality=modality, label=labels.get(modality))
+            for modality, sums in sorted(by_modality.items())
+        ],
+        'months': [
+            dict(sums, month=month.strftime('%Y-%m'))
+            for month, sums in sorted(by_month.items())
+        ],
+        # the same as FinancialMixin.get_appliance_by_asset_donut_chart
+        'donut': {
+            'series': [
+                float(round(
+                    asset['appliance'], settings.DEFAULT_DECIMAL_PLACES
+                ))
+                for asset in assets if asset['appliance']
+            ],
+            'labels': [
+                asset['name'] for asset in assets if asset['appliance']
+            ],
+        },
+        'latest': get_latest_transactions(user, latest),
+    }
+
+
+def get_latest_transactions(user, count):
+    """
+    Return the latest appliances and redeems of the user by request date,
+    the last count of each table on the (user, request_date) index merged.
+    """
+    transactions = []
+    for kind, (model, _) in KINDS.items():
+        transactions.extend(
+            dict(row, kind=kind)
+            for row in model.objects.for_user(user).order_by(
+                '-request_date', '-pk'
+            ).values(
+                'pk', 'asset_id', 'request_date', 'quantity', 'unit_price',
+                'total'
+            )[:count]
+        )
+    return nlargest(
+        count, transactions, key=itemgetter('request_date', 'pk')
+    )
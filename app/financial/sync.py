@@ -0,0 +1,71 @@
+import datetime
+
+from django.conf import settings
+from django.core import signing
+from django.utils import timezone
+
+from .models import *
+
+TOKEN_SALT = 'financial.sync'
+# name in the response -> (model, kind in the event log)
+SYNCED = {
+    'appliances': (Appliance, TransactionEvent.APPLIANCE),
+    'redeems': (Redeem, TransactionEvent.REDEEM),
+}
+
+
+class InvalidToken(Exception):
+    pass
+
+
+def make_token(moment):
+    return signing.dumps(moment.isoformat(), salt=TOKEN_SALT)
+
+
+def read_token(token):
+    """Return the moment of a token made by make_token."""
+    try:
+        return datetime.datetime.fromisoformat(
+            signing.loads(token, salt=TOKEN_SALT)
+        )
+    except (signing.BadSignature, TypeError, ValueError):
+        raise InvalidToken(token)
+
+
+def get_changes(user, since=None):
+    """
+    Return a dict with the token of the next sync and, for each synced
+    model, the queryset of the rows of the user changed since the moment
+    and the ids of the rows deleted since it (from the event log). Without
+    a moment every row is returned.
+
+    The rows changed a little before the moment (SYNC_OVERLAP_SECONDS) are
+    returned again, so a write committed after the token was made but
+    timestamped before it isn't lost, the client updates them by id.
+    """
+    # made before the queries, a write meanwhile is returned again next time
+    changes = {'token': make_token(timezone.now())}
+    removed = {kind: set() for _, kind in SYNCED.values()}
+    if since is not None:
+        since -= datetime.timedelta(seconds=settings.SYNC_OVERLAP_SECONDS)
+        # an event of a shard is logged by the relay after the commit with
+        # the time of the relay, one logged late is returned next time
+        for kind, transaction_id in TransactionEvent.objects.filter(
+            user=user, action=TransactionEvent.REMOVED, created_at__gt=since
+        ).values_list('kind', 'transaction_id'):
+            removed[kind].add(transaction_id)
+    changes['deleted'] = {}
+    for name, (model, kind) in SYNCED.items():
+        rows = model.objects.for_user(user)
+        deleted = removed[kind]
+        if deleted:
+            # an update is logged as a removal too, only the missing ones
+            # were deleted
+            deleted -= set(rows.filter(pk__in=deleted).values_list(
+                'pk', flat=True
+            ))
+        changes[name] = rows if since is None else rows.filter(
+            updated_at__gt=since
+        )
+        changes['deleted'][name] = sorted(deleted)
+    return changes
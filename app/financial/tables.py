@@ -16,9 +16,30 @@ class AssetTable(tables.Table):
         fields = ['name', 'modality']
 
 
-class ApplianceTable(tables.Table):
+class FinancialTable(tables.Table):
+    """
+    Base of the appliance and redeem tables, given the totals of the
+    filtered rows (count, quantity and total) they are shown in the footer.
+    """
 
-    total = Column(verbose_name=_("Total"), accessor="get_total")
+    asset = Column(
+        footer=lambda table: "{} {}".format(
+            table.totals['count'], _("records")
+        )
+    )
+    quantity = Column(footer=lambda table: table.totals['quantity'])
+    total = Column(
+        verbose_name=_("Total"), accessor="get_total",
+        footer=lambda table: table.totals['total']
+    )
+
+    def __init__(self, *args, totals=None, **kwargs):
+        self.totals = totals
+        kwargs.setdefault('show_footer', totals is not None)
+        super().__init__(*args, **kwargs)
+
+
+class ApplianceTable(FinancialTable):
 
     class Meta:
         model = Appliance
@@ -31,9 +52,7 @@ class ApplianceTable(tables.Table):
                   'unit_price', 'total', 'ip_address']
 
 
-class RedeemTable(tables.Table):
-
-    total = Column(verbose_name=_("Total"), accessor="get_total")
+class RedeemTable(FinancialTable):
 
     class Meta:
         model = Redeem
@@ -1,4 +1,12 @@
-from django.test import TestCase
+import datetime
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest import skipUnless
+from django.conf import settings
+from django.test import TestCase, override_settings
 from django.utils import timezone
 from django.contrib.auth.models import User
 
@@ -7,6 +15,7 @@ from .serializers import *
 
 
 class TestAsset(TestCase):
+    databases = '__all__'
 
     def setUp(self):
         user = User.objects.create_user(
@@ -87,6 +96,7 @@ class TestAsset(TestCase):
 
 
 class TestAppliance(TestCase):
+    databases = '__all__'
 
     def setUp(self):
         user = User.objects.create_user(
@@ -115,7 +125,7 @@ class TestAppliance(TestCase):
         )
         self.assertEqual(response.status_code, 201)
 
-        appliance = Appliance.objects.get(pk=1)
+        appliance = Appliance.objects.for_user(1).get()
         self.assertEqual(appliance.total, 10)
 
     def test_rest_appliance_ip(self):
@@ -153,13 +163,14 @@ class TestAppliance(TestCase):
 
         # pegando a lista de aplicações do usuário que está logado, no caso o usuário testuser
         response = self.client.get('/financial/api/rest/appliance/list/')
-        appliance = Appliance.objects.filter(user=1)
+        appliance = Appliance.objects.for_user(1)
         appliance_serializer = ApplianceGetSerializer(data=appliance, many=True)
         appliance_serializer.is_valid()
         self.assertListEqual(response.data, appliance_serializer.data)
 
 
 class TestRedeem(TestCase):
+    databases = '__all__'
 
     def setUp(self):
         user = User.objects.create_user(
@@ -188,7 +199,7 @@ class TestRedeem(TestCase):
         )
         self.assertEqual(response.status_code, 201)
 
-        redeem = Redeem.objects.get(pk=1)
+        redeem = Redeem.objects.for_user(1).get()
         self.assertEqual(redeem.total, 10)
 
     def test_rest_appliance_ip(self):
@@ -226,13 +237,14 @@ class TestRedeem(TestCase):
 
         # pegando a lista de aplicações do usuário que está logado, no caso o usuário testuser
         response = self.client.get('/financial/api/rest/redeem/list/')
-        redeem = Redeem.objects.filter(user=1)
+        redeem = Redeem.objects.for_user(1)
         redeem_serializer = RedeemGetSerializer(data=redeem, many=True)
         redeem_serializer.is_valid()
         self.assertListEqual(response.data, redeem_serializer.data)
 
 
 class TestFinancialMixin(TestCase):
+    databases = '__all__'
 
     def setUp(self):
         user = User.objects.create_user(
@@ -276,3 +288,1730 @@ class TestFinancialMixin(TestCase):
                 'labels': ['Bitcoin']
             }
         )
+
+
+class TestValuation(TestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        user = User.objects.create_user(
+            username='testuser1',
+            password='123456'
+        )
+        self.client.login(username='testuser1', password="123456")
+
+        asset = Asset.objects.create(
+            name="BITCOIN",
+            modality="CR",
+            user=user,
+        )
+        Appliance.objects.create(
+            asset=asset,
+            request_date=datetime.date(2021, 7, 1),
+            quantity=10,
+            unit_price=10,
+            user=user,
+            ip_address='127.0.0.1',
+        )
+        Redeem.objects.create(
+            asset=asset,
+            request_date=datetime.date(2021, 7, 3),
+            quantity=4,
+            unit_price=15,
+            user=user,
+            ip_address='127.0.0.1',
+        )
+
+    def test_asset_price_bulk_load(self):
+        """Testar se o carregamento em lote cria e atualiza as cotações."""
+        asset = Asset.objects.get(pk=1)
+        created, updated = AssetPrice.objects.bulk_load([
+            (asset.pk, datetime.date(2021, 7, 1), 10),
+            (asset.pk, datetime.date(2021, 7, 2), 12),
+        ])
+        self.assertEqual((created, updated), (2, 0))
+        created, updated = AssetPrice.objects.bulk_load([
+            (asset.pk, datetime.date(2021, 7, 2), 13),
+            (asset.pk, datetime.date(2021, 7, 3), 15),
+        ])
+        self.assertEqual((created, updated), (1, 1))
+        self.assertEqual(
+            AssetPrice.objects.get(date=datetime.date(2021, 7, 2)).price, 13
+        )
+
+    def test_rest_portfolio_valuation(self):
+        """Testar o valor de mercado diário com preenchimento de cotações."""
+        AssetPrice.objects.bulk_load([
+            (1, datetime.date(2021, 6, 30), 9),
+            (1, datetime.date(2021, 7, 2), 12),
+        ])
+        response = self.client.get(
+            '/financial/api/rest/portfolio/valuation/'
+            '?start=2021-07-01&end=2021-07-04'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {
+            'dates': ['2021-07-01', '2021-07-02', '2021-07-03', '2021-07-04'],
+            'market_value': [90.0, 120.0, 72.0, 72.0],
+            'cost_basis': [100.0, 100.0, 60.0, 60.0],
+            'unrealized_pnl': [-10.0, 20.0, 12.0, 12.0],
+        })
+
+
+    def test_portfolio_without_transactions(self):
+        """Testar a carteira sem dados e com o fim antes da primeira transação."""
+        response = self.client.get(
+            '/financial/api/rest/portfolio/valuation/?end=2021-06-29'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['dates'], ['2021-06-29'])
+        self.assertEqual(response.data['market_value'], [0.0])
+        response = self.client.get(
+            '/financial/api/rest/portfolio/analytics/?end=2021-06-29'
+        )
+        self.assertEqual(response.status_code, 200)
+        User.objects.create_user(username='testuser2', password='123456')
+        self.client.login(username='testuser2', password="123456")
+        for url in ('/financial/api/rest/portfolio/valuation/',
+                    '/financial/api/rest/portfolio/analytics/'):
+            self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_invalid_period(self):
+        """Testar o erro de período com início depois do fim ou muito longo."""
+        for query in ('start=2021-07-04&end=2021-07-01',
+                      'start=1900-01-01&end=2021-07-01'):
+            for url in ('/financial/api/rest/portfolio/valuation/',
+                        '/financial/api/rest/portfolio/analytics/'):
+                response = self.client.get('{}?{}'.format(url, query))
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('start', response.data)
+
+    def test_period_bounds(self):
+        """Testar o fim depois de hoje e o início padrão muito antigo."""
+        from unittest import mock
+        url = '/financial/api/rest/portfolio/valuation/'
+        response = self.client.get(url + '?end=9999-12-31')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('end', response.data)
+        # the first transaction is the start when it isn't passed
+        with mock.patch('financial.rest_views.PORTFOLIO_MAX_DAYS', 30):
+            response = self.client.get(url + '?end=2021-07-30')
+            self.assertEqual(response.status_code, 200)
+            response = self.client.get(url + '?end=2021-08-31')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('start', response.data)
+
+
+class TestAnalytics(TestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        user = User.objects.create_user(
+            username='testuser1',
+            password='123456'
+        )
+        self.client.login(username='testuser1', password="123456")
+
+        asset = Asset.objects.create(
+            name="BITCOIN",
+            modality="CR",
+            user=user,
+        )
+        Appliance.objects.create(
+            asset=asset,
+            request_date=datetime.date(2020, 1, 1),
+            quantity=10,
+            unit_price=10,
+            user=user,
+            ip_address='127.0.0.1',
+        )
+        AssetPrice.objects.bulk_load([
+            (asset.pk, datetime.date(2020, 1, 1), 10),
+            (asset.pk, datetime.date(2020, 7, 1), 5),
+            (asset.pk, datetime.date(2020, 12, 31), 11),
+        ])
+
+    def test_xirr(self):
+        """Testar a taxa interna de retorno de um ano."""
+        from .analytics import xirr
+        self.assertAlmostEqual(xirr([0, 365], [-100, 110]), 0.1, places=6)
+        self.assertIsNone(xirr([0, 365], [-100, -10]))
+
+    def test_rest_portfolio_analytics(self):
+        """Testar as métricas da carteira, modalidade e ativo."""
+        response = self.client.get(
+            '/financial/api/rest/portfolio/analytics/?end=2020-12-31'
+        )
+        self.assertEqual(response.status_code, 200)
+        portfolio = response.data['portfolio']
+        self.assertAlmostEqual(portfolio['twr'], 0.1)
+        self.assertAlmostEqual(portfolio['max_drawdown'], -0.5)
+        self.assertAlmostEqual(portfolio['xirr'], 0.1, places=2)
+        self.assertEqual(response.data['modalities']['CR'], portfolio)
+        self.assertEqual(response.data['assets'][0]['name'], 'Bitcoin')
+
+    def test_analytics_memoized_by_data_version(self):
+        """Testar se o resultado é refeito somente quando os dados mudam."""
+        url = '/financial/api/rest/portfolio/analytics/?end=2020-12-31'
+        self.client.get(url)
+        with self.assertNumQueries(2):
+            # only the session and the user are queried
+            self.client.get(url)
+        Redeem.objects.create(
+            asset=Asset.objects.get(pk=1),
+            request_date=datetime.date(2020, 12, 31),
+            quantity=10,
+            unit_price=11,
+            user=User.objects.get(pk=1),
+            ip_address='127.0.0.1',
+        )
+        response = self.client.get(url)
+        self.assertAlmostEqual(response.data['portfolio']['twr'], 0.1)
+
+    def test_analytics_period_bounds(self):
+        """Testar os limites do período e uma entrada de cache por usuário."""
+        from unittest import mock
+        from django.core.cache import cache
+        url = '/financial/api/rest/portfolio/analytics/'
+        response = self.client.get(url + '?end=9999-12-31')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('end', response.data)
+        with mock.patch('financial.rest_views.PORTFOLIO_MAX_DAYS', 2):
+            response = self.client.get(url + '?end=2020-12-31')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('start', response.data)
+
+        with mock.patch.object(cache, 'set', wraps=cache.set) as cache_set:
+            for day in range(1, 6):
+                self.client.get(url + '?end=2020-12-{:02}'.format(day + 20))
+        keys = {call.args[0] for call in cache_set.call_args_list
+                if call.args[0].startswith('financial:analytics:')}
+        self.assertEqual(len(keys), 1)
+
+    def test_analytics_invalidated_by_asset_change(self):
+        """Testar se a troca da modalidade de um ativo refaz o resultado."""
+        url = '/financial/api/rest/portfolio/analytics/?end=2020-12-31'
+        self.assertIn('CR', self.client.get(url).data['modalities'])
+        asset = Asset.objects.get(pk=1)
+        asset.modality = "RV"
+        asset.save()
+        modalities = self.client.get(url).data['modalities']
+        self.assertEqual(list(modalities), ['RV'])
+
+
+class TestLots(TestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser1',
+            password='123456'
+        )
+        self.asset = Asset.objects.create(
+            name="BITCOIN",
+            modality="CR",
+            user=self.user,
+        )
+
+    def create(self, model, day, quantity, unit_price):
+        return model.objects.create(
+            asset=self.asset,
+            request_date=datetime.date(2021, 7, day),
+            quantity=quantity,
+            unit_price=unit_price,
+            user=self.user,
+            ip_address='127.0.0.1',
+        )
+
+    def test_lots_fifo(self):
+        """Testar o casamento dos resgates com os lotes mais antigos."""
+        from .lots import LotEngine
+        with self.settings(LOT_METHOD=Lot.FIFO):
+            self.create(Appliance, 1, 10, 10)
+            self.create(Appliance, 2, 10, 20)
+            self.create(Redeem, 3, 15, 30)
+            gains = LotEngine().get_realized_gains(self.user.pk)
+            self.assertEqual(gains.get().cost, 10 * 10 + 5 * 20)
+            self.assertEqual(gains.get().gain, 450 - 200)
+            lot = LotEngine().get_open_lots(self.user.pk).get()
+            self.assertEqual((lot.quantity, lot.cost), (5, 100))
+
+    def test_lots_average_cost(self):
+        """Testar o custo médio, que não muda com os resgates."""
+        from .lots import LotEngine
+        self.create(Appliance, 1, 10, 10)
+        self.create(Appliance, 2, 10, 20)
+        self.create(Redeem, 3, 15, 30)
+        self.create(Appliance, 4, 5, 30)
+        gain = LotEngine().get_realized_gains(self.user.pk).get()
+        self.assertEqual((gain.cost, gain.gain), (225, 225))
+        lot = LotEngine().get_open_lots(self.user.pk).get()
+        self.assertEqual((lot.quantity, lot.cost), (10, 225))
+
+    def test_lots_backdated_and_deleted(self):
+        """
+        Testar se uma transação retroativa ou removida deixa os lotes iguais a
+        uma reconstrução completa.
+        """
+        from .lots import LotEngine
+        engine = LotEngine(Lot.FIFO)
+        with self.settings(LOT_METHOD=Lot.FIFO):
+            self.create(Appliance, 2, 10, 20)
+            self.create(Redeem, 3, 5, 30)
+            self.create(Appliance, 1, 10, 10)
+            appliance = self.create(Appliance, 4, 10, 40)
+            appliance.delete()
+
+            def snapshot():
+                return (
+                    list(engine.get_open_lots(self.user.pk).order_by('id')
+                         .values_list('quantity', 'cost')),
+                    list(engine.get_realized_gains(self.user.pk)
+                         .values_list('quantity', 'cost', 'gain')),
+                )
+            incremental = snapshot()
+            engine.rebuild(self.user.pk)
+            self.assertEqual(snapshot(), incremental)
+            self.assertEqual(incremental[1], [(5, 50, 100)])
+
+
+class TestStatements(TestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.user = User.objects.create_user(
+            username='testuser1',
+            password='123456'
+        )
+        asset = Asset.objects.create(
+            name="BITCOIN",
+            modality="CR",
+            user=self.user,
+        )
+        for model, day, quantity, unit_price in (
+                (Appliance, 1, 10, 10), (Redeem, 20, 4, 15),
+                (Appliance, 5, 3, 10)):
+            model.objects.create(
+                asset=asset,
+                request_date=datetime.date(2021, 7, day),
+                quantity=quantity,
+                unit_price=unit_price,
+                user=self.user,
+                ip_address='127.0.0.1',
+            )
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_generate_statements(self):
+        """Testar o extrato mensal e se ele é refeito somente se mudar."""
+        from django.core.management import call_command
+        from io import StringIO
+
+        def generate():
+            out = StringIO()
+            with self.settings(STATEMENTS_ROOT=self.directory):
+                call_command('generate_statements', month='2021-07', stdout=out)
+            return out.getvalue()
+
+        self.assertIn("1 statements generated", generate())
+        path = os.path.join(self.directory, '2021-07', 'user_1')
+        with open(path + '.json') as json_file:
+            statement = json.load(json_file)
+        self.assertEqual(statement['total_appliance'], '130.00')
+        self.assertEqual(statement['realized_gain'], '20.00')
+        self.assertEqual(statement['positions'], [
+            {'asset': 'Bitcoin', 'quantity': 9, 'invested': '70.00'}
+        ])
+        with open(path + '.csv') as csv_file:
+            self.assertEqual(len(csv_file.readlines()), 4)
+
+        self.assertIn("1 already up to date", generate())
+        Redeem.objects.create(
+            asset=Asset.objects.get(pk=1),
+            request_date=datetime.date(2021, 7, 21),
+            quantity=1,
+            unit_price=10,
+            user=self.user,
+            ip_address='127.0.0.1',
+        )
+        self.assertIn("1 statements generated", generate())
+
+    def test_fingerprint_edits(self):
+        """Testar se editar o ativo ou a data de uma linha muda a assinatura."""
+        from .statements import get_statement_fingerprint
+        last_day = datetime.date(2021, 7, 31)
+
+        def fingerprint():
+            return get_statement_fingerprint(self.user.pk, last_day)
+
+        fingerprints = [fingerprint()]
+        other = Asset.objects.create(name="ETHEREUM", modality="CR",
+                                     user=self.user)
+        appliance = Appliance.objects.for_user(self.user).get(
+            request_date__day=5
+        )
+        appliance.asset = other
+        appliance.save()
+        fingerprints.append(fingerprint())
+        appliance.request_date = datetime.date(2021, 7, 6)
+        appliance.save()
+        fingerprints.append(fingerprint())
+        other.name = "ETHER"
+        other.save()
+        fingerprints.append(fingerprint())
+        self.assertEqual(len(set(fingerprints)), 4)
+        self.assertEqual(fingerprint(), fingerprints[-1])
+
+
+class TestPositionSnapshot(TestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser1',
+            password='123456'
+        )
+        self.client.login(username='testuser1', password="123456")
+        self.asset = Asset.objects.create(
+            name="BITCOIN",
+            modality="CR",
+            user=self.user,
+        )
+        for model, month, quantity in (
+                (Appliance, 1, 10), (Redeem, 2, 3), (Appliance, 3, 5)):
+            self.create(model, datetime.date(2021, month, 10), quantity)
+
+    def create(self, model, request_date, quantity):
+        return model.objects.create(
+            asset=self.asset,
+            request_date=request_date,
+            quantity=quantity,
+            unit_price=10,
+            user=self.user,
+            ip_address='127.0.0.1',
+        )
+
+    def test_positions_as_of_with_snapshot(self):
+        """Testar se o snapshot mais as transações depois dele é exato."""
+        from .routers import get_user_shard
+        from .snapshots import get_positions_as_of, take_snapshot
+        take_snapshot(self.user.pk, datetime.date(2021, 2, 28))
+        # the snapshot and the hot and archive tables after it
+        with self.assertNumQueries(6, using=get_user_shard(self.user)):
+            positions = get_positions_as_of(
+                self.user.pk, datetime.date(2021, 3, 31)
+            )
+        self.assertEqual(positions, {1: {'quantity': 12, 'invested': 120}})
+        response = self.client.get(
+            '/financial/api/rest/portfolio/positions/?date=2021-02-15'
+        )
+        self.assertEqual(
+            response.data, [{'asset': 1, 'quantity': 7, 'invested': 70}]
+        )
+
+    def test_backdated_transaction_invalidates_snapshots(self):
+        """Testar se uma transação retroativa remove os snapshots seguintes."""
+        from .snapshots import get_positions_as_of, take_snapshot
+        take_snapshot(self.user.pk, datetime.date(2021, 1, 31))
+        take_snapshot(self.user.pk, datetime.date(2021, 2, 28))
+        self.create(Redeem, datetime.date(2021, 2, 1), 1)
+        self.assertEqual(
+            list(PositionSnapshot.objects.for_user(self.user).values_list(
+                'as_of', flat=True
+            )),
+            [datetime.date(2021, 1, 31)]
+        )
+        positions = get_positions_as_of(
+            self.user.pk, datetime.date(2021, 2, 28)
+        )
+        self.assertEqual(positions[1]['quantity'], 6)
+
+
+class TestArchive(TestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser1',
+            password='123456'
+        )
+        self.client.login(username='testuser1', password="123456")
+        asset = Asset.objects.create(
+            name="BITCOIN",
+            modality="CR",
+            user=self.user,
+        )
+        for model, year, quantity in (
+                (Appliance, 2019, 10), (Redeem, 2019, 2), (Appliance, 2021, 5),
+                (Appliance, 2018, 1)):
+            model.objects.create(
+                asset=asset,
+                request_date=datetime.date(year, 1, 10),
+                quantity=quantity,
+                unit_price=10,
+                user=self.user,
+                ip_address='127.0.0.1',
+            )
+
+    def test_archive_keeps_totals_exact(self):
+        """Testar se os totais continuam exatos depois de arquivar."""
+        from django.core.management import call_command
+        from .lots import LotEngine
+        from .utils import FinancialMixin
+        gains = list(LotEngine().get_realized_gains(self.user.pk).values_list(
+            'quantity', 'cost', 'gain'))
+        call_command(
+            'archive_transactions', before='2020-01-01', chunk_size=1,
+            stdout=StringIO()
+        )
+        self.assertEqual(Appliance.objects.for_user(self.user).count(), 1)
+        self.assertEqual(
+            ArchivedAppliance.objects.for_user(self.user).count(), 2
+        )
+        self.assertEqual(ArchivedRedeem.objects.for_user(self.user).count(), 1)
+
+        response = self.client.get(
+            '/financial/appliance/dashboard/data/chart/donut/'
+        )
+        self.assertEqual(
+            response.data, {'series': [160], 'labels': ['Bitcoin']}
+        )
+        response = self.client.get('/dashboard/')
+        self.assertEqual(response.context['total_redeemed'], 20)
+
+        # the lots rebuilt from the hot and archive tables are the same
+        LotEngine().rebuild(self.user.pk)
+        self.assertEqual(
+            list(LotEngine().get_realized_gains(self.user.pk).values_list(
+                'quantity', 'cost', 'gain')),
+            gains
+        )
+
+    def test_archive_keeps_timestamps(self):
+        """Testar se as datas de criação e alteração são mantidas."""
+        from .archive import archive_transactions
+        created = timezone.now() - datetime.timedelta(days=400)
+        updated = created + datetime.timedelta(days=1)
+        Appliance.objects.for_user(self.user).update(
+            created_at=created, updated_at=updated
+        )
+        archive_transactions(datetime.date(2020, 1, 1))
+        archived = ArchivedAppliance.objects.for_user(self.user)
+        self.assertEqual(archived.count(), 2)
+        for row in archived:
+            self.assertEqual(row.created_at, created)
+            self.assertEqual(row.updated_at, updated)
+
+    def test_history_union(self):
+        """Testar se o modo histórico une as tabelas principais e o arquivo."""
+        from .archive import archive_transactions
+        archive_transactions(datetime.date(2020, 1, 1))
+        response = self.client.get('/financial/api/rest/appliance/list/')
+        self.assertEqual(len(response.data), 1)
+        response = self.client.get(
+            '/financial/api/rest/appliance/list/?history=1'
+        )
+        self.assertEqual(
+            sorted(row['quantity'] for row in response.data), [1, 5, 10]
+        )
+
+
+class TestSharding(TestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser1',
+            password='123456'
+        )
+
+    def tearDown(self):
+        from .routers import forget_user_shard
+        forget_user_shard(self.user.pk)
+
+    def test_hashed_shard(self):
+        """Testar se o hash distribui os usuários de forma estável."""
+        from .routers import get_hashed_shard
+        shards = ['shard_0', 'shard_1', 'shard_2']
+        placed = [get_hashed_shard(user_id, shards) for user_id in range(300)]
+        self.assertEqual(
+            placed, [get_hashed_shard(user_id, shards) for user_id in range(300)]
+        )
+        for shard in shards:
+            self.assertGreater(placed.count(shard), 50)
+
+    def test_router(self):
+        """Testar se o roteador usa o shard do usuário e sua atribuição."""
+        from django.test import override_settings
+        from .routers import UserShardRouter, get_hashed_shard, get_user_shard
+        from .shards import assign_user_shard
+        router = UserShardRouter()
+        appliance = Appliance(user=self.user)
+        with override_settings(FINANCIAL_SHARDS=['default', 'shard_1']):
+            hashed = get_hashed_shard(self.user.pk)
+            other = 'shard_1' if hashed == 'default' else 'default'
+            self.assertEqual(
+                router.db_for_write(Appliance, instance=appliance), hashed
+            )
+            # the assets aren't sharded and a read without instance can't be
+            self.assertIsNone(router.db_for_read(Asset, instance=appliance))
+            self.assertIsNone(router.db_for_read(Appliance))
+
+            assign_user_shard(self.user.pk, other)
+            self.assertEqual(get_user_shard(self.user), other)
+            self.assertEqual(
+                router.db_for_read(Appliance, instance=self.user), other
+            )
+            assign_user_shard(self.user.pk, hashed)
+            self.assertEqual(get_user_shard(self.user), hashed)
+            self.assertFalse(ShardAssignment.objects.exists())
+
+    def test_assignment_cache_expires(self):
+        """Testar se a atribuição feita em outro processo é lida de novo."""
+        import time
+        from unittest import mock
+        from .routers import get_hashed_shard, get_user_shard
+        with override_settings(FINANCIAL_SHARDS=['default', 'shard_1'],
+                               FINANCIAL_SHARD_CACHE_TIMEOUT=60):
+            hashed = get_hashed_shard(self.user.pk)
+            other = 'shard_1' if hashed == 'default' else 'default'
+            self.assertEqual(get_user_shard(self.user), hashed)
+            # assigned by another process, this one still has the hash
+            ShardAssignment.objects.create(user=self.user, alias=other)
+            self.assertEqual(get_user_shard(self.user), hashed)
+            with mock.patch('django.core.cache.backends.locmem.time') as clock:
+                clock.time.return_value = time.time() + 61
+                self.assertEqual(get_user_shard(self.user), other)
+
+
+@skipUnless(
+    len(settings.FINANCIAL_SHARDS) > 1,
+    "Run with FINANCIAL_SHARD_COUNT=2 to test with several databases."
+)
+class TestShardDatabases(TestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser1',
+            password='123456'
+        )
+        self.client.login(username='testuser1', password="123456")
+        self.asset = Asset.objects.create(
+            name="BITCOIN",
+            modality="CR",
+            user=self.user,
+        )
+
+    def tearDown(self):
+        from .routers import forget_user_shard
+        forget_user_shard(self.user.pk)
+
+    @override_settings(FINANCIAL_SHARD_CACHE_TIMEOUT=0)
+    def test_move_user(self):
+        """Testar se os dados do usuário são movidos entre os shards."""
+        from .lots import LotEngine
+        from .routers import get_user_shard
+        from .shards import move_user
+        source = get_user_shard(self.user)
+        for model, quantity in ((Appliance, 10), (Redeem, 4)):
+            response = self.client.post(
+                '/financial/api/rest/{}/add/'.format(model.__name__.lower()),
+                {
+                    'asset': self.asset.pk,
+                    'request_date': '2021-01-10',
+                    'quantity': quantity,
+                    'unit_price': 10,
+                    'user': self.user.pk,
+                }
+            )
+            self.assertEqual(response.status_code, 201)
+        self.assertEqual(Appliance.objects.using(source).count(), 1)
+        self.assertFalse(Appliance.objects.using('default').exists())
+
+        created = Appliance.objects.for_user(self.user).values_list(
+            'created_at', 'updated_at'
+        ).get()
+        target = next(
+            alias for alias in settings.FINANCIAL_SHARDS if alias != source
+        )
+        self.assertEqual(move_user(self.user.pk, target), 5)
+        # the sync clients don't download the moved rows again
+        self.assertEqual(
+            Appliance.objects.for_user(self.user).values_list(
+                'created_at', 'updated_at'
+            ).get(),
+            created
+        )
+        self.assertEqual(get_user_shard(self.user), target)
+        self.assertFalse(Appliance.objects.using(source).exists())
+        self.assertEqual(
+            list(LotEngine().get_realized_gains(self.user.pk).values_list(
+                'quantity', 'gain')),
+            [(4, 0)]
+        )
+        response = self.client.get('/financial/api/rest/appliance/list/')
+        self.assertEqual([row['quantity'] for row in response.data], [10])
+
+
+class TestSingleFlight(TestCase):
+
+    def _run_concurrently(self, target, workers=16):
+        import threading
+        barrier = threading.Barrier(workers)
+        results = []
+        errors = []
+
+        def run():
+            barrier.wait()
+            try:
+                results.append(target())
+            except Exception as error:
+                errors.append(error)
+
+        threads = [threading.Thread(target=run) for _ in range(workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results, errors
+
+    def test_concurrent_calls_collapse(self):
+        """Testar se chamadas idênticas concorrentes computam uma só vez."""
+        import time
+        from .utils import SingleFlight
+        single_flight = SingleFlight()
+        calls = []
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.2)
+            return {'series': [1.0]}
+
+        results, errors = self._run_concurrently(
+            lambda: single_flight.do('donut:1:v1', compute)
+        )
+        self.assertEqual(errors, [])
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [{'series': [1.0]}] * 16)
+        # nothing is kept after the call
+        single_flight.do('donut:1:v1', compute)
+        self.assertEqual(len(calls), 2)
+
+    def test_error_shared_by_waiters(self):
+        """Testar se o erro da computação é repassado a quem esperava."""
+        import time
+        from .utils import SingleFlight
+        single_flight = SingleFlight()
+
+        def compute():
+            time.sleep(0.2)
+            raise ValueError("failed")
+
+        results, errors = self._run_concurrently(
+            lambda: single_flight.do('total:1:v1', compute)
+        )
+        self.assertEqual(results, [])
+        self.assertEqual(len(errors), 16)
+        self.assertTrue(all(isinstance(e, ValueError) for e in errors))
+
+    def test_shared_between_processes(self):
+        """Testar se o lock no cache coordena instâncias diferentes."""
+        import time
+        from django.core.cache import cache
+        from .utils import SingleFlight
+        # each instance stands in for a process
+        instances = [SingleFlight() for _ in range(4)]
+        calls = []
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.2)
+            return 42
+
+        index = iter(range(16))
+        results, errors = self._run_concurrently(
+            lambda: instances[next(index) % 4].do(
+                'total:1:v2', compute, shared=True
+            )
+        )
+        cache.clear()
+        self.assertEqual(errors, [])
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [42] * 16)
+
+
+class TestAssetLookup(TestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        user = User.objects.create_user(
+            username='testuser1',
+            password='123456'
+        )
+        self.client.login(username='testuser1', password="123456")
+        for index in range(25):
+            Asset.objects.create(
+                name="Ativo {:02d}".format(index), modality="RV", user=user
+            )
+        self.bitcoin = Asset.objects.create(
+            name="BITCOIN", modality="CR", user=user
+        )
+
+    def test_lookup_prefix_paginated(self):
+        """Testar a busca de ativos pelo prefixo do nome e paginada."""
+        url = '/financial/api/rest/asset/lookup/'
+        response = self.client.get(url, {'q': 'ati'})
+        self.assertEqual(len(response.data['results']), 20)
+        self.assertTrue(response.data['pagination']['more'])
+        self.assertEqual(response.data['results'][0]['text'], 'Ativo 00')
+        response = self.client.get(url, {'q': 'ati', 'page': 2})
+        self.assertEqual(len(response.data['results']), 5)
+        self.assertFalse(response.data['pagination']['more'])
+        response = self.client.get(url, {'q': 'bit'})
+        self.assertEqual(
+            response.data['results'],
+            [{'id': self.bitcoin.pk, 'text': 'Bitcoin'}]
+        )
+
+    def test_widget_renders_selected_only(self):
+        """Testar se o select renderiza somente o ativo selecionado."""
+        from .forms import ApplianceForm
+        with self.assertNumQueries(0):
+            html = str(ApplianceForm()['asset'])
+        self.assertEqual(html.count('<option'), 1)
+        self.assertIn(
+            'data-lookup-url="/financial/api/rest/asset/lookup/"', html
+        )
+
+        form = ApplianceForm(data={'asset': self.bitcoin.pk})
+        html = str(form['asset'])
+        self.assertEqual(html.count('<option'), 2)
+        self.assertIn(
+            '<option value="{}" selected>Bitcoin</option>'.format(
+                self.bitcoin.pk
+            ),
+            html
+        )
+        # the validation is a single primary key lookup
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                form.fields['asset'].clean(self.bitcoin.pk), self.bitcoin
+            )
+
+
+class TestAssetSearch(TestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        from .search import asset_index
+        # the rows of the other tests were rolled back without signals
+        asset_index.clear()
+        self.user = User.objects.create_user(
+            username='testuser1',
+            password='123456'
+        )
+        self.acao = Asset.objects.create(
+            name="Ação Energia", modality="RV", user=self.user
+        )
+        self.tesouro = Asset.objects.create(
+            name="Tesouro IPCA 2035", modality="RF", user=self.user
+        )
+
+    def test_search_ignores_accents_and_case(self):
+        """Testar a busca sem diferenciar acentos e maiúsculas."""
+        from .search import search_assets
+        self.assertEqual(search_assets('acao'), [self.acao.pk])
+        self.assertEqual(search_assets('AÇÃ'), [self.acao.pk])
+        self.assertEqual(search_assets('ipca'), [self.tesouro.pk])
+        self.assertEqual(search_assets('ipca 20'), [self.tesouro.pk])
+        self.assertEqual(search_assets('esouro'), [])
+
+    def test_search_limit_and_refresh(self):
+        """Testar o limite da busca e a atualização do índice."""
+        from .search import search_assets
+        for index in range(5):
+            Asset.objects.create(
+                name="Energia {}".format(index), modality="RV", user=self.user
+            )
+        self.assertEqual(len(search_assets('energia')), 6)
+        self.assertEqual(len(search_assets('energia', limit=2)), 2)
+        # ordered by the matched key, "energia" before "energia 0"
+        self.assertEqual(search_assets('energia', limit=1), [self.acao.pk])
+        self.assertEqual(
+            search_assets('energia', limit=2, offset=5),
+            [Asset.objects.get(name="Energia 4").pk]
+        )
+        self.acao.delete()
+        self.assertEqual(len(search_assets('energia')), 5)
+
+    def test_index_updated_and_rebuilt_in_background(self):
+        """Testar a atualização do índice e a reconstrução em segundo plano."""
+        import time
+        from unittest import mock
+        from .search import asset_index, search_assets
+        self.assertEqual(search_assets('tesouro'), [self.tesouro.pk])
+        # a save of this process is applied without a rebuild
+        self.tesouro.name = "Tesouro Prefixado"
+        self.tesouro.save()
+        with self.assertNumQueries(0):
+            self.assertEqual(search_assets('prefix'), [self.tesouro.pk])
+            self.assertEqual(search_assets('ipca'), [])
+
+        # renamed by another process, the version isn't seen by this one
+        Asset.objects.filter(pk=self.tesouro.pk).update(name="Tesouro Selic")
+        self.assertEqual(search_assets('selic'), [])
+        with mock.patch('financial.search.time') as clock, \
+                mock.patch('financial.search.threading.Thread') as thread:
+            clock.monotonic.return_value = (
+                time.monotonic() + settings.ASSET_INDEX_MAX_AGE + 1
+            )
+            # the expired index is still searched, the rebuild is started
+            self.assertEqual(search_assets('selic'), [])
+            self.assertEqual(search_assets('selic'), [])
+            thread.assert_called_once()
+            asset_index.rebuild()
+        self.assertEqual(search_assets('selic'), [self.tesouro.pk])
+
+    def test_filter_by_name(self):
+        """Testar o filtro de ativos pelo nome."""
+        from .filters import AssetFilter
+        queryset = AssetFilter(
+            {'name': 'acao'}, queryset=Asset.objects.all()
+        ).qs
+        self.assertEqual(list(queryset), [self.acao])
+
+
+class TestTransactionEvents(TestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser1',
+            password='123456'
+        )
+        self.asset = Asset.objects.create(
+            name="BITCOIN", modality="CR", user=self.user
+        )
+        self.appliance = Appliance.objects.create(
+            asset=self.asset,
+            request_date=datetime.date(2021, 1, 10),
+            quantity=10,
+            unit_price=10,
+            user=self.user,
+            ip_address='127.0.0.1',
+        )
+        Redeem.objects.create(
+            asset=self.asset,
+            request_date=datetime.date(2021, 2, 10),
+            quantity=4,
+            unit_price=20,
+            user=self.user,
+            ip_address='127.0.0.1',
+        )
+
+    def get_balance(self):
+        return AssetBalance.objects.for_user(self.user).values_list(
+            'applied_quantity', 'applied_total', 'redeemed_quantity',
+            'redeemed_total'
+        ).get()
+
+    def test_writes_are_logged_in_order(self):
+        """Testar se as escritas são registradas em ordem no log."""
+        from .routers import get_user_shard
+        # the events of a shard are moved to the log after the commit
+        with self.captureOnCommitCallbacks(
+            using=get_user_shard(self.user), execute=True
+        ):
+            self.appliance.quantity = 6
+            self.appliance.save()
+            self.appliance.delete()
+        events = list(TransactionEvent.objects.order_by('seq').values_list(
+            'kind', 'action', 'quantity', 'total'
+        ))
+        self.assertEqual(events, [
+            ('A', '+', 10, 100), ('R', '+', 4, 80), ('A', '-', 10, 100),
+            ('A', '+', 6, 60), ('A', '-', 6, 60),
+        ])
+
+    def test_rolled_back_write_is_not_logged(self):
+        """Testar se uma escrita desfeita não é registrada no log."""
+        from django.db import transaction
+        from .events import relay_all_events, relay_events
+        from .routers import get_user_shard
+        shard = get_user_shard(self.user)
+        relay_all_events()
+        count = TransactionEvent.objects.count()
+        with self.assertRaises(ValueError):
+            with transaction.atomic(using=shard):
+                self.appliance.quantity = 6
+                self.appliance.save()
+                raise ValueError
+        relay_all_events()
+        self.assertEqual(TransactionEvent.objects.count(), count)
+        self.assertFalse(PendingEvent.objects.using(shard).exists())
+
+        # a relay interrupted before removing the outbox isn't logged twice
+        self.appliance.delete()
+        pending = list(PendingEvent.objects.using(shard).values())
+        relay_events(shard)
+        PendingEvent.objects.using(shard).bulk_create(
+            [PendingEvent(**row) for row in pending]
+        )
+        relay_events(shard)
+        self.assertEqual(TransactionEvent.objects.count(), count + 1)
+
+    def test_projection_is_incremental_and_replayable(self):
+        """Testar a projeção incremental e a reconstrução a partir do log."""
+        from django.core.management import call_command
+        from .projections import get_projection
+        projection = get_projection('asset_balance')
+        self.assertEqual(projection.run(), 2)
+        self.assertEqual(self.get_balance(), (10, 100, 4, 80))
+        self.appliance.quantity = 6
+        self.appliance.save()
+        self.assertEqual(projection.run(), 2)
+        self.assertEqual(projection.run(), 0)
+        self.assertEqual(self.get_balance(), (6, 60, 4, 80))
+        self.assertEqual(projection.get_checkpoint().last_seq, (
+            TransactionEvent.objects.order_by('-seq').first().seq
+        ))
+
+        AssetBalance.objects.for_user(self.user).update(applied_quantity=0)
+        call_command('replay_projection', 'asset_balance', stdout=StringIO())
+        self.assertEqual(self.get_balance(), (6, 60, 4, 80))
+
+    def test_seed_and_removed_assets(self):
+        """Testar o registro dos dados antigos e os ativos removidos."""
+        from django.core.management import call_command
+        TransactionEvent.objects.all().delete()
+        call_command('replay_projection', seed=True, stdout=StringIO())
+        self.assertEqual(TransactionEvent.objects.count(), 2)
+        self.assertEqual(self.get_balance(), (10, 100, 4, 80))
+        # the events of the cascade are skipped with the balance removed
+        self.asset.delete()
+        call_command('run_projections', stdout=StringIO())
+        self.assertFalse(AssetBalance.objects.exists())
+
+
+@override_settings(SYNC_OVERLAP_SECONDS=0)
+class TestSync(TestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser1',
+            password='123456'
+        )
+        self.client.login(username='testuser1', password="123456")
+        self.asset = Asset.objects.create(
+            name="BITCOIN", modality="CR", user=self.user
+        )
+        self.appliances = [
+            Appliance.objects.create(
+                asset=self.asset,
+                request_date=datetime.date(2021, 1, day),
+                quantity=day,
+                unit_price=10,
+                user=self.user,
+                ip_address='127.0.0.1',
+            )
+            for day in range(1, 4)
+        ]
+
+    def test_sync_returns_only_changes(self):
+        """Testar se a sincronização retorna somente as mudanças."""
+        url = '/financial/api/rest/sync/'
+        response = self.client.get(url)
+        self.assertEqual(len(response.data['appliances']), 3)
+        token = response.data['token']
+
+        response = self.client.get(url, {'since': token})
+        self.assertEqual(response.data['appliances'], [])
+        self.assertEqual(
+            response.data['deleted'], {'appliances': [], 'redeems': []}
+        )
+
+        from contextlib import ExitStack
+        from django.db import DEFAULT_DB_ALIAS, connections
+        from django.test.utils import CaptureQueriesContext
+        from .routers import get_user_shard
+        changed, deleted = self.appliances[0], self.appliances[1]
+        deleted_pk = deleted.pk
+        # the events of a shard are moved to the log after the commit
+        with self.captureOnCommitCallbacks(
+            using=get_user_shard(self.user), execute=True
+        ):
+            changed.quantity = 7
+            changed.save()
+            deleted.delete()
+        # the queries of the default database and of the shard of the user
+        with ExitStack() as stack:
+            contexts = [
+                stack.enter_context(CaptureQueriesContext(connections[alias]))
+                for alias in {DEFAULT_DB_ALIAS, get_user_shard(self.user)}
+            ]
+            response = self.client.get(url, {'since': token})
+        self.assertEqual(sum(len(context) for context in contexts), 6)
+        self.assertEqual(
+            [(row['pk'], row['quantity'])
+             for row in response.data['appliances']],
+            [(changed.pk, 7)]
+        )
+        self.assertEqual(response.data['deleted']['appliances'], [deleted_pk])
+
+    def test_invalid_token(self):
+        """Testar um token inválido."""
+        response = self.client.get(
+            '/financial/api/rest/sync/', {'since': 'abc'}
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+class TestLiveDashboard(TestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser1',
+            password='123456'
+        )
+        self.client.login(username='testuser1', password="123456")
+        self.asset = Asset.objects.create(
+            name="BITCOIN", modality="CR", user=self.user
+        )
+
+    def add_appliance(self):
+        from .routers import get_user_shard
+        using = get_user_shard(self.user)
+        with self.captureOnCommitCallbacks(using=using, execute=True):
+            Appliance.objects.create(
+                asset=self.asset,
+                request_date=datetime.date(2021, 1, 10),
+                quantity=10,
+                unit_price=10,
+                user=self.user,
+                ip_address='127.0.0.1',
+            )
+
+    def stream(self, cookie, actions):
+        """
+        Open the events of the dashboard, run an action after each event and
+        disconnect when there are no more actions.
+        """
+        import asyncio
+        from asgiref.sync import async_to_sync, sync_to_async
+        from .live import dashboard_events
+        actions = list(actions)
+        messages = []
+
+        async def run():
+            disconnected = asyncio.Event()
+
+            async def receive():
+                await disconnected.wait()
+                return {'type': 'http.disconnect'}
+
+            async def send(message):
+                messages.append(message)
+                if not message.get('body', b'').startswith(b'event:'):
+                    return
+                if actions:
+                    # in this task, the database calls run in the test thread
+                    await sync_to_async(actions.pop(0))()
+                else:
+                    disconnected.set()
+
+            scope = {
+                'type': 'http', 'path': settings.SSE_DASHBOARD_PATH,
+                'headers': [(b'cookie', cookie.encode())],
+            }
+            await dashboard_events(scope, receive, send)
+
+        async_to_sync(run)()
+        return messages
+
+    def test_totals_pushed_on_change(self):
+        """Testar se os totais são enviados quando os dados mudam."""
+        from .live import broker
+        cookie = 'sessionid={}'.format(self.client.cookies['sessionid'].value)
+        messages = self.stream(cookie, [self.add_appliance])
+        self.assertEqual(messages[0]['status'], 200)
+        events = [
+            json.loads(message['body'].decode().split('data: ')[1])
+            for message in messages[1:]
+        ]
+        self.assertEqual(events[0]['donut'], {'series': [], 'labels': []})
+        self.assertEqual(events[1]['total_appliance'], 'R$ 100,00')
+        self.assertEqual(
+            events[1]['donut'], {'series': [100.0], 'labels': ['Bitcoin']}
+        )
+        self.assertEqual(broker.count(), 0)
+
+    @override_settings(SSE_POLL_SECONDS=0.01)
+    def test_totals_pushed_on_change_in_other_process(self):
+        """Testar se uma mudança feita em outro processo é enviada."""
+        from unittest import mock
+        from .live import broker
+
+        def add_appliance_elsewhere():
+            # the broker of this process isn't told
+            with mock.patch.object(broker, 'publish'):
+                self.add_appliance()
+
+        cookie = 'sessionid={}'.format(self.client.cookies['sessionid'].value)
+        messages = self.stream(cookie, [add_appliance_elsewhere])
+        event = json.loads(messages[-1]['body'].decode().split('data: ')[1])
+        self.assertEqual(event['total_appliance'], 'R$ 100,00')
+
+    def test_anonymous_forbidden(self):
+        """Testar se a conexão anônima é recusada."""
+        messages = self.stream('', [])
+        self.assertEqual(messages[0]['status'], 403)
+
+
+class TestSparseFields(TestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser1',
+            password='123456'
+        )
+        self.client.login(username='testuser1', password="123456")
+        asset = Asset.objects.create(
+            name="BITCOIN", modality="CR", user=self.user
+        )
+        for model in (Appliance, Redeem):
+            model.objects.create(
+                asset=asset,
+                request_date=datetime.date(2021, 1, 10),
+                quantity=10,
+                unit_price=10,
+                user=self.user,
+                ip_address='127.0.0.1',
+            )
+
+    def test_fields_trim_output_and_query(self):
+        """Testar se fields reduz a resposta e as colunas consultadas."""
+        from django.db import connections
+        from django.test.utils import CaptureQueriesContext
+        from .routers import get_user_shard
+        connection = connections[get_user_shard(self.user)]
+        for url in ('/financial/api/rest/appliance/list/',
+                    '/financial/api/rest/redeem/list/'):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(
+                    url, {'fields': 'asset,request_date,total'}
+                )
+            self.assertEqual(
+                response.data, [{
+                    'asset': Asset.objects.get().pk,
+                    'request_date': '2021-01-10',
+                    'total': '100.00',
+                }]
+            )
+            sql = queries.captured_queries[-1]['sql']
+            self.assertIn('"total"', sql)
+            self.assertNotIn('"unit_price"', sql)
+
+        response = self.client.get(
+            '/financial/api/rest/appliance/list/',
+            {'fields': 'quantity', 'history': 1}
+        )
+        self.assertEqual(response.data, [{'quantity': 10}])
+
+    def test_invalid_fields(self):
+        """Testar se somente os campos permitidos são aceitos."""
+        response = self.client.get(
+            '/financial/api/rest/appliance/list/', {'fields': 'ip_address'}
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+class TestStreamingList(TestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser1',
+            password='123456'
+        )
+        self.client.login(username='testuser1', password="123456")
+        asset = Asset.objects.create(
+            name="BITCOIN", modality="CR", user=self.user
+        )
+        for day in range(1, 6):
+            Appliance.objects.create(
+                asset=asset,
+                request_date=datetime.date(2021, 1, day),
+                quantity=day,
+                unit_price=10,
+                user=self.user,
+                ip_address='127.0.0.1',
+            )
+
+    def test_stream_json_array(self):
+        """Testar se a lista enviada aos poucos é igual à lista normal."""
+        from unittest import mock
+        from . import rest_views
+        url = '/financial/api/rest/appliance/list/'
+        expected = json.loads(self.client.get(url).content)
+        with mock.patch.object(rest_views, 'STREAM_CHUNK_SIZE', 2):
+            response = self.client.get(url, {'stream': 1})
+            chunks = list(response.streaming_content)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertEqual(len(chunks), 4)
+        self.assertEqual(json.loads(b''.join(chunks)), expected)
+
+        response = self.client.get(
+            '/financial/api/rest/redeem/list/', {'stream': 1}
+        )
+        self.assertEqual(b''.join(response.streaming_content), b'[]')
+
+    def test_stream_ndjson(self):
+        """Testar a lista em NDJSON pelo cabeçalho Accept."""
+        response = self.client.get(
+            '/financial/api/rest/appliance/list/', {'fields': 'quantity'},
+            HTTP_ACCEPT='application/x-ndjson'
+        )
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = b''.join(response.streaming_content).splitlines()
+        self.assertEqual(
+            [json.loads(line) for line in lines],
+            [{'quantity': quantity} for quantity in range(1, 6)]
+        )
+
+
+@override_settings(FINANCIAL_THROTTLE_RATES={
+    'appliance_add': {'burst': 2, 'rate': 0.1},
+})
+class TestThrottle(TestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        from .throttles import token_buckets
+        token_buckets.clear()
+        self.user = User.objects.create_user(
+            username='testuser1',
+            password='123456'
+        )
+        self.other = User.objects.create_user(
+            username='testuser2',
+            password='123456'
+        )
+        self.asset = Asset.objects.create(
+            name="BITCOIN", modality="CR", user=self.user
+        )
+
+    def add_appliance(self, user, ip='127.0.0.1'):
+        self.client.force_login(user)
+        return self.client.post(
+            '/financial/api/rest/appliance/add/',
+            data={
+                'asset': self.asset.pk,
+                'request_date': timezone.now().date(),
+                'quantity': 1,
+                'unit_price': 10,
+                'user': user.pk,
+            },
+            REMOTE_ADDR=ip
+        )
+
+    def test_burst_then_retry_after(self):
+        """Testar o limite por usuário e por ip com Retry-After."""
+        self.assertEqual(self.add_appliance(self.user).status_code, 201)
+        self.assertEqual(self.add_appliance(self.user).status_code, 201)
+        response = self.add_appliance(self.user)
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '10')
+        # the same ip is throttled, another ip isn't
+        self.assertEqual(self.add_appliance(self.other).status_code, 429)
+        self.assertEqual(
+            self.add_appliance(self.other, '10.0.0.2').status_code, 201
+        )
+        # other endpoints aren't throttled
+        self.client.force_login(self.user)
+        response = self.client.post(
+            '/financial/api/rest/redeem/add/',
+            data={
+                'asset': self.asset.pk,
+                'request_date': timezone.now().date(),
+                'quantity': 1,
+                'unit_price': 10,
+                'user': self.user.pk,
+            }
+        )
+        self.assertEqual(response.status_code, 201)
+
+    def test_bucket_refill_and_prune(self):
+        """Testar a reposição dos tokens e a remoção dos baldes cheios."""
+        from unittest import mock
+        from .throttles import TokenBuckets
+        buckets = TokenBuckets(max_keys=2)
+        with mock.patch('time.monotonic', return_value=100):
+            self.assertEqual(buckets.consume('a', 1, 2), 0)
+            self.assertEqual(buckets.consume('a', 1, 2), 0.5)
+            buckets.consume('b', 1, 2)
+        with mock.patch('time.monotonic', return_value=101):
+            self.assertEqual(buckets.consume('a', 1, 2), 0)
+            buckets.consume('c', 1, 2)
+        self.assertEqual(set(buckets._buckets), {'a', 'c'})
+
+
+class TestAssetLookupCache(TestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        from .lookups import asset_cache
+        from .throttles import token_buckets
+        asset_cache.clear()
+        token_buckets.clear()
+        self.user = User.objects.create_user(
+            username='testuser1',
+            password='123456'
+        )
+        self.assets = [
+            Asset.objects.create(name=name, modality="CR", user=self.user)
+            for name in ("BITCOIN", "ETHEREUM")
+        ]
+        self.client.force_login(self.user)
+
+    def add_appliances(self, assets):
+        return self.client.post(
+            '/financial/api/rest/appliance/add/',
+            data=json.dumps([{
+                'asset': asset,
+                'request_date': str(timezone.now().date()),
+                'quantity': 1,
+                'unit_price': 10,
+                'user': self.user.pk,
+            } for asset in assets]),
+            content_type='application/json'
+        )
+
+    def count_asset_queries(self, assets):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        with CaptureQueriesContext(connection) as context:
+            response = self.add_appliances(assets)
+        self.assertEqual(response.status_code, 201)
+        return sum(
+            1 for query in context.captured_queries
+            if query['sql'].startswith('SELECT')
+            and 'FROM "financial_asset"' in query['sql']
+        )
+
+    def test_many_records_one_query(self):
+        """Testar a validação dos ativos de vários registros em uma consulta."""
+        pks = [self.assets[0].pk, self.assets[1].pk, self.assets[0].pk]
+        self.assertEqual(self.count_asset_queries(pks), 1)
+        self.assertEqual(Appliance.objects.for_user(self.user).count(), 3)
+        # cached in the process until an asset changes
+        self.assertEqual(self.count_asset_queries(pks), 0)
+        self.assets[1].name = "ETHER"
+        self.assets[1].save()
+        self.assertEqual(self.count_asset_queries(pks), 1)
+
+    def test_invalid_records(self):
+        """Testar os erros de ativos inexistentes e do limite de registros."""
+        response = self.add_appliances([self.assets[0].pk, 999, 'x'])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()[0], {})
+        self.assertIn('asset', response.json()[1])
+        self.assertIn('asset', response.json()[2])
+        self.assertFalse(Appliance.objects.for_user(self.user).exists())
+        with override_settings(FINANCIAL_ADD_MAX_RECORDS=2):
+            response = self.add_appliances([self.assets[0].pk] * 3)
+        self.assertEqual(response.status_code, 400)
+
+
+class TestAdminScale(TestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser(
+            username='admin', password='123456'
+        )
+        self.asset = Asset.objects.create(
+            name="BITCOIN", modality="CR", user=self.admin
+        )
+        self.client.force_login(self.admin)
+
+    def add_appliances(self, count):
+        for _ in range(count):
+            Appliance.objects.create(
+                asset=self.asset, request_date=timezone.now().date(),
+                quantity=1, unit_price=10, user=self.admin,
+                ip_address='127.0.0.1'
+            )
+
+    def count_changelist_queries(self, url):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries)
+
+    def test_changelist_queries_constant(self):
+        """Testar se as consultas da listagem não crescem com as linhas."""
+        url = '/admin/financial/appliance/'
+        self.add_appliances(2)
+        queries = self.count_changelist_queries(url)
+        self.add_appliances(8)
+        self.assertEqual(self.count_changelist_queries(url), queries)
+
+    def test_estimated_count(self):
+        """Testar a contagem estimada e a contagem limitada com filtro."""
+        from unittest import mock
+        from django.db import connections
+        from .admin import EstimatedCountPaginator
+        self.add_appliances(5)
+        from .routers import get_user_shard
+        queryset = Appliance.objects.using(get_user_shard(self.admin))
+        queryset.order_by('pk')[1].delete()
+        queryset = queryset.order_by('-pk')
+        # below the limit the rows are counted, the gap isn't
+        self.assertEqual(EstimatedCountPaginator(queryset, 100).count, 4)
+        with mock.patch.object(EstimatedCountPaginator, 'count_limit', 3):
+            self.assertEqual(EstimatedCountPaginator(
+                queryset.filter(quantity=1), 100
+            ).count, 3)
+            # past it the statistics are used once the table is analyzed
+            self.assertEqual(EstimatedCountPaginator(queryset, 100).count, 3)
+            if connections[queryset.db].vendor == 'sqlite':
+                with connections[queryset.db].cursor() as cursor:
+                    cursor.execute("ANALYZE")
+                self.assertEqual(
+                    EstimatedCountPaginator(queryset, 100).count, 4
+                )
+
+
+class TestFinancialFilters(TestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        self.user = User.objects.create_superuser(
+            username='testuser1',
+            password='123456'
+        )
+        self.bitcoin = Asset.objects.create(
+            name="BITCOIN", modality="CR", user=self.user
+        )
+        self.tesouro = Asset.objects.create(
+            name="TESOURO", modality="RF", user=self.user
+        )
+        for asset, day, quantity in [
+                (self.bitcoin, 5, 1), (self.bitcoin, 20, 2),
+                (self.tesouro, 10, 3), (self.tesouro, 28, 4)]:
+            Appliance.objects.create(
+                asset=asset, request_date=datetime.date(2021, 2, day),
+                quantity=quantity, unit_price=10, user=self.user,
+                ip_address='127.0.0.1'
+            )
+        self.client.force_login(self.user)
+
+    def get_table(self, **params):
+        response = self.client.get('/financial/appliance/view/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.context['table']
+
+    def test_range_filters_and_totals(self):
+        """Testar os filtros por período, total e modalidade com os totais."""
+        table = self.get_table(
+            request_date_from='2021-02-06', request_date_to='2021-02-28',
+            totals=1
+        )
+        self.assertEqual(len(table.rows), 3)
+        self.assertEqual(
+            table.totals, {'count': 3, 'quantity': 9, 'total': 90}
+        )
+        self.assertTrue(table.show_footer)
+        table = self.get_table(modality='RF', total_min=35, totals=1)
+        self.assertEqual(table.totals['count'], 1)
+        self.assertEqual(table.totals['quantity'], 4)
+        # without totals in GET the aggregate isn't computed
+        self.assertIsNone(self.get_table().totals)
+
+    def test_date_range_uses_user_date_index(self):
+        """Testar se o período do usuário usa o índice (user, request_date)."""
+        from django.db import connection
+        from .filters import ApplianceFilter
+        queryset = ApplianceFilter(data={
+            'request_date_from': '2021-02-01', 'request_date_to': '2021-02-28',
+        }, queryset=Appliance.objects.all()).qs.for_user(self.user)
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute("EXPLAIN QUERY PLAN " + sql, params)
+            plan = " ".join(str(row) for row in cursor.fetchall())
+        self.assertIn('appliance_user_date', plan)
+
+
+class TestPurgeUser(TestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser1',
+            password='123456'
+        )
+        self.other = User.objects.create_user(
+            username='testuser2',
+            password='123456'
+        )
+        self.asset = Asset.objects.create(
+            name="BITCOIN", modality="CR", user=self.other
+        )
+        for user in (self.user, self.other):
+            for model in (Appliance, Appliance, Appliance, Redeem):
+                model.objects.create(
+                    asset=self.asset, request_date=timezone.now().date(),
+                    quantity=1, unit_price=10, user=user,
+                    ip_address='127.0.0.1'
+                )
+
+    def test_purge_in_chunks(self):
+        """Testar a remoção em partes dos dados e depois do usuário."""
+        from .purge import purge_user
+        chunks = []
+        deleted = purge_user(
+            self.user.pk, chunk_size=2,
+            progress=lambda model, using, count: chunks.append(
+                (model.__name__, count)
+            )
+        )
+        self.assertEqual(deleted['Appliance'], 3)
+        self.assertEqual(deleted['Redeem'], 1)
+        self.assertEqual(deleted['TransactionEvent'], 4)
+        self.assertIn(('Appliance', 2), chunks)
+        self.assertIn(('Appliance', 3), chunks)
+        self.assertFalse(User.objects.filter(pk=self.user.pk).exists())
+        self.assertFalse(
+            TransactionEvent.objects.filter(user_id=self.user.pk).exists()
+        )
+        # the other user and the asset it created are kept
+        self.assertEqual(Appliance.objects.for_user(self.other).count(), 3)
+        self.assertEqual(Redeem.objects.for_user(self.other).count(), 1)
+        self.assertTrue(Asset.objects.filter(pk=self.asset.pk).exists())
+
+    def test_purge_keeps_shared_assets(self):
+        """Testar se os ativos do usuário usados por outros são mantidos."""
+        from .purge import purge_user
+        shared = Asset.objects.create(
+            name="TESOURO", modality="RF", user=self.user
+        )
+        unused = Asset.objects.create(
+            name="PETR4", modality="AC", user=self.user
+        )
+        Appliance.objects.create(
+            asset=shared, request_date=timezone.now().date(), quantity=1,
+            unit_price=10, user=self.other, ip_address='127.0.0.1'
+        )
+        deleted = purge_user(self.user.pk)
+        self.assertEqual(deleted['Asset'], 1)
+        self.assertFalse(Asset.objects.filter(pk=unused.pk).exists())
+        shared.refresh_from_db()
+        self.assertEqual(shared.user, self.other)
+        self.assertEqual(
+            Appliance.objects.for_user(self.other).filter(
+                asset=shared
+            ).count(), 1
+        )
+
+    def test_purge_command_keep_user(self):
+        """Testar o comando mantendo o usuário desativado."""
+        from django.core.management import call_command
+        out = StringIO()
+        call_command(
+            'purge_user', 'testuser1', '--keep-user', '--pause=0', stdout=out
+        )
+        self.assertIn("3 Appliance rows deleted", out.getvalue())
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.is_active)
+        self.assertFalse(Appliance.objects.for_user(self.user).exists())
+
+
+class TestDashboardSummary(TestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser1',
+            password='123456'
+        )
+        self.bitcoin = Asset.objects.create(
+            name="BITCOIN", modality="CR", user=self.user
+        )
+        self.tesouro = Asset.objects.create(
+            name="TESOURO", modality="RF", user=self.user
+        )
+        for model, asset, date, quantity in [
+                (Appliance, self.bitcoin, datetime.date(2020, 1, 10), 1),
+                (Appliance, self.tesouro, datetime.date(2021, 2, 5), 2),
+                (Appliance, self.bitcoin, datetime.date(2021, 2, 20), 3),
+                (Redeem, self.bitcoin, datetime.date(2021, 3, 1), 1)]:
+            model.objects.create(
+                asset=asset, request_date=date, quantity=quantity,
+                unit_price=10, user=self.user, ip_address='127.0.0.1'
+            )
+        from .archive import archive_transactions
+        archive_transactions(datetime.date(2021, 1, 1))
+        self.client.force_login(self.user)
+
+    def get_summary(self, **headers):
+        return self.client.get('/dashboard/summary/?latest=2', **headers)
+
+    def test_summary(self):
+        """Testar os totais, agrupamentos e últimas transações do resumo."""
+        summary = self.get_summary().json()
+        self.assertEqual(summary['totals']['appliance'], {
+            'count': 3, 'total': 60.0
+        })
+        self.assertEqual(summary['totals']['balance'], 50.0)
+        self.assertEqual(
+            [(a['name'], a['appliance'], a['redeem'], a['quantity'])
+             for a in summary['by_asset']],
+            [("Bitcoin", 40.0, 10.0, 3), ("Tesouro", 20.0, 0, 2)]
+        )
+        self.assertEqual(
+            [(m['modality'], m['appliance']) for m in summary['by_modality']],
+            [('CR', 40.0), ('RF', 20.0)]
+        )
+        self.assertEqual(
+            [(m['month'], m['appliance'], m['redeem'])
+             for m in summary['months']],
+            [('2020-01', 10.0, 0), ('2021-02', 50.0, 0),
+             ('2021-03', 0, 10.0)]
+        )
+        self.assertEqual(
+            [(t['kind'], t['request_date']) for t in summary['latest']],
+            [('redeem', '2021-03-01'), ('appliance', '2021-02-20')]
+        )
+        self.assertEqual(summary['donut']['labels'], ["Bitcoin", "Tesouro"])
+        self.assertEqual(self.client.get(
+            '/dashboard/summary/?latest=1000'
+        ).status_code, 400)
+
+    def test_etag(self):
+        """Testar o 304 sem consultas e a troca do ETag com uma alteração."""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        etag = self.get_summary()['ETag']
+        with CaptureQueriesContext(connection) as context:
+            response = self.get_summary(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertFalse([
+            query for query in context.captured_queries
+            if 'financial_' in query['sql']
+        ])
+        Appliance.objects.create(
+            asset=self.tesouro, request_date=datetime.date(2021, 4, 1),
+            quantity=1, unit_price=10, user=self.user, ip_address='127.0.0.1'
+        )
+        response = self.get_summary(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['totals']['appliance']['count'], 4)
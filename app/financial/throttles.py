@@ -0,0 +1,134 @@
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.throttling import BaseThrottle
+
+from .utils import get_client_ip
+
+BUCKET_KEY = "financial:throttle:{}"
+
+
+class TokenBuckets:
+    """
+    Token buckets kept in a dict of the process, a bucket holds up to burst
+    tokens refilled at rate tokens per second and each request takes one.
+    The buckets refilled to the top are dropped once there are more than
+    max_keys, they are the same as a new one.
+    """
+
+    def __init__(self, max_keys=10000):
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._buckets = {}
+
+    def consume(self, key, burst, rate):
+        """Take a token, return 0 or the seconds until there is one."""
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                tokens = burst
+                if len(self._buckets) >= self.max_keys:
+                    self._prune(now)
+            else:
+                tokens = min(burst, bucket[0] + (now - bucket[1]) * rate)
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0
+            else:
+                wait = (1 - tokens) / rate
+            # with the moment it is full again, to prune it
+            self._buckets[key] = (tokens, now, now + (burst - tokens) / rate)
+        return wait
+
+    def _prune(self, now):
+        for key in [k for k, v in self._buckets.items() if v[2] <= now]:
+            del self._buckets[key]
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class CacheTokenBuckets:
+    """
+    Token buckets in the cache, shared by the processes. The read and the
+    write of a bucket aren't atomic, concurrent requests may take the same
+    token, so the limit is approximate.
+    """
+
+    def consume(self, key, burst, rate):
+        now = time.time()
+        key = BUCKET_KEY.format(key)
+        bucket = cache.get(key)
+        tokens = burst if bucket is None else min(
+            burst, bucket[0] + (now - bucket[1]) * rate
+        )
+        if tokens >= 1:
+            tokens -= 1
+            wait = 0
+        else:
+            wait = (1 - tokens) / rate
+        cache.set(key, (tokens, now), timeout=(burst - tokens) / rate + 1)
+        return wait
+
+
+token_buckets = TokenBuckets()
+shared_token_buckets = CacheTokenBuckets()
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Throttle the requests of a scope with a token bucket per client, the
+    burst and rate of each scope are in FINANCIAL_THROTTLE_RATES. The
+    buckets are in the process unless FINANCIAL_THROTTLE_SHARED. Use
+    get_throttle_classes() to get the throttles of a scope.
+    """
+
+    scope = None
+
+    def get_ident(self, request):
+        """Return the client of the request, None to not throttle it."""
+        raise NotImplementedError
+
+    def allow_request(self, request, view):
+        self.wait_seconds = 0
+        rates = settings.FINANCIAL_THROTTLE_RATES.get(self.scope)
+        ident = self.get_ident(request)
+        if rates is None or ident is None:
+            return True
+        buckets = shared_token_buckets if settings.FINANCIAL_THROTTLE_SHARED \
+            else token_buckets
+        self.wait_seconds = buckets.consume(
+            "{}:{}".format(self.scope, ident), rates['burst'], rates['rate']
+        )
+        return not self.wait_seconds
+
+    def wait(self):
+        return self.wait_seconds
+
+
+class UserTokenBucketThrottle(TokenBucketThrottle):
+
+    def get_ident(self, request):
+        if request.user and request.user.is_authenticated:
+            return "user:{}".format(request.user.pk)
+        return None
+
+
+class IPTokenBucketThrottle(TokenBucketThrottle):
+
+    def get_ident(self, request):
+        # the META of the HttpRequest, the proxy of the DRF Request is slow
+        request = getattr(request, '_request', request)
+        return "ip:{}".format(get_client_ip(request))
+
+
+def get_throttle_classes(scope):
+    """Return the per user and per ip throttles of a scope."""
+    return [
+        type(base.__name__, (base,), {'scope': scope})
+        for base in (UserTokenBucketThrottle, IPTokenBucketThrottle)
+    ]
@@ -1,17 +1,27 @@
 from django.urls import path, include
 
-from .views import *
-from .rest_views import *
+from .rest_views import (
+    get_appliance_data_chart_donut, rest_add_asset, rest_appliance_add,
+    rest_appliance_list, rest_list_asset, rest_lookup_asset,
+    rest_portfolio_analytics, rest_portfolio_positions,
+    rest_portfolio_valuation, rest_redeem_add, rest_redeem_list, rest_sync,
+)
+from .views import ApplianceView, AssetView, RedeemView
 
 app_name = 'financial'
 
 rest_api_patterns = ([
     path('asset/add/', rest_add_asset),
     path('asset/list/', rest_list_asset),
+    path('asset/lookup/', rest_lookup_asset, name='asset-lookup'),
     path('appliance/add/', rest_appliance_add),
     path('appliance/list/', rest_appliance_list),
     path('redeem/add/', rest_redeem_add),
     path('redeem/list/', rest_redeem_list),
+    path('sync/', rest_sync),
+    path('portfolio/valuation/', rest_portfolio_valuation),
+    path('portfolio/analytics/', rest_portfolio_analytics),
+    path('portfolio/positions/', rest_portfolio_positions),
 ], 'restfinancial')
 
 asset_patterns = ([
@@ -1,6 +1,18 @@
+import threading
+import time
+import uuid
+
 from django.db.models import Sum
 from django.conf import settings
+from django.core.cache import cache
 from .models import *
+from .archive import get_history, get_totals_by_asset
+
+DATA_VERSION_KEY = "financial:data_version:{}"
+PRICES_VERSION_KEY = "financial:prices_version"
+ASSETS_VERSION_KEY = "financial:assets_version"
+SINGLE_FLIGHT_LOCK_KEY = "financial:single_flight:lock:{}"
+SINGLE_FLIGHT_RESULT_KEY = "financial:single_flight:result:{}"
 
 
 def get_client_ip(request):
@@ -14,63 +26,204 @@ def get_client_ip(request):
     return ip
 
 
+def _get_version(key):
+    version = cache.get(key)
+    if version is None:
+        version = uuid.uuid4().hex
+        # add don't overwrite a version set by another process meanwhile
+        if not cache.add(key, version, timeout=None):
+            version = cache.get(key)
+    return version
+
+
+def get_user_data_version(user_id):
+    """
+    Return the version of the financial data of the user, it changes each
+    time an appliance or redeem of the user is saved or deleted. Use it in
+    cache keys to memoize anything computed from the user data.
+    """
+    return _get_version(DATA_VERSION_KEY.format(user_id))
+
+
+def bump_user_data_version(user_id):
+    """Change the version of the financial data of the user."""
+    cache.set(DATA_VERSION_KEY.format(user_id), uuid.uuid4().hex, timeout=None)
+
+
+def get_prices_version():
+    """Return the version of the prices, it is shared by all users."""
+    return _get_version(PRICES_VERSION_KEY)
+
+
+def bump_prices_version():
+    """Change the version of the prices."""
+    cache.set(PRICES_VERSION_KEY, uuid.uuid4().hex, timeout=None)
+
+
+def get_assets_version():
+    """Return the version of the assets, it changes when one is saved."""
+    return _get_version(ASSETS_VERSION_KEY)
+
+
+def bump_assets_version():
+    """Change the version of the assets, return the new one."""
+    version = uuid.uuid4().hex
+    cache.set(ASSETS_VERSION_KEY, version, timeout=None)
+    return version
+
+
+class _Call:
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls with the same key, the first caller computes
+    and the others in the process wait for its result, nothing is kept after
+    it. With shared=True the processes coordinate through a cache lock, one
+    computes and stores the result in the cache for result_timeout seconds
+    while the others poll for it. Put everything the result depends on in
+    the key (e.g. the user data version).
+    """
+
+    def __init__(self, lock_timeout=30, result_timeout=5, poll_interval=0.02):
+        self.lock_timeout = lock_timeout
+        self.result_timeout = result_timeout
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, compute, shared=False):
+        """Return compute(), or the result of the same call in flight."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            if shared:
+                call.result = self._do_shared(key, compute)
+            else:
+                call.result = compute()
+        except Exception as error:
+            call.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+        return call.result
+
+    def _do_shared(self, key, compute):
+        lock_key = SINGLE_FLIGHT_LOCK_KEY.format(key)
+        result_key = SINGLE_FLIGHT_RESULT_KEY.format(key)
+        deadline = time.monotonic() + self.lock_timeout
+        while True:
+            # the result is wrapped, so a None result is cached as well
+            cached = cache.get(result_key)
+            if cached is not None:
+                return cached[0]
+            if cache.add(lock_key, 1, self.lock_timeout):
+                try:
+                    result = compute()
+                    cache.set(result_key, (result,), self.result_timeout)
+                    return result
+                finally:
+                    cache.delete(lock_key)
+            # the process holding the lock may have died
+            if time.monotonic() > deadline:
+                return compute()
+            time.sleep(self.poll_interval)
+
+
+single_flight = SingleFlight()
+
+
 class FinancialMixin:
     appliances = None
     redeems = None
     request = None
+    # in history mode the archived transactions are included in the
+    # appliances and redeems, as a union with the hot tables
+    history = False
+    # fields loaded in the appliances and redeems, all of them if None
+    only = None
 
-    def __init__(self, request=None):
+    def __init__(self, request=None, history=False, only=None):
         if request is not None:
             self.request = request
+        self.history = history
+        self.only = only
+
+    def _get_transactions(self, model):
+        if self.history:
+            return get_history(model, self.request.user, only=self.only)
+        queryset = model.objects.for_user(self.request.user)
+        if self.only is not None:
+            queryset = queryset.only(*self.only)
+        return queryset
 
     def get_appliances(self):
         """Return all appliance from current user."""
-        if self.appliances is not None:
-            return self.appliances
-        self.appliances = Appliance.objects.filter(user=self.request.user)
+        if self.appliances is None:
+            self.appliances = self._get_transactions(Appliance)
         return self.appliances
 
     def get_redeems(self):
         """Return all redeem from current user."""
-        if self.redeems is not None:
-            return self.redeems
-        self.redeems = Redeem.objects.filter(user=self.request.user)
+        if self.redeems is None:
+            self.redeems = self._get_transactions(Redeem)
         return self.redeems
 
+    def _single_flight(self, name, compute):
+        """
+        Compute once for all the identical requests of the user in flight,
+        e.g. the dashboard opened in several tabs.
+        """
+        user_id = self.request.user.pk
+        key = "{}:{}:{}".format(name, user_id, get_user_data_version(user_id))
+        return single_flight.do(
+            key, compute, shared=settings.SINGLE_FLIGHT_SHARED
+        )
+
     def get_total_appliance(self):
-        """Return the total appliances."""
-        total = 0
-        for appliance in self.get_appliances():
-            total += appliance.get_total()
-        return total
+        """Return the total appliances, archived ones included."""
+        return self._single_flight('total_appliance', lambda: sum(
+            get_totals_by_asset(Appliance, self.request.user.pk).values()
+        ))
 
     def get_total_redeem(self):
-        """Return the total redeems."""
-        total = 0
-        for redeem in self.get_redeems():
-            total += redeem.get_total()
-        return total
+        """Return the total redeems, archived ones included."""
+        return self._single_flight('total_redeem', lambda: sum(
+            get_totals_by_asset(Redeem, self.request.user.pk).values()
+        ))
 
     def get_appliance_by_asset_donut_chart(self):
         """
         Return appliance separeted by asset in Json format for a donut chart.
         """
-        appliances = self.get_appliances().order_by('asset')
-        assets = Asset.objects.filter(
-            pk__in=[a['asset'] for a in appliances.values('asset').distinct()]
+        return self._single_flight(
+            'donut_chart', self._get_appliance_by_asset_donut_chart
         )
+
+    def _get_appliance_by_asset_donut_chart(self):
+        totals = get_totals_by_asset(Appliance, self.request.user.pk)
+        assets = Asset.objects.filter(pk__in=list(totals)).order_by('pk')
         data = {
             'series': [],
             'labels': [asset.name for asset in assets],
         }
         for asset in assets:
-            _appliances = appliances.filter(asset=asset)
-            _total = 0
-            for appliance in _appliances:
-                _total += float(
-                    round(
-                        appliance.total or 0, settings.DEFAULT_DECIMAL_PLACES
-                    )
-                )
-            data['series'].append(_total)
+            data['series'].append(
+                float(round(totals[asset.pk], settings.DEFAULT_DECIMAL_PLACES))
+            )
         return data
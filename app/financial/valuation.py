@@ -0,0 +1,197 @@
+import datetime
+
+import numpy as np
+from django.utils import timezone
+
+from .archive import get_ledger_models
+from .models import *
+
+
+class PeriodTooLong(Exception):
+    pass
+
+
+class Valuation:
+    """
+    Daily valuation of a portfolio. Each per asset attribute is a matrix with
+    one row per day and one column per asset (in the same order of asset_ids),
+    the portfolio attributes are the sum of the columns. The cash flow is the
+    amount applied minus the amount redeemed on each day.
+    """
+
+    def __init__(self, dates, asset_ids, quantity, market_value, cost_basis,
+                 cash_flow):
+        self.dates = dates
+        self.asset_ids = asset_ids
+        self.quantity = quantity
+        self.asset_cash_flow = cash_flow
+        self.asset_market_value = market_value
+        self.asset_cost_basis = cost_basis
+        self.market_value = market_value.sum(axis=1)
+        self.cost_basis = cost_basis.sum(axis=1)
+        self.unrealized_pnl = self.market_value - self.cost_basis
+
+    def as_dict(self):
+        """Return the portfolio series in a json friendly format."""
+        return {
+            'dates': [str(date) for date in self.dates],
+            'market_value': np.round(self.market_value, 2).tolist(),
+            'cost_basis': np.round(self.cost_basis, 2).tolist(),
+            'unrealized_pnl': np.round(self.unrealized_pnl, 2).tolist(),
+        }
+
+
+def _day_index(dates, start):
+    """Return the index of each date in a daily grid that begins at start."""
+    return (np.asarray(dates, dtype='datetime64[D]') - start).astype(np.int64)
+
+
+def compute_valuation(start, end, asset_ids, transactions, prices):
+    """
+    Compute the daily valuation between start and end (inclusive).
+
+    transactions is a tuple of arrays (date, asset_id, quantity, amount), the
+    quantity of a redeem must be negative and its amount positive. prices is
+    a tuple of arrays (date, asset_id, price) and it may contain prices before
+    start, the last of them is used as the price on start.
+
+    The cost basis uses the average cost of all purchases of the asset, a
+    redeem reduces the quantity but doesn't change the average cost. Days
+    without any known price are valued at the average cost.
+    """
+    start = np.datetime64(start, 'D')
+    end = np.datetime64(end, 'D')
+    dates = np.arange(start, end + 1)
+    n_days = len(dates)
+    asset_ids = np.asarray(asset_ids, dtype=np.int64)
+    n_assets = len(asset_ids)
+    if not n_assets:
+        empty = np.zeros((n_days, 0))
+        return Valuation(
+            dates.astype(datetime.date), asset_ids, empty, empty, empty, empty
+        )
+    columns = np.arange(n_assets)
+    # column of each asset id, faster than a searchsorted for each row
+    column_of = np.zeros(asset_ids.max() + 1 if n_assets else 0, np.int64)
+    column_of[asset_ids] = columns
+
+    tx_date, tx_asset, tx_quantity, tx_amount = transactions
+    tx_day = _day_index(tx_date, start)
+    # transactions before start are accumulated on the first day
+    keep = tx_day < n_days
+    tx_day = np.maximum(tx_day[keep], 0)
+    tx_column = column_of[np.asarray(tx_asset, dtype=np.int64)[keep]]
+    tx_quantity = np.asarray(tx_quantity, dtype=np.float64)[keep]
+    tx_amount = np.asarray(tx_amount, dtype=np.float64)[keep]
+    is_buy = tx_quantity > 0
+
+    size = n_days * n_assets
+    tx_cell = tx_day * n_assets + tx_column
+
+    def accumulate(cells, weights):
+        """Sum the weights of each cell and accumulate them over the days."""
+        # float even when there are no cells, bincount then returns ints
+        daily = np.bincount(cells, weights=weights, minlength=size).astype(
+            np.float64, copy=False
+        ).reshape(n_days, n_assets)
+        return np.cumsum(daily, axis=0, out=daily)
+
+    quantity = accumulate(tx_cell, tx_quantity)
+    bought = accumulate(tx_cell[is_buy], tx_quantity[is_buy])
+    invested = accumulate(tx_cell[is_buy], tx_amount[is_buy])
+    average_cost = np.divide(
+        invested, bought, out=np.zeros_like(invested), where=bought > 0
+    )
+    cash_flow = np.bincount(
+        tx_cell, weights=np.where(is_buy, tx_amount, -tx_amount),
+        minlength=size
+    ).astype(np.float64, copy=False).reshape(n_days, n_assets)
+
+    price_date, price_asset, price_value = prices
+    price_day = _day_index(price_date, start)
+    price_column = column_of[np.asarray(price_asset, dtype=np.int64)]
+    price_value = np.asarray(price_value, dtype=np.float64)
+    price = np.full((n_days, n_assets), np.nan)
+    # only the last price of each asset before start is used
+    before = price_day < 0
+    if before.any():
+        order = np.lexsort((price_day[before], price_column[before]))
+        _columns = price_column[before][order][::-1]
+        _values = price_value[before][order][::-1]
+        _columns, last = np.unique(_columns, return_index=True)
+        price[0, _columns] = _values[last]
+    inside = (price_day >= 0) & (price_day < n_days)
+    price.ravel()[
+        price_day[inside] * n_assets + price_column[inside]
+    ] = price_value[inside]
+
+    missing = np.isnan(price)
+    if missing.any():
+        # forward fill, each cell takes the row of the last known price
+        known = np.where(missing, 0, np.arange(n_days)[:, None])
+        np.maximum.accumulate(known, axis=0, out=known)
+        price = price[known, columns]
+        np.copyto(price, average_cost, where=np.isnan(price))
+
+    return Valuation(
+        dates=dates.astype(datetime.date),
+        asset_ids=asset_ids,
+        quantity=quantity,
+        market_value=quantity * price,
+        cost_basis=quantity * average_cost,
+        cash_flow=cash_flow,
+    )
+
+
+def get_user_valuation(user, start=None, end=None, max_days=None):
+    """
+    Load the transactions of the user and the prices of its assets and
+    return the daily Valuation between start and end. By default the range
+    goes from the first transaction until today. Raise PeriodTooLong if the
+    range has max_days or more, the matrices have one row a day.
+    """
+    fields = ('request_date', 'asset_id', 'quantity', 'total')
+    rows = []
+    for model in get_ledger_models(Appliance):
+        rows.extend(model.objects.for_user(user).values_list(*fields))
+    for model in get_ledger_models(Redeem):
+        rows.extend(
+            (date, asset_id, -quantity, total)
+            for date, asset_id, quantity, total in
+            model.objects.for_user(user).values_list(*fields)
+        )
+    if end is None:
+        end = timezone.localdate()
+    if start is None:
+        # the end may be before the first transaction
+        start = min([row[0] for row in rows] + [end])
+    if max_days is not None and (end - start).days >= max_days:
+        raise PeriodTooLong()
+
+    asset_ids = sorted({row[1] for row in rows})
+    if rows:
+        tx_date, tx_asset, tx_quantity, tx_amount = zip(*rows)
+    else:
+        tx_date = tx_asset = tx_quantity = tx_amount = ()
+    transactions = (
+        np.array(tx_date, dtype='datetime64[D]'),
+        np.array(tx_asset, dtype=np.int64),
+        np.array(tx_quantity, dtype=np.float64),
+        np.array([float(amount or 0) for amount in tx_amount]),
+    )
+
+    price_rows = list(
+        AssetPrice.objects.filter(
+            asset_id__in=asset_ids, date__lte=end
+        ).values_list('date', 'asset_id', 'price')
+    )
+    if price_rows:
+        price_date, price_asset, price_value = zip(*price_rows)
+    else:
+        price_date = price_asset = price_value = ()
+    prices = (
+        np.array(price_date, dtype='datetime64[D]'),
+        np.array(price_asset, dtype=np.int64),
+        np.array([float(value) for value in price_value]),
+    )
+    return compute_valuation(start, end, asset_ids, transactions, prices)
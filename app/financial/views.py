@@ -1,12 +1,60 @@
+from django.db.models import Count, Sum
 from django.utils.translation import gettext as _
 from django.urls import reverse_lazy
 from app.mixins import MyViewCreateMixin
 
-from .forms import *
-from .tables import *
-from .filters import *
-from .models import *
-from .utils import *
+from .filters import ApplianceFilter, AssetFilter, RedeemFilter
+from .forms import ApplianceForm, AssetForm, RedeemForm
+from .models import Appliance, ArchivedAppliance, ArchivedRedeem, Asset, Redeem
+from .tables import ApplianceTable, AssetTable, RedeemTable
+from .utils import get_client_ip
+
+
+class FinancialViewMixin:
+    """
+    View of the appliances or redeems of the user. With history in GET the
+    archived objects are included, with totals the footer of the table shows
+    the count and sums of the filtered objects.
+    """
+    archived_model_class = None
+
+    def get_filterset_querysets(self):
+        """Return the filtered querysets of the user, with the archived one."""
+        # filter the queryset to send only the objects from the user
+        querysets = [self.get_filterset().qs.for_user(self.request.user)]
+        if self.request.GET.get('history'):
+            querysets.append(self.get_filterset_class()(
+                queryset=self.archived_model_class.objects.all(),
+                **self.get_filterset_kwargs()
+            ).qs.for_user(self.request.user))
+        return querysets
+
+    def get_filterset_queryset(self):
+        """Return the filter queryset, it may be used as data to a table."""
+        queryset, *archived = self.get_filterset_querysets()
+        if archived:
+            queryset = queryset.union(*archived, all=True)
+        return queryset
+
+    def get_totals(self):
+        """Return the count, quantity and total of the filtered objects."""
+        totals = {'count': 0, 'quantity': 0, 'total': 0}
+        # one aggregate query per table, the union can't be aggregated
+        for queryset in self.get_filterset_querysets():
+            sums = queryset.order_by().aggregate(
+                count=Count('pk'), quantity=Sum('quantity'), total=Sum('total')
+            )
+            for name in totals:
+                totals[name] += sums[name] or 0
+        return totals
+
+    def get_table_kwargs(self):
+        if self.request.GET.get('totals'):
+            return {'totals': self.get_totals()}
+        return {}
+
+    def get_extra_context(self):
+        return {**(super().get_extra_context() or {}), 'totals_option': True}
 
 
 class AssetView(MyViewCreateMixin):
@@ -27,8 +75,9 @@ class AssetView(MyViewCreateMixin):
         return data
 
 
-class ApplianceView(MyViewCreateMixin):
+class ApplianceView(FinancialViewMixin, MyViewCreateMixin):
     model_class = Appliance
+    archived_model_class = ArchivedAppliance
     form_class = ApplianceForm
     form_prefix = "applianceform"
     table_class = ApplianceTable
@@ -40,12 +89,6 @@ class ApplianceView(MyViewCreateMixin):
     permission_required = ('financial.view_appliance',
                            'financial.add_appliance')
 
-    def get_filterset_queryset(self):
-        """Return the filter queryset, it may be used as data to a table."""
-        filterset = self.get_filterset()
-        # filter the queryset to send only the objects from the user
-        return filterset.qs.filter(user=self.request.user)
-
     def get_POST_data(self):
         data = self.request.POST.copy()
         data[f"{self.form_prefix}-user"] = self.request.user.pk
@@ -53,8 +96,9 @@ class ApplianceView(MyViewCreateMixin):
         return data
 
 
-class RedeemView(MyViewCreateMixin):
+class RedeemView(FinancialViewMixin, MyViewCreateMixin):
     model_class = Redeem
+    archived_model_class = ArchivedRedeem
     form_class = RedeemForm
     form_prefix = "redeemform"
     table_class = RedeemTable
@@ -65,12 +109,6 @@ class RedeemView(MyViewCreateMixin):
     success_url = reverse_lazy('financial:redeem:view')
     permission_required = ('financial.view_redeem', 'financial.add_redeem')
 
-    def get_filterset_queryset(self):
-        """Return the filter queryset, it may be used as data to a table."""
-        filterset = self.get_filterset()
-        # filter the queryset to send only the objects from the user
-        return filterset.qs.filter(user=self.request.user)
-
     def get_POST_data(self):
         data = self.request.POST.copy()
         data[f"{self.form_prefix}-user"] = self.request.user.pk
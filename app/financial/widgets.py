@@ -0,0 +1,33 @@
+from django import forms
+from django.urls import reverse_lazy
+
+
+class AssetLookupSelect(forms.Select):
+    """
+    Select of assets that renders only the selected option, the others are
+    fetched on demand from the asset lookup endpoint by select2 (see
+    financial/js/asset_lookup.js). The field still validates the value with
+    a single primary key lookup.
+    """
+
+    def __init__(self, attrs=None):
+        attrs = {
+            'data-lookup-url': reverse_lazy(
+                'financial:restfinancial:asset-lookup'
+            ),
+            **(attrs or {}),
+        }
+        super().__init__(attrs)
+
+    def optgroups(self, name, value, attrs=None):
+        selected = [v for v in value if str(v).isdigit()]
+        options = [
+            self.create_option(name, '', '', not selected, 0, attrs=attrs)
+        ]
+        if selected:
+            queryset = self.choices.queryset.filter(pk__in=selected)
+            for index, obj in enumerate(queryset, start=1):
+                options.append(self.create_option(
+                    name, str(obj.pk), str(obj), True, index, attrs=attrs
+                ))
+        return [(None, [option], option['index']) for option in options]